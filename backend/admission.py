@@ -0,0 +1,273 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Geocoding and places share one Geoapify key, so they draw from one budget.
+# Rates are requests per second; a rate of 0 disables the budget.
+UPSTREAM_BUDGET_NAMES = {"geocode": "geoapify", "places": "geoapify", "weather": "openweather"}
+GEOAPIFY_RATE = float(os.getenv("GEOAPIFY_RATE", "5"))
+GEOAPIFY_BURST = float(os.getenv("GEOAPIFY_BURST", "10"))
+OPENWEATHER_RATE = float(os.getenv("OPENWEATHER_RATE", "1"))  # 60 calls/minute
+OPENWEATHER_BURST = float(os.getenv("OPENWEATHER_BURST", "10"))
+# The rates are per host, not per process: every worker draws from the same
+# buckets, kept in this SQLite file. UPSTREAM_BUDGET_SHARED=0 gives each
+# process its own buckets (then N workers may spend N times the rate).
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPSTREAM_BUDGET_PATH = os.getenv("UPSTREAM_BUDGET_PATH", os.path.join(BASE_DIR, "upstream_budget.db"))
+UPSTREAM_BUDGET_SHARED = os.getenv("UPSTREAM_BUDGET_SHARED", "1") == "1"
+
+# /recommend admission: requests beyond MAX_CONCURRENCY wait in a queue of
+# at most MAX_QUEUE for up to QUEUE_TIMEOUT seconds, the rest are shed.
+RECOMMEND_MAX_CONCURRENCY = int(os.getenv("RECOMMEND_MAX_CONCURRENCY", "64"))
+RECOMMEND_MAX_QUEUE = int(os.getenv("RECOMMEND_MAX_QUEUE", "128"))
+RECOMMEND_QUEUE_TIMEOUT = float(os.getenv("RECOMMEND_QUEUE_TIMEOUT", "0.5"))
+
+ADMISSION_DECISIONS = metrics.counter(
+    "pocketplan_admission_total",
+    "Admission decisions by route and outcome (admitted, queued, shed, timeout).",
+    ["route", "outcome"],
+)
+DEGRADED_RESPONSES = metrics.counter(
+    "pocketplan_degraded_responses_total",
+    "Responses served in degraded mode, by reason.",
+    ["reason"],
+)
+
+
+class QuotaExceeded(Exception):
+    """Raised instead of calling an upstream whose request budget is spent."""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"{upstream} request budget exhausted")
+        self.upstream = upstream
+
+
+# --- Upstream Budgets ---
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.rejected = 0
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "tokens": round(self.tokens, 2), "rejected": self.rejected}
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose state lives in a SQLite file, so every worker
+    process on the host spends from the same budget. Each acquire is one
+    short write transaction; the refill uses wall-clock time, which all
+    processes agree on. If the file cannot be used the bucket carries on
+    in-process rather than failing requests.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, path: str = UPSTREAM_BUDGET_PATH):
+        super().__init__(rate, burst)
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Autocommit mode, so BEGIN IMMEDIATE below is the only transaction.
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _take(self, n: float) -> bool:
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so two workers cannot
+        # both read the same balance and spend it twice.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+            granted = tokens >= n
+            if granted:
+                tokens -= n
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.tokens = tokens
+        return granted
+
+    def try_acquire(self, n: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        try:
+            with self._lock:
+                granted = self._take(n)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared {self.name} budget unavailable, using this process's: {e}")
+            return super().try_acquire(n)
+        if not granted:
+            self.rejected += 1
+        return granted
+
+    def stats(self) -> dict:
+        return {**super().stats(), "shared": True, "errors": self.errors}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _budget(name: str, rate: float, burst: float) -> TokenBucket:
+    return SharedTokenBucket(name, rate, burst) if UPSTREAM_BUDGET_SHARED else TokenBucket(rate, burst)
+
+
+upstream_budgets: Dict[str, TokenBucket] = {
+    "geoapify": _budget("geoapify", GEOAPIFY_RATE, GEOAPIFY_BURST),
+    "openweather": _budget("openweather", OPENWEATHER_RATE, OPENWEATHER_BURST),
+}
+
+
+def acquire_upstream(upstream: str):
+    """Takes one token from the upstream's budget or raises QuotaExceeded."""
+    bucket = upstream_budgets.get(UPSTREAM_BUDGET_NAMES.get(upstream, upstream))
+    if bucket is not None and not bucket.try_acquire():
+        raise QuotaExceeded(upstream)
+
+
+def close_upstream_budgets():
+    for bucket in upstream_budgets.values():
+        if isinstance(bucket, SharedTokenBucket):
+            bucket.close()
+
+
+# --- Admission Control ---
+
+class AdmissionController:
+    """
+    Bounded concurrency with a bounded wait queue. `admit()` yields True when
+    the request may run normally and False when it was shed (queue full or
+    waited too long), so the caller can answer in degraded mode right away
+    instead of piling up work that would time out anyway.
+    """
+
+    def __init__(self, route: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+    async def _acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            ADMISSION_DECISIONS.labels(self.route, "admitted").inc()
+            return True
+        if self.waiting >= self.max_queue:
+            ADMISSION_DECISIONS.labels(self.route, "shed").inc()
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_DECISIONS.labels(self.route, "timeout").inc()
+            return False
+        finally:
+            self.waiting -= 1
+        ADMISSION_DECISIONS.labels(self.route, "queued").inc()
+        return True
+
+    @asynccontextmanager
+    async def admit(self):
+        admitted = await self._acquire()
+        if not admitted:
+            yield False
+            return
+        self.active += 1
+        try:
+            yield True
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+        }
+
+
+recommend_admission = AdmissionController(
+    "/recommend", RECOMMEND_MAX_CONCURRENCY, RECOMMEND_MAX_QUEUE, RECOMMEND_QUEUE_TIMEOUT
+)
+
+
+# --- Degraded Mode Tracking ---
+# Helpers deep in a request (weather/places lookups, deadlines) record why
+# the answer is not a full one; the route reads the reasons back at the end.
+# Tasks spawned by the request copy the context and share the same list.
+
+_degraded: contextvars.ContextVar = contextvars.ContextVar("pocketplan_degraded", default=None)
+
+
+def track_degradation() -> List[str]:
+    reasons: List[str] = []
+    _degraded.set(reasons)
+    return reasons
+
+
+def degradation_reasons() -> List[str]:
+    return _degraded.get() or []
+
+
+def mark_degraded(reason: str):
+    reasons: Optional[List[str]] = _degraded.get()
+    if reasons is not None and reason not in reasons:
+        reasons.append(reason)
+        DEGRADED_RESPONSES.labels(reason).inc()
+
+
+def stats() -> dict:
+    return {
+        "upstreams": {name: bucket.stats() for name, bucket in upstream_budgets.items()},
+        "recommend": recommend_admission.stats(),
+    }
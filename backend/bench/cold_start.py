@@ -0,0 +1,103 @@
+"""
+Cold-start measurement: how long a fresh interpreter takes to import the app,
+load the model and serve a first prediction, and which heavy modules end up
+imported. Each run is a separate process so nothing is warm.
+
+    python -m backend.bench.cold_start --runs 5 --output cold_start.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "joblib")
+
+PROBE = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import backend.main
+t1 = time.perf_counter()
+import backend.ml_utils as ml_utils
+ml_utils.load_model()
+t2 = time.perf_counter()
+ml_utils.predict_preferred_type("sunny", 60, 4.5, 3.0)
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "load_model_s": t2 - t1,
+    "first_predict_s": t3 - t2,
+    "total_s": t3 - t0,
+    "model_version": ml_utils.model_version(),
+    "heavy_modules": sorted({m.split(".")[0] for m in sys.modules} & set(%r)),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_probe(env_overrides: dict) -> dict:
+    env = {**os.environ, **env_overrides}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top: int = 15, max_depth: int = 2) -> list:
+    """Slowest modules by cumulative import time, from `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend.main"],
+                         cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Nesting is shown as two extra spaces per level; deep entries are noise.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > max_depth:
+            continue
+        rows.append({"module": name.strip(), "depth": depth,
+                     "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+
+
+def summarize(samples: list) -> dict:
+    keys = ("import_s", "load_model_s", "first_predict_s", "total_s")
+    return {
+        **{k: {"median": statistics.median(s[k] for s in samples),
+               "min": min(s[k] for s in samples),
+               "max": max(s[k] for s in samples)} for k in keys},
+        "model_version": samples[0]["model_version"],
+        "heavy_modules": samples[0]["heavy_modules"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and cold start of the backend.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write the report as JSON to this path.")
+    parser.add_argument("--skip-pickle", action="store_true", help="Do not measure the pickle fallback.")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "runs": args.runs}
+    report["artifact"] = summarize([run_probe({}) for _ in range(args.runs)])
+    if not args.skip_pickle:
+        missing = os.path.join(REPO_ROOT, "backend", "does-not-exist.bin")
+        report["pickle_fallback"] = summarize([run_probe({"MODEL_ARTIFACT_PATH": missing}) for _ in range(args.runs)])
+    report["import_profile"] = import_profile()
+
+    for name in ("artifact", "pickle_fallback"):
+        if name in report:
+            r = report[name]
+            print(f"{name:16s} total {r['total_s']['median'] * 1000:8.1f} ms  "
+                  f"(import {r['import_s']['median'] * 1000:.1f} ms, load {r['load_model_s']['median'] * 1000:.1f} ms)  "
+                  f"heavy modules: {', '.join(r['heavy_modules']) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares two benchmark result files written by load_test or microbench and
+flags regressions.
+
+    python -m backend.bench.compare baseline.json candidate.json --threshold 0.10
+"""
+import sys
+import json
+import argparse
+
+
+def metrics(report: dict) -> dict:
+    """Flattens a report into {name: value} where lower is better."""
+    results = report["results"]
+    if report["kind"] == "load_test":
+        out = {f"latency.{k}": v for k, v in results["latency"].items() if k.endswith("_ms")}
+        # Throughput is higher-is-better; compare its inverse.
+        if results.get("throughput_rps"):
+            out["seconds_per_request"] = 1 / results["throughput_rps"]
+        return out
+    return {name: r["p50_us"] for name, r in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+    if base["kind"] != cand["kind"]:
+        sys.exit(f"Cannot compare {base['kind']} with {cand['kind']}")
+
+    base_m, cand_m = metrics(base), metrics(cand)
+    regressions = 0
+    for name in sorted(base_m.keys() & cand_m.keys()):
+        old, new = base_m[name], cand_m[name]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:40s} {old:12.3f} -> {new:12.3f}  ({change:+.1%}){flag}")
+
+    if regressions:
+        sys.exit(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Offline load test for POST /recommend.
+
+Drives the FastAPI app in-process through httpx's ASGI transport at a fixed
+concurrency, with the Geoapify/OpenWeather calls answered by local
+stand-ins (see upstreams.py), and reports latency percentiles and
+throughput. No network access or API quota is used.
+
+    python -m backend.bench.load_test --requests 2000 --concurrency 50 \
+        --latency-ms 80 --error-rate 0.01 --places 100 --output results/load.json
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+# Caches and the database must not touch the real files; set this before
+# the backend modules read their configuration.
+_TMP = tempfile.mkdtemp(prefix="pocketplan-bench-")
+os.environ.setdefault("GEOCODE_CACHE_PATH", os.path.join(_TMP, "geocode.db"))
+os.environ.setdefault("TILE_CACHE_PATH", os.path.join(_TMP, "tiles.db"))
+os.environ.setdefault("UPSTREAM_BUDGET_PATH", os.path.join(_TMP, "upstream_budget.db"))
+os.environ.setdefault("FEEDBACK_DIR", os.path.join(_TMP, "feedback"))
+os.environ.setdefault("POCKETPLAN_DB_PATH", os.path.join(_TMP, "pocketplan.db"))
+os.environ.setdefault("POCKETPLAN_LEGACY_DATA", os.path.join(_TMP, "missing.json"))
+os.environ.setdefault("PLACE_INDEX_PATH", os.path.join(_TMP, "place_index.json.gz"))
+# The stand-ins have no quota, so the upstream budgets are off by default;
+# set them explicitly to measure throttled / degraded behaviour.
+os.environ.setdefault("GEOAPIFY_RATE", "0")
+os.environ.setdefault("OPENWEATHER_RATE", "0")
+
+import httpx
+
+from backend.bench.common import summarize, write_results
+from backend.bench.upstreams import StandInConfig, UpstreamProfile, UpstreamStandIn
+
+VIBES = ["chill", "active", "culture", "night", "romantic", "work"]
+BUDGETS = ["free", "budget", "premium"]
+TIMES = ["30", "60", "120", "180"]
+
+
+def build_requests(n: int, n_locations: int, seed: int):
+    rng = random.Random(seed)
+    locations = [f"Bench City {i}" for i in range(n_locations)]
+    return [{
+        "location": rng.choice(locations),
+        "time": rng.choice(TIMES),
+        "preference": rng.choice(VIBES),
+        "budget": rng.choice(BUDGETS),
+    } for _ in range(n)]
+
+
+async def run_load(app, bodies, concurrency: int, path: str = "/recommend"):
+    latencies, statuses = [], {}
+    queue = list(reversed(bodies))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def worker():
+            while queue:
+                body = queue.pop()
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    status = response.status_code
+                except Exception:
+                    status = "exception"
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+async def main_async(args):
+    import backend.main as main
+    import backend.http_client as http_client
+
+    profile = lambda items=15: UpstreamProfile(args.latency_ms, args.jitter_ms, args.error_rate, items)
+    stand_in = UpstreamStandIn(StandInConfig(geocode=profile(), weather=profile(),
+                                             places=profile(args.places), seed=args.seed))
+    main.PLACES_LIMIT = args.places
+    await http_client.start_client(transport=stand_in)
+    await main.startup_event()
+    try:
+        if args.warmup:
+            await run_load(main.app, build_requests(args.warmup, args.locations, args.seed + 1), args.concurrency)
+        bodies = build_requests(args.requests, args.locations, args.seed)
+        latencies, statuses, elapsed = await run_load(main.app, bodies, args.concurrency)
+    finally:
+        await main.shutdown_event()
+
+    results = {
+        "latency": summarize(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "elapsed_s": elapsed,
+        "status_codes": statuses,
+        "upstream_calls": dict(stand_in.calls),
+        "upstream_errors": dict(stand_in.errors),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for /recommend.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=0, help="Requests sent before measuring.")
+    parser.add_argument("--locations", type=int, default=50, help="Distinct location strings.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean stand-in upstream latency.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--places", type=int, default=15, help="Features returned per places call.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    lat = results["latency"]
+    print(f"{lat['count']} requests @ concurrency {args.concurrency}: "
+          f"p50 {lat['p50_ms']:.1f} ms  p95 {lat['p95_ms']:.1f} ms  p99 {lat['p99_ms']:.1f} ms  "
+          f"throughput {results['throughput_rps']:.1f} req/s")
+    print(f"status codes: {results['status_codes']}  upstream calls: {results['upstream_calls']}")
+    write_results(args.output, "load_test", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
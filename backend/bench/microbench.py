@@ -0,0 +1,103 @@
+"""
+Microbenchmarks for the CPU-side hot spots of /recommend and quests.
+
+    python -m backend.bench.microbench --output results/micro.json
+    python -m backend.bench.compare results/micro-old.json results/micro.json
+"""
+import time
+import random
+import asyncio
+import argparse
+import logging
+
+from backend.bench.common import summarize, write_results
+from backend.bench.upstreams import PLACE_CATEGORIES
+
+import backend.ml_utils as ml_utils
+import backend.music_utils as music_utils
+import backend.scoring as scoring
+from backend.quest_types import QuestContext
+from backend.quest_orchestrator import QuestOrchestrator
+
+WEATHER = {"temp": 28, "condition": "Clear", "desc": "clear sky"}
+
+
+def make_places(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [{
+        "name": f"Place {i}",
+        "distance": rng.randint(50, 5000),
+        "categories": rng.choice(PLACE_CATEGORIES),
+    } for i in range(n)]
+
+
+def bench(fn, iterations: int, repeat: int = 5):
+    """Times `iterations` calls per sample; returns per-call durations in seconds."""
+    fn()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations)
+    return samples
+
+
+def bench_async(coro_fn, iterations: int, repeat: int = 3):
+    async def run():
+        await coro_fn()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await coro_fn()
+            samples.append((time.perf_counter() - start) / iterations)
+        return samples
+    return asyncio.run(run())
+
+
+def to_us(summary: dict) -> dict:
+    return {k.replace("_ms", "_us"): (v * 1000 if k.endswith("_ms") else v) for k, v in summary.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for scoring, inference and quests.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[15, 100, 500])
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    # store_feedback logs at INFO; that would dominate the scoring numbers.
+    logging.getLogger("backend.ml_utils").setLevel(logging.WARNING)
+    ml_utils.load_model()
+    results = {}
+    it = args.iterations
+
+    results["predict_preferred_type"] = bench(lambda: ml_utils.predict_preferred_type("sunny", 60, 4.5, 12.0), it)
+    for n in args.candidates:
+        places = make_places(n)
+        distances = [p["distance"] / 100 for p in places]
+        results[f"predict_preferred_types[{n}]"] = bench(
+            lambda: ml_utils.predict_preferred_types("sunny", 60, distances, 4.5), max(1, it // 10))
+        results[f"score_places[{n}]"] = bench(
+            lambda: scoring.score_places(places, WEATHER, "chill", "free", 60, ml_utils.predict_preferred_types),
+            max(1, it // 10))
+
+    cats = ["catering.cafe", "leisure.park"]
+    results["generate_must_take"] = bench(lambda: scoring.generate_must_take(WEATHER, "chill", cats), it)
+    results["get_music_recommendations"] = bench(
+        lambda: music_utils.get_music_recommendations("Clear", "chill", cats), it)
+
+    orchestrator = QuestOrchestrator()
+    ctx = QuestContext(user_id="bench", location={"lat": 10.52, "lon": 76.21}, time_available=120,
+                       weather_condition="Rain", vibe_preference="Chill", budget_tier="Budget")
+    results["generate_quest"] = bench_async(lambda: orchestrator.generate_quest(ctx), 10)
+
+    report = {name: to_us(summarize(samples)) for name, samples in results.items()}
+    for name, r in report.items():
+        print(f"{name:36s} p50 {r['p50_us']:12.2f} us   min {r['min_us']:12.2f} us")
+    write_results(args.output, "microbench", vars(args), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Scaling benchmark for the quest route optimizer.
+
+Plans routes over synthetic candidate pools of growing size around one
+origin and reports planning latency, route value and how often the compute
+deadline cut the improvement loop short. With --exact-check, small pools
+are also solved by brute force to report how close the heuristic gets.
+
+    python -m backend.bench.route_bench --candidates 10 50 100 200 500 1000 \
+        --output results/route.json
+"""
+import time
+import random
+import argparse
+import itertools
+
+import numpy as np
+
+from backend.bench.common import summarize, write_results
+from backend.route_optimizer import haversine_matrix, plan_route, WALK_M_PER_MIN
+
+ORIGIN = (10.52, 76.21)
+VISIT_CHOICES = (20, 30, 45, 60)
+
+
+def make_pool(n: int, rng: random.Random, spread_deg: float = 0.04):
+    lats = [ORIGIN[0] + rng.uniform(-spread_deg, spread_deg) for _ in range(n)]
+    lons = [ORIGIN[1] + rng.uniform(-spread_deg, spread_deg) for _ in range(n)]
+    values = [rng.randint(40, 99) for _ in range(n)]
+    visits = [rng.choice(VISIT_CHOICES) for _ in range(n)]
+    return lats, lons, values, visits
+
+
+def brute_force_value(lats, lons, values, visits, budget: float, max_stops: int) -> float:
+    """Best achievable summed value, by enumerating every ordered subset."""
+    travel = haversine_matrix([ORIGIN[0]] + lats, [ORIGIN[1]] + lons) / WALK_M_PER_MIN
+    best = 0.0
+    for r in range(1, min(max_stops, len(values)) + 1):
+        for perm in itertools.permutations(range(len(values)), r):
+            path = (0,) + tuple(i + 1 for i in perm)
+            minutes = sum(travel[a, b] for a, b in zip(path, path[1:])) + sum(visits[i] for i in perm)
+            if minutes <= budget:
+                best = max(best, sum(values[i] for i in perm))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route optimizer scaling benchmark.")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 50, 100, 200, 500, 1000])
+    parser.add_argument("--budget", type=float, default=180, help="Time budget in minutes.")
+    parser.add_argument("--max-stops", type=int, default=6)
+    parser.add_argument("--deadline-ms", type=float, default=50)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--exact-check", type=int, default=0,
+                        help="Also brute-force this many pools of 7 candidates and report the optimality ratio.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    deadline = args.deadline_ms / 1000
+    report = {}
+
+    for n in args.candidates:
+        samples, values, stops, timed_out = [], [], [], 0
+        for _ in range(args.trials):
+            lats, lons, vals, visits = make_pool(n, rng)
+            start = time.perf_counter()
+            route = plan_route(ORIGIN[0], ORIGIN[1], lats, lons, vals, visits, args.budget,
+                               max_stops=args.max_stops, deadline=deadline)
+            samples.append(time.perf_counter() - start)
+            values.append(route.value)
+            stops.append(len(route.stops))
+            timed_out += route.timed_out
+            assert route.total_minutes <= args.budget + 1e-6
+        report[f"plan_route[{n}]"] = {
+            **summarize(samples),
+            "mean_value": float(np.mean(values)),
+            "mean_stops": float(np.mean(stops)),
+            "deadline_hit_ratio": timed_out / args.trials,
+        }
+
+    if args.exact_check:
+        ratios = []
+        for _ in range(args.exact_check):
+            lats, lons, vals, visits = make_pool(7, rng, spread_deg=0.02)
+            budget = rng.choice([60, 120, 180])
+            route = plan_route(ORIGIN[0], ORIGIN[1], lats, lons, vals, visits, budget,
+                               max_stops=args.max_stops, deadline=1.0)
+            optimum = brute_force_value(lats, lons, vals, visits, budget, args.max_stops)
+            ratios.append(route.value / optimum if optimum else 1.0)
+        report["optimality[7]"] = {"mean_ratio": float(np.mean(ratios)), "min_ratio": float(np.min(ratios)),
+                                   "count": len(ratios)}
+
+    for name, r in report.items():
+        if "p50_ms" in r:
+            print(f"{name:20s} p50 {r['p50_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  "
+                  f"value {r['mean_value']:7.1f}  stops {r['mean_stops']:4.1f}  deadline hit {r['deadline_hit_ratio']:.0%}")
+        else:
+            print(f"{name:20s} mean {r['mean_ratio']:.3f}  min {r['min_ratio']:.3f} of optimal")
+    write_results(args.output, "route_bench", vars(args), report)
+
+
+if __name__ == "__main__":
+    main()
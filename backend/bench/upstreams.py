@@ -0,0 +1,112 @@
+import json
+import random
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict
+
+import httpx
+
+# Category pool the places stand-in draws from, covering every scoring rule.
+PLACE_CATEGORIES = [
+    ["catering.cafe", "catering"],
+    ["leisure.park", "leisure"],
+    ["entertainment.museum", "entertainment"],
+    ["catering.restaurant", "catering"],
+    ["entertainment.culture", "entertainment"],
+    ["catering.bar", "catering"],
+    ["sport.fitness", "sport"],
+    ["commercial.books", "commercial"],
+    ["tourism.sights", "tourism"],
+]
+
+
+@dataclass
+class UpstreamProfile:
+    """Behaviour of one stand-in endpoint."""
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    # Places: number of features returned. Others ignore it.
+    payload_items: int = 15
+
+
+@dataclass
+class StandInConfig:
+    geocode: UpstreamProfile = field(default_factory=UpstreamProfile)
+    weather: UpstreamProfile = field(default_factory=UpstreamProfile)
+    places: UpstreamProfile = field(default_factory=UpstreamProfile)
+    seed: int = 42
+
+
+class UpstreamStandIn(httpx.AsyncBaseTransport):
+    """
+    httpx transport that answers the Geoapify geocode, OpenWeather and
+    Geoapify places URLs locally with synthetic payloads, configurable
+    latency, error rate and payload size. Install it with
+    http_client.start_client(transport=UpstreamStandIn(...)).
+    """
+
+    def __init__(self, config: StandInConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.calls: Dict[str, int] = {"geocode": 0, "weather": 0, "places": 0}
+        self.errors: Dict[str, int] = {"geocode": 0, "weather": 0, "places": 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.startswith("/v1/geocode"):
+            name, profile, body = "geocode", self.config.geocode, self._geocode
+        elif path.startswith("/data/2.5/weather"):
+            name, profile, body = "weather", self.config.weather, self._weather
+        elif path.startswith("/v2/places"):
+            name, profile, body = "places", self.config.places, self._places
+        else:
+            return httpx.Response(404, json={"message": "unknown stand-in path"}, request=request)
+
+        self.calls[name] += 1
+        delay = max(0.0, self.rng.gauss(profile.latency_ms, profile.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if self.rng.random() < profile.error_rate:
+            self.errors[name] += 1
+            raise httpx.ConnectError(f"stand-in {name} failure", request=request)
+
+        content = json.dumps(body(request.url.params, profile)).encode()
+        return httpx.Response(200, content=content, headers={"content-type": "application/json"},
+                              request=request)
+
+    # --- Payloads ---
+
+    def _geocode(self, params, profile):
+        text = params.get("text", "")
+        # Deterministic per location string so repeated names geocode identically.
+        digest = hashlib.sha1(text.strip().lower().encode()).digest()
+        lat = -60 + digest[0] / 255 * 120 + digest[1] / 255 * 0.01
+        lon = -180 + digest[2] / 255 * 360 + digest[3] / 255 * 0.01
+        return {"features": [{"properties": {"lat": lat, "lon": lon, "formatted": text}}]}
+
+    def _weather(self, params, profile):
+        main = self.rng.choice(["Clear", "Clouds", "Rain", "Drizzle", "Snow", "Mist"])
+        return {
+            "main": {"temp": round(self.rng.uniform(-5, 35), 1)},
+            "weather": [{"main": main, "description": main.lower()}],
+        }
+
+    def _places(self, params, profile):
+        # filter=circle:lon,lat,radius
+        lon, lat = [float(v) for v in params.get("filter", "circle:0,0,5000").split(":")[1].split(",")[:2]]
+        # Like Geoapify, only return places in one of the requested categories.
+        wanted = [c for c in params.get("categories", "").split(",") if c]
+        pool = [cats for cats in PLACE_CATEGORIES if any(w in cats for w in wanted)] or PLACE_CATEGORIES
+        features = []
+        for i in range(min(profile.payload_items, int(params.get("limit", profile.payload_items)))):
+            plat = lat + self.rng.uniform(-0.04, 0.04)
+            plon = lon + self.rng.uniform(-0.04, 0.04)
+            features.append({"properties": {
+                "name": f"Stand-in Place {i}",
+                "lat": plat,
+                "lon": plon,
+                "distance": int(self.rng.uniform(50, 5000)),
+                "categories": self.rng.choice(pool),
+            }})
+        return {"type": "FeatureCollection", "features": features}
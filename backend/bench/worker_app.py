@@ -0,0 +1,58 @@
+"""
+ASGI entry point for worker_bench.py: the PocketPlan app with its upstreams
+answered by the local stand-ins (see upstreams.py), so a multi-worker
+server can be benchmarked without network access or API quota.
+
+    BENCH_LATENCY_MS=50 uvicorn backend.bench.worker_app:app --workers 4
+
+Stand-in behaviour comes from BENCH_* environment variables. With
+BENCH_STATS_DIR set, every worker writes its upstream call counts and
+cache stats to <pid>.json there on shutdown.
+"""
+import os
+import json
+import logging
+
+import backend.main as main
+import backend.http_client as http_client
+import backend.geo_cache as geo_cache
+from backend.bench.upstreams import StandInConfig, UpstreamProfile, UpstreamStandIn
+
+LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("BENCH_JITTER_MS", "10"))
+ERROR_RATE = float(os.getenv("BENCH_ERROR_RATE", "0"))
+PLACES = int(os.getenv("BENCH_PLACES", "15"))
+SEED = int(os.getenv("BENCH_SEED", "7"))
+STATS_DIR = os.getenv("BENCH_STATS_DIR")
+
+# ml_utils configures INFO logging; one line per stand-in call drowns the output.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+app = main.app
+main.PLACES_LIMIT = PLACES
+stand_in = UpstreamStandIn(StandInConfig(
+    geocode=UpstreamProfile(LATENCY_MS, JITTER_MS, ERROR_RATE),
+    weather=UpstreamProfile(LATENCY_MS, JITTER_MS, ERROR_RATE),
+    places=UpstreamProfile(LATENCY_MS, JITTER_MS, ERROR_RATE, PLACES),
+    seed=SEED,
+))
+
+
+async def install_stand_in():
+    await http_client.start_client(transport=stand_in)
+
+
+async def write_stats():
+    if not STATS_DIR:
+        return
+    with open(os.path.join(STATS_DIR, f"{os.getpid()}.json"), "w") as f:
+        json.dump({
+            "upstream_calls": stand_in.calls,
+            "weather": geo_cache.weather_cache.stats(),
+            "places": geo_cache.places_cache.stats(),
+        }, f)
+
+
+# Ahead of main's startup hook, which would otherwise create the real client.
+app.router.on_startup.insert(0, install_stand_in)
+app.router.on_shutdown.append(write_stats)
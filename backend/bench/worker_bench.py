@@ -0,0 +1,296 @@
+"""
+Worker-count scaling benchmark.
+
+For each worker count, starts `uvicorn backend.bench.worker_app:app
+--workers N` on a fresh set of cache and database files, drives POST
+/recommend over HTTP from several load generator processes, and reports
+throughput, latency and memory per worker, including how much of the
+memory-mapped model artifact each worker really owns (its PSS).
+
+It also checks that the workers stay consistent with each other:
+history rows written against searches served, favorites saved twice
+each through different connections landing exactly once, and
+weather/places upstream calls across all workers (a tile fetched by one
+worker is served to the others from the shared tile cache). With
+--geoapify-rate / --openweather-rate set, it also checks that all workers
+together stayed within each upstream budget (burst + rate x server
+lifetime), i.e. that the budgets are per host rather than per worker.
+
+    python -m backend.bench.worker_bench --workers 1 2 4 --requests 4000 \
+        --concurrency 64 --output results/workers.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from typing import Dict, List
+
+import httpx
+
+from backend.bench.common import summarize, write_results
+from backend.bench.load_test import build_requests
+from backend.model_artifact import ARTIFACT_PATH
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker_pids(server_pid: int) -> List[int]:
+    """uvicorn's worker processes: children of the server started through multiprocessing spawn."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == server_pid and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory_kb(pid: int, artifact: str) -> Dict[str, int]:
+    """Rss and Pss of a process, and of its mappings of `artifact`, from /proc/<pid>/smaps."""
+    totals = {"rss_kb": 0, "pss_kb": 0, "artifact_rss_kb": 0, "artifact_pss_kb": 0}
+    in_artifact = False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            field = line.split()
+            if not field[0].endswith(":"):
+                # Mapping header: address perms offset dev inode [path]
+                in_artifact = len(field) >= 6 and os.path.realpath(field[5]) == artifact
+                continue
+            if field[0] in ("Rss:", "Pss:"):
+                key = field[0][:-1].lower() + "_kb"
+                totals[key] += int(field[1])
+                if in_artifact:
+                    totals["artifact_" + key] += int(field[1])
+    return totals
+
+
+def run_client(base_url: str, bodies: List[dict], concurrency: int):
+    """One load generator process. Returns (latencies, statuses, started, finished) with wall-clock bounds."""
+
+    async def drive():
+        latencies, statuses = [], {}
+        queue = list(reversed(bodies))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            async def worker():
+                while queue:
+                    body = queue.pop()
+                    start = time.perf_counter()
+                    try:
+                        status = (await client.post("/recommend", json=body)).status_code
+                    except Exception:
+                        status = "exception"
+                    latencies.append(time.perf_counter() - start)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+            started = time.time()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return latencies, statuses, started, time.time()
+
+    return asyncio.run(drive())
+
+
+def run_load(base_url: str, bodies: List[dict], concurrency: int, clients: int):
+    ctx = multiprocessing.get_context("spawn")
+    shares = [bodies[i::clients] for i in range(clients)]
+    per_client = max(1, concurrency // clients)
+    with ctx.Pool(clients) as pool:
+        parts = pool.starmap(run_client, [(base_url, share, per_client) for share in shares])
+    latencies = [x for p in parts for x in p[0]]
+    statuses: Dict[str, int] = {}
+    for p in parts:
+        for k, v in p[1].items():
+            statuses[k] = statuses.get(k, 0) + v
+    elapsed = max(p[3] for p in parts) - min(p[2] for p in parts)
+    return latencies, statuses, elapsed
+
+
+async def save_favorites(base_url: str, count: int):
+    """Saves `count` favorites twice each, concurrently and on separate connections, so copies land on different workers."""
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        bodies = [{"name": f"Bench Favorite {i}", "location": "Bench City", "score": i % 100}
+                  for i in range(count)] * 2
+        responses = await asyncio.gather(*(client.post("/favorites", json=b) for b in bodies))
+    return sum(r.status_code == 200 for r in responses)
+
+
+def wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/cache/stats", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("server did not become ready")
+
+
+def bench_workers(n: int, args) -> dict:
+    tmp = tempfile.mkdtemp(prefix=f"pocketplan-workers{n}-")
+    stats_dir = os.path.join(tmp, "stats")
+    os.makedirs(stats_dir)
+    db_path = os.path.join(tmp, "pocketplan.db")
+    env = {
+        **os.environ,
+        "GEOCODE_CACHE_PATH": os.path.join(tmp, "geocode.db"),
+        "TILE_CACHE_PATH": os.path.join(tmp, "tiles.db"),
+        "TILE_CACHE_SHARED": "0" if args.private_caches else "1",
+        "UPSTREAM_BUDGET_PATH": os.path.join(tmp, "upstream_budget.db"),
+        "POCKETPLAN_DB_PATH": db_path,
+        "POCKETPLAN_LEGACY_DATA": os.path.join(tmp, "missing.json"),
+        "PLACE_INDEX_PATH": os.path.join(tmp, "place_index.json.gz"),
+        "FEEDBACK_DIR": os.path.join(tmp, "feedback"),
+        "MODEL_ONLINE_ARTIFACT_PATH": os.path.join(tmp, "model_online.bin"),
+        "GEOAPIFY_RATE": str(args.geoapify_rate),
+        "GEOAPIFY_BURST": str(args.geoapify_burst),
+        "OPENWEATHER_RATE": str(args.openweather_rate),
+        "OPENWEATHER_BURST": str(args.openweather_burst),
+        "QUEST_PLAN_WORKERS": "0",
+        "BENCH_LATENCY_MS": str(args.latency_ms),
+        "BENCH_JITTER_MS": str(args.jitter_ms),
+        "BENCH_PLACES": str(args.places),
+        "BENCH_SEED": str(args.seed),
+        "BENCH_STATS_DIR": stats_dir,
+    }
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server_started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.bench.worker_app:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(n), "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=env)
+    try:
+        wait_ready(base_url, server)
+        warmup_ok = 0
+        if args.warmup:
+            _, warmup_statuses, _ = run_load(base_url, build_requests(args.warmup, args.locations, args.seed + 1),
+                                             args.concurrency, args.clients)
+            warmup_ok = warmup_statuses.get("200", 0)
+        bodies = build_requests(args.requests, args.locations, args.seed)
+        latencies, statuses, elapsed = run_load(base_url, bodies, args.concurrency, args.clients)
+        favorites_ok = asyncio.run(save_favorites(base_url, args.favorites))
+
+        artifact = os.path.realpath(ARTIFACT_PATH)
+        # With --workers 1 uvicorn serves from the server process itself.
+        pids = worker_pids(server.pid) or [server.pid]
+        workers = [{"pid": pid, **memory_kb(pid, artifact)} for pid in pids]
+    finally:
+        # SIGINT is uvicorn's graceful shutdown: workers flush history and write their stats.
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        server_seconds = time.monotonic() - server_started
+
+    worker_stats = []
+    for name in os.listdir(stats_dir):
+        with open(os.path.join(stats_dir, name)) as f:
+            worker_stats.append(json.load(f))
+    with sqlite3.connect(db_path) as conn:
+        history_rows = conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        favorite_rows = conn.execute("SELECT COUNT(*) FROM favorites").fetchone()[0]
+
+    upstream = {k: sum(s["upstream_calls"][k] for s in worker_stats) for k in ("geocode", "weather", "places")}
+    budgets = {}
+    for name, calls, rate, burst in (
+            ("geoapify", upstream["geocode"] + upstream["places"], args.geoapify_rate, args.geoapify_burst),
+            ("openweather", upstream["weather"], args.openweather_rate, args.openweather_burst)):
+        if rate > 0:
+            allowed = int(burst + rate * server_seconds)
+            budgets[name] = {"calls": calls, "allowed": allowed, "within": calls <= allowed}
+    return {
+        "workers": n,
+        "latency": summarize(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "status_codes": statuses,
+        "memory": {
+            "per_worker": workers,
+            "rss_mb_total": sum(w["rss_kb"] for w in workers) / 1024,
+            "pss_mb_total": sum(w["pss_kb"] for w in workers) / 1024,
+            "artifact_kb": os.path.getsize(artifact) / 1024,
+            "artifact_pss_kb_total": sum(w["artifact_pss_kb"] for w in workers),
+        },
+        "consistency": {
+            "history_rows": history_rows,
+            "searches_ok": statuses.get("200", 0) + warmup_ok,
+            "favorites_saved": favorites_ok,
+            "favorite_rows": favorite_rows,
+            "favorites_expected": args.favorites,
+        },
+        "upstream_calls": upstream,
+        "upstream_budgets": budgets,
+        "shared_tile_hits": sum(s["weather"].get("shared_hits", 0) + s["places"].get("shared_hits", 0)
+                                for s in worker_stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker-count scaling benchmark for /recommend.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2, help="Load generator processes.")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests sent before measuring.")
+    parser.add_argument("--locations", type=int, default=50, help="Distinct location strings.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean stand-in upstream latency.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--places", type=int, default=15, help="Features returned per places call.")
+    parser.add_argument("--favorites", type=int, default=200, help="Favorites saved (twice each) after the load.")
+    parser.add_argument("--geoapify-rate", type=float, default=0.0,
+                        help="Host-wide Geoapify budget in calls/s (0 = unlimited).")
+    parser.add_argument("--geoapify-burst", type=float, default=10.0)
+    parser.add_argument("--openweather-rate", type=float, default=0.0,
+                        help="Host-wide OpenWeather budget in calls/s (0 = unlimited).")
+    parser.add_argument("--openweather-burst", type=float, default=10.0)
+    parser.add_argument("--private-caches", action="store_true",
+                        help="Run with TILE_CACHE_SHARED=0, for comparison.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    runs = [bench_workers(n, args) for n in args.workers]
+    base = runs[0]["throughput_rps"] or 1.0
+    for r in runs:
+        r["speedup"] = r["throughput_rps"] / base
+        lat, mem, c = r["latency"], r["memory"], r["consistency"]
+        print(f"{r['workers']:2d} workers: {r['throughput_rps']:8.1f} req/s (x{r['speedup']:.2f})  "
+              f"p50 {lat['p50_ms']:.1f} ms  p99 {lat['p99_ms']:.1f} ms  "
+              f"RSS {mem['rss_mb_total']:.0f} MB  PSS {mem['pss_mb_total']:.0f} MB  "
+              f"artifact PSS {mem['artifact_pss_kb_total']} KB of {mem['artifact_kb']:.0f} KB")
+        print(f"    history {c['history_rows']}/{c['searches_ok']}  "
+              f"favorites {c['favorite_rows']}/{c['favorites_expected']}  "
+              f"upstream calls {r['upstream_calls']}  shared tile hits {r['shared_tile_hits']}")
+        for name, b in r["upstream_budgets"].items():
+            print(f"    {name} budget: {b['calls']} calls, {b['allowed']} allowed "
+                  f"({'within budget' if b['within'] else 'OVER BUDGET'})")
+    write_results(args.output, "worker_bench", vars(args), {"runs": runs, "cpu_count": os.cpu_count()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import numpy as np
+from typing import Dict, Iterable, Optional
+
+# Feature order the model was trained with (see train_model.py).
+WEATHER, TIME, DISTANCE, RATING = range(4)
+
+# Time choices offered by the frontend and the rating /recommend always sends.
+SERVING_TIMES = (30, 60, 120, 180)
+SERVING_RATINGS = (4.5,)
+
+
+def _envelope(a: np.ndarray, b: np.ndarray):
+    """
+    For class scores a_k + b_k * d, returns (breakpoints, labels) such that
+    argmax_k is labels[j] on the interval breakpoints[j-1] <= d < breakpoints[j].
+
+    Between two consecutive pairwise intersections the argmax cannot change,
+    so evaluating one point inside every such interval gives the exact
+    piecewise answer.
+    """
+    k = len(a)
+    cuts = []
+    for i in range(k):
+        for j in range(i + 1, k):
+            if b[i] != b[j]:
+                cuts.append((a[i] - a[j]) / (b[j] - b[i]))
+    cuts = np.unique(np.array(cuts, dtype=np.float64))
+
+    if len(cuts) == 0:
+        probes = np.array([0.0])
+    else:
+        span = max(1.0, float(cuts[-1] - cuts[0]))
+        probes = np.concatenate([[cuts[0] - span], (cuts[:-1] + cuts[1:]) / 2, [cuts[-1] + span]])
+    winners = (probes[:, None] * b[None, :] + a[None, :]).argmax(axis=1)
+
+    breakpoints, labels = [], [int(winners[0])]
+    for cut, winner in zip(cuts, winners[1:]):
+        if winner != labels[-1]:
+            breakpoints.append(cut)
+            labels.append(int(winner))
+    return np.array(breakpoints, dtype=np.float64), np.array(labels, dtype=np.int16)
+
+
+def compile_table(coef: np.ndarray, intercept: np.ndarray, n_weather: int,
+                  times: Iterable[float], ratings: Iterable[float]) -> Dict[str, np.ndarray]:
+    """
+    Compiles a multinomial linear model (coef shaped (n_classes, 4)) into a
+    flat table over (weather, time, rating) cells. Each cell stores the exact
+    distance breakpoints where the predicted class changes, padded with +inf,
+    and the class index for each interval, padded with the last class.
+    """
+    coef = np.asarray(coef, dtype=np.float64)
+    intercept = np.asarray(intercept, dtype=np.float64)
+    if coef.shape[0] == 1:
+        # Binary model: class 1 wins where the single decision value is > 0.
+        coef = np.vstack([np.zeros_like(coef[0]), coef[0]])
+        intercept = np.array([0.0, intercept[0]])
+    n_classes = coef.shape[0]
+
+    times = np.array(sorted(set(float(t) for t in times)), dtype=np.float64)
+    ratings = np.array(sorted(set(float(r) for r in ratings)), dtype=np.float64)
+    n_cells = n_weather * len(times) * len(ratings)
+    breakpoints = np.full((n_cells, n_classes - 1), np.inf, dtype=np.float64)
+    labels = np.zeros((n_cells, n_classes), dtype=np.int16)
+
+    cell = 0
+    for w in range(n_weather):
+        for t in times:
+            for r in ratings:
+                a = intercept + coef[:, WEATHER] * w + coef[:, TIME] * t + coef[:, RATING] * r
+                cuts, winners = _envelope(a, coef[:, DISTANCE])
+                breakpoints[cell, :len(cuts)] = cuts
+                labels[cell, :len(winners)] = winners
+                labels[cell, len(winners):] = winners[-1]
+                cell += 1
+
+    return {"table_times": times, "table_ratings": ratings,
+            "table_breakpoints": breakpoints, "table_labels": labels}
+
+
+class DecisionTable:
+    """Serving-side lookup over a compiled table. Cells are found by dict lookups, distances by searchsorted."""
+
+    def __init__(self, times: np.ndarray, ratings: np.ndarray, breakpoints: np.ndarray, labels: np.ndarray):
+        self.time_index = {float(t): i for i, t in enumerate(times)}
+        self.rating_index = {float(r): i for i, r in enumerate(ratings)}
+        self.n_times = len(times)
+        self.n_ratings = len(ratings)
+        self.breakpoints = breakpoints
+        self.labels = labels
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> Optional["DecisionTable"]:
+        if "table_breakpoints" not in arrays:
+            return None
+        return cls(arrays["table_times"], arrays["table_ratings"],
+                   arrays["table_breakpoints"], arrays["table_labels"])
+
+    def cell(self, weather_idx: int, time_available: float, rating: float) -> Optional[int]:
+        t = self.time_index.get(float(time_available))
+        r = self.rating_index.get(float(rating))
+        if t is None or r is None:
+            return None
+        return (weather_idx * self.n_times + t) * self.n_ratings + r
+
+    def lookup(self, cell: int, distance) -> np.ndarray:
+        """Class index for each distance in one cell."""
+        j = np.searchsorted(self.breakpoints[cell], np.asarray(distance, dtype=np.float64), side="right")
+        return self.labels[cell][j]
+
+
+def verify_table(table: DecisionTable, predict_idx, X: np.ndarray) -> int:
+    """
+    Counts rows of X (columns in model feature order, weather already
+    encoded) where the table disagrees with `predict_idx(X)`, the model's own
+    class-index prediction. Rows outside the table's grid are skipped.
+    """
+    expected = np.asarray(predict_idx(X))
+    mismatches = 0
+    for row, want in zip(X, expected):
+        cell = table.cell(int(row[WEATHER]), row[TIME], row[RATING])
+        if cell is None:
+            continue
+        if int(table.lookup(cell, row[DISTANCE])) != int(want):
+            mismatches += 1
+    return mismatches
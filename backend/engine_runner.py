@@ -0,0 +1,226 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ENGINE_CALLS = metrics.counter(
+    "pocketplan_quest_engine_calls_total",
+    "QuestOrchestrator engine calls by engine and outcome "
+    "(ok, hedged_ok, timeout, error, circuit_open, skipped).",
+    ["engine", "outcome"],
+)
+
+# Outcomes where the engine's result was used; anything else means the
+# engine's default was substituted.
+SUCCESS_OUTCOMES = ("ok", "hedged_ok")
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (errors or
+    timeouts) and rejects calls for `reset_timeout` seconds. After that one
+    trial call is let through (half-open); it closes the breaker on success
+    and re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release_trial(self):
+        """Gives up a half-open trial that ended without a result (cancelled), so another call can try."""
+        self._trial_running = False
+
+
+class EngineSpec:
+    """
+    How one engine is called: its own timeout (further capped by the quest
+    deadline), the value used when it cannot answer in time, an optional
+    hedge delay after which a second attempt races the first, and how many
+    calls may be in flight at once.
+    """
+
+    def __init__(self, name: str, timeout: float, default: Any, hedge_after: Optional[float] = None,
+                 max_concurrency: int = 16, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.timeout = timeout
+        self.default = default
+        self.hedge_after = hedge_after
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+
+class QuestTrace:
+    """
+    Timing trace of one quest: a span per engine call or local stage,
+    relative to the quest start. Spans are also recorded in the quest stage
+    histogram.
+    """
+
+    def __init__(self, deadline: float):
+        self.started = time.perf_counter()
+        self.deadline_at = self.started + deadline
+        self.spans: List[dict] = []
+
+    def remaining(self) -> float:
+        return self.deadline_at - time.perf_counter()
+
+    def add(self, name: str, start: float, outcome: str, attempts: int = 1):
+        elapsed = time.perf_counter() - start
+        metrics.QUEST_STAGE_SECONDS.labels(name).observe(elapsed)
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round(elapsed * 1000, 3),
+            "outcome": outcome,
+            "attempts": attempts,
+        })
+
+    @contextmanager
+    def stage(self, name: str):
+        """Traces a local (CPU) stage such as route planning."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.add(name, start, outcome)
+
+    def to_dict(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "deadline_ms": round((self.deadline_at - self.started) * 1000, 3),
+            "degraded": [s["name"] for s in self.spans if s["outcome"] not in SUCCESS_OUTCOMES],
+            "spans": self.spans,
+        }
+
+
+class EngineRunner:
+    """
+    Runs the orchestrator's engines so that quest latency is bounded by the
+    quest deadline rather than by the slowest engine: each call gets
+    min(engine timeout, time left), failures and timeouts fall back to the
+    engine's default, and every call lands in the quest's trace.
+    """
+
+    def __init__(self, specs: List[EngineSpec]):
+        self.specs: Dict[str, EngineSpec] = {s.name: s for s in specs}
+
+    async def _attempt(self, spec: EngineSpec, call: Callable[[], Awaitable[Any]], wait: bool):
+        """One call holding one of the engine's concurrency slots. With wait=False, gives up if none is free."""
+        if not wait and spec.semaphore.locked():
+            raise _NoSlot()
+        async with spec.semaphore:
+            return await call()
+
+    async def _race(self, spec: EngineSpec, call: Callable[[], Awaitable[Any]]):
+        """Primary attempt, plus a hedge after spec.hedge_after. Returns (value, attempts, hedge_won)."""
+        primary = asyncio.ensure_future(self._attempt(spec, call, wait=True))
+        if spec.hedge_after is None:
+            return await primary, 1, False
+
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=spec.hedge_after)
+            if done:
+                return primary.result(), 1, False
+
+            hedge = asyncio.ensure_future(self._attempt(spec, call, wait=False))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), 2, task is hedge
+                    if not isinstance(task.exception(), _NoSlot):
+                        error = task.exception()
+            raise error or RuntimeError(f"{spec.name} failed")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def run(self, name: str, call: Callable[[], Awaitable[Any]], trace: QuestTrace) -> Any:
+        """
+        Calls `call()` (a factory, so a hedge can start a fresh attempt) as
+        engine `name` and returns its result, or the engine's default when
+        the breaker is open, no time is left, or the call fails or is late.
+        """
+        spec = self.specs[name]
+        start = time.perf_counter()
+        budget = min(spec.timeout, trace.remaining())
+        attempts = 0
+
+        if budget <= 0:
+            outcome = "skipped"
+        elif not spec.breaker.allow():
+            outcome = "circuit_open"
+        else:
+            try:
+                value, attempts, hedged = await asyncio.wait_for(self._race(spec, call), budget)
+                spec.breaker.record_success()
+                outcome = "hedged_ok" if hedged else "ok"
+                ENGINE_CALLS.labels(name, outcome).inc()
+                trace.add(name, start, outcome, attempts)
+                return value
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                spec.breaker.record_failure()
+            except asyncio.CancelledError:
+                spec.breaker.release_trial()
+                raise
+            except Exception as e:
+                logger.warning(f"Quest engine {name} failed: {e}")
+                outcome = "error"
+                spec.breaker.record_failure()
+
+        ENGINE_CALLS.labels(name, outcome).inc()
+        trace.add(name, start, outcome, attempts)
+        return spec.default() if callable(spec.default) else spec.default
+
+    def stats(self) -> dict:
+        return {name: {"breaker": s.breaker.state, "failures": s.breaker.failures,
+                       "in_flight": s.max_concurrency - s.semaphore._value}
+                for name, s in self.specs.items()}
+
+
+class _NoSlot(Exception):
+    """A hedge found the engine's concurrency limit reached."""
@@ -0,0 +1,445 @@
+"""
+Feedback pipeline: a non-blocking sink for feedback events, a background
+writer that appends them to rotating CSV files, and an online learner that
+keeps training the place-type model on explicit feedback and publishes new
+model versions that serving hot-swaps to.
+
+Events come from two sources:
+
+- "predicted": the ML predictions /recommend acted on (its cards carried the
+  "AI suggests" reason). These are logged for analysis only; training on
+  them would only teach the model its own answers.
+- "chosen": explicit feedback (POST /feedback), the place type a user
+  actually picked in a given context. Only these train the model.
+
+With several worker processes, every worker writes its own feedback files
+but only one, the holder of a lock file in FEEDBACK_DIR, runs the online
+learner. It trains on its own events plus the rows the other workers append
+to their files, and the others pick up what it publishes by polling.
+
+Rows carry the training_data.csv columns, in the units the model is fed,
+plus a timestamp and the source, so chosen rows can be folded into the
+offline training set.
+"""
+import os
+import io
+import csv
+import glob
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, assume a single worker.
+    fcntl = None
+
+from backend import metrics, model_artifact
+from backend import ml_utils
+from backend import response_cache
+from backend import decision_table
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", os.path.join(BASE_DIR, "feedback"))
+FEEDBACK_QUEUE_SIZE = int(os.getenv("FEEDBACK_QUEUE_SIZE", "10000"))
+FEEDBACK_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "2.0"))
+FEEDBACK_ROTATE_BYTES = int(os.getenv("FEEDBACK_ROTATE_BYTES", str(8 * 1024 * 1024)))
+FEEDBACK_KEEP_FILES = int(os.getenv("FEEDBACK_KEEP_FILES", "50"))
+
+ONLINE_LEARNING = os.getenv("ONLINE_LEARNING", "1") == "1"
+# A new version is published at most this often, and only after this many
+# new chosen events.
+ONLINE_PUBLISH_INTERVAL = float(os.getenv("ONLINE_PUBLISH_INTERVAL", "300"))
+ONLINE_MIN_EVENTS = int(os.getenv("ONLINE_MIN_EVENTS", "50"))
+ONLINE_LEARNING_RATE = float(os.getenv("ONLINE_LEARNING_RATE", "0.01"))
+# Pull towards the weights the learner started from (the offline model).
+ONLINE_L2 = float(os.getenv("ONLINE_L2", "0.001"))
+# How often serving checks the artifact files for a version published
+# elsewhere (another worker, or train_model.py).
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "30"))
+
+COLUMNS = ["timestamp", "source", "weather", "time_available", "distance", "rating", "preferred_type"]
+
+FEEDBACK_EVENTS = metrics.counter(
+    "pocketplan_feedback_events_total",
+    "Feedback events by outcome (queued, dropped = queue full, written).",
+    ["outcome"],
+)
+MODEL_PUBLISHES = metrics.counter(
+    "pocketplan_online_model_publishes_total",
+    "Online learner publish attempts by result (published, rejected = no better than the served model).",
+    ["result"],
+)
+
+Row = Tuple[float, str, str, int, float, float, str]
+
+
+class FeedbackSink:
+    """
+    Bounded in-memory queue of feedback rows. record() never blocks and never
+    does I/O: when the queue is full the event is dropped and counted.
+    """
+
+    def __init__(self, maxsize: int = FEEDBACK_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._rows: Deque[Row] = deque()
+        self.queued = 0
+        self.dropped = 0
+
+    def record(self, source: str, weather: str, time_available: int, distance: float,
+               rating: float, preferred_type: str) -> bool:
+        if len(self._rows) >= self.maxsize:
+            self.dropped += 1
+            FEEDBACK_EVENTS.labels("dropped").inc()
+            return False
+        self._rows.append((time.time(), source, weather, int(time_available), float(distance),
+                           float(rating), preferred_type))
+        self.queued += 1
+        FEEDBACK_EVENTS.labels("queued").inc()
+        return True
+
+    def drain(self) -> List[Row]:
+        rows = []
+        while self._rows:
+            rows.append(self._rows.popleft())
+        return rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class FeedbackWriter:
+    """
+    Appends rows to feedback-<time>-<pid>-<n>.csv files in `directory`, starting
+    a new file once the current one reaches `rotate_bytes` and deleting the
+    oldest beyond `keep_files`. Not thread-safe; called from one thread at a time.
+    """
+
+    def __init__(self, directory: str = FEEDBACK_DIR, rotate_bytes: int = FEEDBACK_ROTATE_BYTES,
+                 keep_files: int = FEEDBACK_KEEP_FILES):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.keep_files = keep_files
+        self.path: Optional[str] = None
+        self.files = 0
+        self.written = 0
+
+    def _rotate(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # The pid keeps workers sharing the directory out of each other's files.
+        self.files += 1
+        name = f"feedback-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.files}.csv"
+        self.path = os.path.join(self.directory, name)
+        with open(self.path, "w", newline="") as f:
+            csv.writer(f).writerow(COLUMNS)
+        files = sorted(glob.glob(os.path.join(self.directory, "feedback-*.csv")), key=os.path.getmtime)
+        for old in files[:-self.keep_files]:
+            if old != self.path:
+                os.remove(old)
+
+    def write(self, rows: List[Row]):
+        if self.path is None or not os.path.exists(self.path) or os.path.getsize(self.path) >= self.rotate_bytes:
+            self._rotate()
+        with open(self.path, "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+        self.written += len(rows)
+        FEEDBACK_EVENTS.labels("written").inc(len(rows))
+
+
+class FeedbackTail:
+    """
+    Reads the rows other workers have appended to their feedback files since
+    the previous call. Only whole lines are consumed, so a row being written
+    is picked up next time. The first call just records where every existing
+    file ends: those rows were seen by whichever learner ran before.
+    """
+
+    def __init__(self, directory: str = FEEDBACK_DIR):
+        self.directory = directory
+        self.offsets: Dict[str, int] = {}
+        self._primed = False
+
+    @staticmethod
+    def _pid(path: str) -> str:
+        # feedback-<date>-<time>-<pid>-<n>.csv
+        return os.path.basename(path).rsplit("-", 2)[-2]
+
+    def read(self) -> List[Row]:
+        paths = glob.glob(os.path.join(self.directory, "feedback-*.csv"))
+        if not self._primed:
+            self._primed = True
+            self.offsets = {p: os.path.getsize(p) for p in paths}
+            return []
+        own = str(os.getpid())
+        rows = []
+        for path in paths:
+            if self._pid(path) == own:
+                continue
+            offset = self.offsets.get(path, 0)
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+            except OSError:
+                continue
+            end = data.rfind(b"\n") + 1
+            if not end:
+                continue
+            self.offsets[path] = offset + end
+            for r in csv.reader(io.StringIO(data[:end].decode("utf-8"))):
+                if len(r) != len(COLUMNS) or r == COLUMNS:
+                    continue
+                try:
+                    rows.append((float(r[0]), r[1], r[2], int(r[3]), float(r[4]), float(r[5]), r[6]))
+                except ValueError:
+                    logger.warning(f"Skipping malformed feedback row in {path}: {r}")
+        self.offsets = {p: o for p, o in self.offsets.items() if p in paths}
+        return rows
+
+
+class LearnerLock:
+    """
+    Non-blocking exclusive flock on a file, held until the process exits, so
+    one worker on the host runs the online learner. When that worker dies
+    the OS drops the lock and the next worker to try takes over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None or fcntl is None
+
+    def try_acquire(self) -> bool:
+        if self.held:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        logger.info(f"Worker {os.getpid()} runs the online learner.")
+        return True
+
+
+class OnlineLearner:
+    """
+    Multinomial logistic regression on the four model features, trained one
+    batch at a time (partial_fit) with AdaGrad, warm-started from the served
+    LinearPredictor. Implemented in numpy so serving never imports
+    scikit-learn. Features are divided by fixed scales so one learning rate
+    suits all of them.
+
+    Candidates are checked prequentially: each batch is predicted by both
+    the learner and the served model before the learner trains on it, and a
+    version is only published if the learner got at least as many right.
+    """
+
+    def __init__(self, predictor: "ml_utils.LinearPredictor", learning_rate: float = ONLINE_LEARNING_RATE,
+                 l2: float = ONLINE_L2):
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.base_version = ml_utils.model_version()
+        self.weather_classes = list(predictor.weather_index)
+        self.weather_index = dict(predictor.weather_index)
+        self.labels = [str(l) for l in predictor.labels]
+        self.label_index = {l: i for i, l in enumerate(self.labels)}
+        self.times = sorted(set(decision_table.SERVING_TIMES)
+                            | set(predictor.table.time_index if predictor.table else ()))
+        self.ratings = sorted(set(decision_table.SERVING_RATINGS)
+                              | set(predictor.table.rating_index if predictor.table else ()))
+
+        coef = np.array(predictor.coef, dtype=np.float64)  # (n_features, n_classes)
+        intercept = np.array(predictor.intercept, dtype=np.float64)
+        if coef.shape[1] == 1:
+            # Binary model: the same decision as two classes scoring 0 and w.x + b.
+            coef = np.hstack([np.zeros_like(coef), coef])
+            intercept = np.array([0.0, intercept[0]])
+        self.scale = np.array([max(len(self.weather_classes) - 1, 1), max(self.times), 100.0, 5.0])
+        # Weights in scaled-feature space: x / scale @ (coef * scale[:, None]) == x @ coef.
+        self.W = coef * self.scale[:, None]
+        self.b = intercept
+        self.prior_W, self.prior_b = self.W.copy(), self.b.copy()
+        self._gW = np.zeros_like(self.W)
+        self._gb = np.zeros_like(self.b)
+
+        self.samples = 0
+        self.pending = 0
+        self.correct = 0
+        self.served_correct = 0
+        self.last_publish = time.monotonic()
+
+    def encode(self, rows: List[Row]) -> Tuple[np.ndarray, np.ndarray]:
+        """Feature matrix and label indices for rows with a known label. Unknown weather encodes as 0, as in serving."""
+        known = [r for r in rows if r[6] in self.label_index]
+        X = np.array([[self.weather_index.get(r[2], 0), r[3], r[4], r[5]] for r in known], dtype=np.float64)
+        y = np.array([self.label_index[r[6]] for r in known], dtype=np.intp)
+        return X.reshape(-1, 4), y
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        Xs = X / self.scale
+        scores = Xs @ self.W + self.b
+        self.correct += int((scores.argmax(axis=1) == y).sum())
+        z = np.exp(scores - scores.max(axis=1, keepdims=True))
+        proba = z / z.sum(axis=1, keepdims=True)
+        proba[np.arange(len(y)), y] -= 1.0
+        grad_W = Xs.T @ proba / len(y) + self.l2 * (self.W - self.prior_W)
+        grad_b = proba.mean(axis=0) + self.l2 * (self.b - self.prior_b)
+        self._gW += grad_W ** 2
+        self._gb += grad_b ** 2
+        self.W -= self.learning_rate * grad_W / (np.sqrt(self._gW) + 1e-8)
+        self.b -= self.learning_rate * grad_b / (np.sqrt(self._gb) + 1e-8)
+        self.samples += len(y)
+        self.pending += len(y)
+
+    def observe(self, rows: List[Row], served: Optional["ml_utils.LinearPredictor"]):
+        X, y = self.encode(rows)
+        if len(y) == 0:
+            return
+        if served is not None:
+            predicted = served.predict([self.weather_classes[int(w)] for w in X[:, 0]], X[:, 1], X[:, 2], X[:, 3])
+            self.served_correct += int((np.asarray(predicted) == np.asarray(self.labels, dtype=object)[y]).sum())
+        self.partial_fit(X, y)
+
+    def due(self) -> bool:
+        return self.pending >= ONLINE_MIN_EVENTS and time.monotonic() - self.last_publish >= ONLINE_PUBLISH_INTERVAL
+
+    def export(self) -> Tuple[dict, dict]:
+        """(arrays, metadata) in the layout train_model.export_artifact writes, decision table included."""
+        coef = (self.W / self.scale[:, None]).T  # back to sklearn's (n_classes, n_features)
+        arrays = {"coef": np.ascontiguousarray(coef), "intercept": self.b.copy()}
+        arrays.update(decision_table.compile_table(coef, self.b, len(self.weather_classes), self.times, self.ratings))
+        metadata = {
+            "model_type": "OnlineLogisticRegression",
+            "features": ["weather_encoded", "time_available", "distance", "rating"],
+            "weather_classes": self.weather_classes,
+            "labels": self.labels,
+            "base_version": self.base_version,
+            "online_samples": self.samples,
+        }
+        return arrays, metadata
+
+    def reset_window(self):
+        self.pending = self.correct = self.served_correct = 0
+        self.last_publish = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "base_version": self.base_version,
+            "samples": self.samples,
+            "pending": self.pending,
+            "window_accuracy": round(self.correct / self.pending, 4) if self.pending else None,
+            "served_window_accuracy": round(self.served_correct / self.pending, 4) if self.pending else None,
+        }
+
+
+class FeedbackPipeline:
+    """Drains the sink every FEEDBACK_FLUSH_INTERVAL, writes the rows, trains and publishes."""
+
+    def __init__(self, sink: FeedbackSink, writer: FeedbackWriter, online: bool = ONLINE_LEARNING,
+                 lock: Optional[LearnerLock] = None):
+        self.sink = sink
+        self.writer = writer
+        self.online = online
+        self.lock = lock or LearnerLock(os.path.join(writer.directory, "learner.lock"))
+        self.tail: Optional[FeedbackTail] = None
+        self.learner: Optional[OnlineLearner] = None
+        self.published = 0
+        self._last_poll = time.monotonic()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(FEEDBACK_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_poll >= MODEL_POLL_INTERVAL:
+                    self._last_poll = time.monotonic()
+                    await self.poll_model()
+            except Exception as e:
+                logger.error(f"Feedback pipeline error: {e}")
+
+    async def flush(self):
+        rows = self.sink.drain()
+        if rows:
+            await asyncio.to_thread(self.writer.write, rows)
+        if not self.online or not self.lock.try_acquire():
+            return
+        if self.tail is None:
+            self.tail = FeedbackTail(self.writer.directory)
+        rows += await asyncio.to_thread(self.tail.read)
+        chosen = [r for r in rows if r[1] == "chosen"]
+        served = ml_utils.current_predictor()
+        if not chosen or served is None:
+            return
+        if self.learner is None or self.learner.base_version != ml_utils.model_version():
+            if self.learner is not None and self.learner.pending:
+                logger.info("Served model changed underneath the online learner, restarting from it.")
+            self.learner = OnlineLearner(served)
+        self.learner.observe(chosen, served)
+        if self.learner.due():
+            await self.publish()
+
+    async def publish(self):
+        learner = self.learner
+        if learner.correct < learner.served_correct:
+            MODEL_PUBLISHES.labels("rejected").inc()
+            logger.info(f"Online model not published: {learner.correct} vs {learner.served_correct} "
+                        f"of the last {learner.pending} chosen events right.")
+            learner.reset_window()
+            return
+        arrays, metadata = learner.export()
+        header = await asyncio.to_thread(
+            model_artifact.write_artifact, model_artifact.ONLINE_ARTIFACT_PATH, arrays, metadata)
+        swap_model(model_artifact.ONLINE_ARTIFACT_PATH)
+        learner.base_version = ml_utils.model_version()
+        learner.reset_window()
+        self.published += 1
+        MODEL_PUBLISHES.labels("published").inc()
+        logger.info(f"Published online model {header['model_version']} after {learner.samples} samples.")
+
+    async def poll_model(self):
+        """Picks up a version published by another worker or by train_model.py."""
+        path = await asyncio.to_thread(ml_utils.newest_artifact_path)
+        if path is None:
+            return
+        header, _ = await asyncio.to_thread(model_artifact.read_header, path)
+        if header["model_version"] != ml_utils.model_version():
+            swap_model(path)
+
+    def stats(self) -> dict:
+        return {
+            "queue": len(self.sink),
+            "queued": self.sink.queued,
+            "dropped": self.sink.dropped,
+            "written": self.writer.written,
+            "file": self.writer.path,
+            "model_version": ml_utils.model_version(),
+            "learner_worker": self.online and self.lock.held,
+            "published": self.published,
+            "learner": self.learner.stats() if self.learner else None,
+        }
+
+
+def swap_model(path: str):
+    """
+    Serves the artifact at `path` from the next prediction on. Cached
+    /recommend bodies carry the old model's reasons, so they are dropped.
+    """
+    if ml_utils.load_artifact(path):
+        response_cache.responses.invalidate()
+
+
+sink = FeedbackSink()
+pipeline = FeedbackPipeline(sink, FeedbackWriter())
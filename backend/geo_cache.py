@@ -0,0 +1,327 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Geohash precision 5 is a ~4.9km x 4.9km cell, 6 is ~1.2km x 0.6km.
+WEATHER_TILE_PRECISION = int(os.getenv("WEATHER_TILE_PRECISION", "5"))
+PLACES_TILE_PRECISION = int(os.getenv("PLACES_TILE_PRECISION", "6"))
+WEATHER_TTL = float(os.getenv("WEATHER_CACHE_TTL", str(10 * 60)))
+WEATHER_MAX_STALE = float(os.getenv("WEATHER_CACHE_MAX_STALE", str(60 * 60)))
+PLACES_TTL = float(os.getenv("PLACES_CACHE_TTL", str(6 * 3600)))
+PLACES_MAX_STALE = float(os.getenv("PLACES_CACHE_MAX_STALE", str(24 * 3600)))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "2048"))
+PLACES_CACHE_SIZE = int(os.getenv("PLACES_CACHE_SIZE", "4096"))
+# Second tier shared by every worker process on the host. Set
+# TILE_CACHE_SHARED=0 to keep each process's tiles private.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TILE_CACHE_PATH = os.getenv("TILE_CACHE_PATH", os.path.join(BASE_DIR, "tile_cache.db"))
+TILE_CACHE_SHARED = os.getenv("TILE_CACHE_SHARED", "1") == "1"
+# Expired rows are deleted once every this many writes.
+TILE_CACHE_PRUNE_EVERY = 500
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+# --- Geo Helpers ---
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Encodes a coordinate as a geohash string of the given length."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_bounds(tile: str) -> Tuple[float, float, float, float]:
+    """Returns (lat_min, lat_max, lon_min, lon_max) for a geohash tile."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for c in tile:
+        v = _BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def normalize_categories(categories: str) -> str:
+    """Order-insensitive key for a comma separated Geoapify category string."""
+    return ",".join(sorted({c.strip().lower() for c in categories.split(",") if c.strip()}))
+
+
+def weather_key(lat: float, lon: float) -> str:
+    return geohash(lat, lon, WEATHER_TILE_PRECISION)
+
+
+def places_key(lat: float, lon: float, categories: str) -> str:
+    return f"{geohash(lat, lon, PLACES_TILE_PRECISION)}|{normalize_categories(categories)}"
+
+
+# --- Shared Tier ---
+
+class SharedTileStore:
+    """
+    SQLite file (WAL mode) holding weather and places tiles for every worker
+    on the host, behind each process's in-memory TileCache. A tile fetched
+    by one worker is a hit for the others, and entries keep the time they
+    were fetched so every process judges freshness the same way. Values are
+    stored as JSON.
+    """
+
+    def __init__(self, path: str = TILE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tiles ("
+                " cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (cache, key))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, cache: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Returns (value, stored_at) for an unexpired entry, or None."""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value, stored_at FROM tiles WHERE cache = ? AND key = ? AND expires_at > ?",
+                    (cache, key, time.time()),
+                ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Tile cache read failed: {e}")
+            return None
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def set(self, cache: str, key: str, value: Any, stored_at: float, expires_at: float):
+        try:
+            payload = json.dumps(value)
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    # An older fetch finishing late must not replace a newer one.
+                    conn.execute(
+                        "INSERT INTO tiles (cache, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (cache, key) DO UPDATE SET value = excluded.value,"
+                        " stored_at = excluded.stored_at, expires_at = excluded.expires_at"
+                        " WHERE excluded.stored_at >= tiles.stored_at",
+                        (cache, key, payload, stored_at, expires_at),
+                    )
+                    self._writes += 1
+                    if self._writes % TILE_CACHE_PRUNE_EVERY == 0:
+                        conn.execute("DELETE FROM tiles WHERE expires_at <= ?", (time.time(),))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self.errors += 1
+            logger.warning(f"Tile cache write failed for {cache} {key}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# --- TTL Cache ---
+
+class TileCache:
+    """
+    Bounded LRU with TTL and stale-while-revalidate semantics.
+
+    Entries younger than `ttl` are served as-is. Entries between `ttl` and
+    `ttl + max_stale` are served immediately while a single background
+    refresh replaces them. Anything older is treated as a miss. Concurrent
+    misses for one key share a single load.
+
+    With a `shared` store, entries that are missing or past `ttl` here are
+    looked up there before loading, and every load is written through to
+    it, so worker processes share fetches. peek() and fresh_until() only
+    look at this process's entries.
+    """
+
+    def __init__(self, name: str, ttl: float, max_stale: float, max_entries: int,
+                 shared: Optional[SharedTileStore] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._flight = SingleFlight(name)
+        self.shared = shared
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    def peek(self, key: str, allow_stale: bool = True, allow_expired: bool = False) -> Optional[Any]:
+        """
+        Returns a cached value without loading, or None. `allow_expired`
+        also returns entries past max_stale that have not been evicted yet,
+        for degraded answers when the upstream cannot be asked.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if allow_expired:
+            return entry[0]
+        age = time.time() - entry[1]
+        if age > self.ttl + (self.max_stale if allow_stale else 0):
+            return None
+        return entry[0]
+
+    def fresh_until(self, key: str) -> Optional[float]:
+        """Timestamp at which the entry for `key` stops being fresh, or None."""
+        entry = self._entries.get(key)
+        return entry[1] + self.ttl if entry is not None else None
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None):
+        self._entries[key] = (value, time.time() if stored_at is None else stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def _store(self, key: str, value: Any):
+        """Caches a freshly loaded value here and, when configured, in the shared store."""
+        stored_at = time.time()
+        self.set(key, value, stored_at)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, self.name, key, value, stored_at,
+                                    stored_at + self.ttl + self.max_stale)
+
+    async def _shared_entry(self, key: str, entry: Optional[Tuple[Any, float]]):
+        """The shared store's entry for `key` if it is newer than `entry`, which it then replaces."""
+        shared = await asyncio.to_thread(self.shared.get, self.name, key)
+        if shared is None or (entry is not None and shared[1] <= entry[1]):
+            return entry
+        self.shared_hits += 1
+        self.set(key, shared[0], shared[1])
+        return shared
+
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        try:
+            await self._store(key, await loader())
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"{self.name} cache refresh failed for {key}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serves from cache when possible, otherwise awaits `loader()` and stores its result."""
+        entry = self._entries.get(key)
+        if self.shared is not None and (entry is None or time.time() - entry[1] > self.ttl):
+            # Another worker may have fetched (or refreshed) this tile.
+            entry = await self._shared_entry(key, entry)
+        if entry is not None:
+            age = time.time() - entry[1]
+            if age <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if age <= self.ttl + self.max_stale:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, loader))
+                return entry[0]
+
+        self.misses += 1
+
+        async def load():
+            value = await loader()
+            await self._store(key, value)
+            return value
+
+        return await self._flight.do(key, load)
+
+    def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "hit_ratio": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+            "singleflight": self._flight.stats(),
+        }
+
+
+shared_tiles = SharedTileStore() if TILE_CACHE_SHARED else None
+weather_cache = TileCache("weather", WEATHER_TTL, WEATHER_MAX_STALE, WEATHER_CACHE_SIZE, shared_tiles)
+places_cache = TileCache("places", PLACES_TTL, PLACES_MAX_STALE, PLACES_CACHE_SIZE, shared_tiles)
@@ -0,0 +1,155 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(BASE_DIR, "geocode_cache.db"))
+MEMORY_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "4096"))
+POSITIVE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))  # 30 days
+NEGATIVE_TTL = float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL", str(3600)))  # 1 hour
+
+Coordinates = Optional[Tuple[float, float]]
+
+# Sentinel returned by lookups when nothing usable is cached.
+MISS = object()
+
+
+def normalize_location(location: str) -> str:
+    """Normalizes a free-text location so equivalent spellings share an entry."""
+    text = unicodedata.normalize("NFKC", location or "")
+    return " ".join(text.casefold().split())
+
+
+class GeocodeCache:
+    """
+    Two-tier geocode cache: a bounded in-process LRU in front of an SQLite
+    file that survives restarts and is shared by every worker on the host.
+    `None` values are negative results ("location not found") and expire
+    after NEGATIVE_TTL instead of POSITIVE_TTL.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MEMORY_SIZE,
+                 ttl: float = POSITIVE_TTL, negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[Coordinates, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    # --- Disk Tier ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " key TEXT PRIMARY KEY, lat REAL, lon REAL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key: str):
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT lat, lon, expires_at FROM geocode WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Geocode cache read failed: {e}")
+            return MISS
+        if row is None or row[2] <= time.time():
+            return MISS
+        value = None if row[0] is None else (row[0], row[1])
+        return value, row[2]
+
+    def _disk_set(self, key: str, value: Coordinates, expires_at: float):
+        lat, lon = value if value is not None else (None, None)
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO geocode (key, lat, lon, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, lat, lon, expires_at),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Geocode cache write failed: {e}")
+
+    # --- Memory Tier ---
+
+    def _memory_get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return MISS
+        if entry[1] <= time.time():
+            del self._memory[key]
+            return MISS
+        self._memory.move_to_end(key)
+        return entry[0]
+
+    def _memory_set(self, key: str, value: Coordinates, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- Public API ---
+
+    async def get(self, location: str):
+        """Returns cached coordinates, `None` for a cached miss, or MISS."""
+        key = normalize_location(location)
+        value = self._memory_get(key)
+        if value is not MISS:
+            self.memory_hits += 1
+        else:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is MISS:
+                self.misses += 1
+                return MISS
+            value, expires_at = entry
+            self._memory_set(key, value, expires_at)
+            self.disk_hits += 1
+        if value is None:
+            self.negative_hits += 1
+        return value
+
+    async def set(self, location: str, value: Coordinates):
+        key = normalize_location(location)
+        expires_at = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        self._memory_set(key, value, expires_at)
+        await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
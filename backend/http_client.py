@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+from typing import Optional
+
+import httpx
+
+from backend import admission, metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Pool / Timeout Configuration ---
+# All values can be overridden through the environment so deployments can tune
+# the pool without a code change.
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "2.0"))
+ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "1") == "1"
+
+# Per-upstream (connect, read) timeouts in seconds.
+UPSTREAM_TIMEOUTS = {
+    "geocode": (
+        float(os.getenv("GEOCODE_CONNECT_TIMEOUT", "2.0")),
+        float(os.getenv("GEOCODE_READ_TIMEOUT", "3.0")),
+    ),
+    "weather": (
+        float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2.0")),
+        float(os.getenv("WEATHER_READ_TIMEOUT", "3.0")),
+    ),
+    "places": (
+        float(os.getenv("PLACES_CONNECT_TIMEOUT", "2.0")),
+        float(os.getenv("PLACES_READ_TIMEOUT", "5.0")),
+    ),
+}
+DEFAULT_TIMEOUT = (2.0, 5.0)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (httpx[http2])."""
+    if not ENABLE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.info("h2 not installed, upstream client will use HTTP/1.1.")
+        return False
+
+
+def get_timeout(upstream: str) -> httpx.Timeout:
+    """Builds the httpx timeout for a named upstream."""
+    connect, read = UPSTREAM_TIMEOUTS.get(upstream, DEFAULT_TIMEOUT)
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=POOL_TIMEOUT)
+
+
+def _build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0], pool=POOL_TIMEOUT)
+    if transport is not None:
+        return httpx.AsyncClient(limits=limits, timeout=timeout, transport=transport)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_available())
+
+
+async def start_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Creates the app-lifetime client. Called from the FastAPI startup hook.
+    A custom transport can be passed in to point the app at local stand-ins.
+    """
+    global _client
+    if _client is None:
+        _client = _build_client(transport)
+    return _client
+
+
+async def close_client():
+    """Closes the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client. Falls back to lazily creating one so helpers
+    still work when called outside the app lifecycle (scripts, REPL).
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def fetch_json(upstream: str, url: str, params: Optional[dict] = None) -> dict:
+    """
+    GETs a JSON document from an upstream using that upstream's timeouts.
+    Non-2xx answers raise, so rate-limit or auth errors are never mistaken
+    for (and cached as) real empty results. Calls beyond the upstream's
+    request budget raise admission.QuotaExceeded without going out.
+    """
+    try:
+        admission.acquire_upstream(upstream)
+    except admission.QuotaExceeded:
+        metrics.UPSTREAM_REQUESTS.labels(upstream, "throttled").inc()
+        raise
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = await get_client().get(url, params=params, timeout=get_timeout(upstream))
+        status = str(response.status_code)
+        response.raise_for_status()
+        return response.json()
+    finally:
+        metrics.UPSTREAM_SECONDS.labels(upstream).observe(time.perf_counter() - start)
+        metrics.UPSTREAM_REQUESTS.labels(upstream, status).inc()
@@ -1,26 +1,95 @@
 import os
 import json
-import httpx
-from fastapi import FastAPI, HTTPException
+import time
+import uuid
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
 import backend.ml_utils as ml_utils
 import backend.music_utils as music_utils
+import backend.http_client as http_client
+from backend.geocode_cache import GeocodeCache, MISS, normalize_location
+from backend.singleflight import SingleFlight
+import backend.geo_cache as geo_cache
+from backend.storage import Store
+import backend.scoring as scoring
+import backend.metrics as metrics
+from backend.metrics import MetricsMiddleware
+import backend.profiling as profiling
+import backend.admission as admission
+import backend.response_cache as response_cache
+import backend.place_index as place_index
+import backend.feedback as feedback
+from backend.quest_types import QuestContext, QuestNetwork
+from backend.quest_orchestrator import QuestOrchestrator
 
 app = FastAPI(title="PocketPlan")
 
 @app.on_event("startup")
 async def startup_event():
+    global store
     ml_utils.load_model()
+    store = Store()
+    await asyncio.to_thread(store.migrate_from_json)
+    await asyncio.to_thread(place_index.index.load_snapshot)
+    await http_client.start_client()
+    app.state.snapshot_task = asyncio.create_task(snapshot_place_index_periodically())
+    app.state.feedback_task = asyncio.create_task(feedback.pipeline.run())
+    if QUEST_PLAN_WORKERS > 0:
+        # Spawned, not forked: the server process already runs threads.
+        quest_orchestrator.executor = ProcessPoolExecutor(
+            QUEST_PLAN_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        # Start the workers now rather than on the first quest.
+        for _ in range(QUEST_PLAN_WORKERS):
+            quest_orchestrator.executor.submit(int)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.snapshot_task.cancel()
+    app.state.feedback_task.cancel()
+    await feedback.pipeline.flush()
+    if quest_orchestrator.executor is not None:
+        quest_orchestrator.executor.shutdown(wait=False, cancel_futures=True)
+    await save_place_index()
+    await http_client.close_client()
+    geocode_cache.close()
+    if geo_cache.shared_tiles is not None:
+        geo_cache.shared_tiles.close()
+    admission.close_upstream_budgets()
+    store.close()
 
 # --- Configuration ---
 PORT = 8001
 GEOAPIFY_KEY = "dd38f283afcf48e8a8ee8c1e81102a86"
 OPENWEATHER_KEY = "0b095ed48ae02f8225c238988ebe108d"
 
+# Per-stage deadlines for /recommend (seconds). A stage that misses its
+# deadline falls back instead of holding the whole request open.
+GEOCODE_DEADLINE = float(os.getenv("GEOCODE_DEADLINE", "3.0"))
+WEATHER_DEADLINE = float(os.getenv("WEATHER_DEADLINE", "2.0"))
+PLACES_DEADLINE = float(os.getenv("PLACES_DEADLINE", "4.0"))
+
+# Candidates requested from Geoapify per search (Geoapify allows up to 500).
+PLACES_LIMIT = int(os.getenv("PLACES_LIMIT", "15"))
+PLACES_RADIUS = 5000
+PLACE_INDEX_SNAPSHOT_INTERVAL = float(os.getenv("PLACE_INDEX_SNAPSHOT_INTERVAL", "300"))
+
+# /recommend/batch: maximum items per call and concurrent upstream lookups.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+# Quests: processes planning routes (0 plans on the event loop) and quests
+# generated at once by /quest/batch.
+QUEST_PLAN_WORKERS = int(os.getenv("QUEST_PLAN_WORKERS", "2"))
+QUEST_BATCH_CONCURRENCY = int(os.getenv("QUEST_BATCH_CONCURRENCY", "32"))
+
 # CORS Configuration - Allow all origins for public API
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +100,9 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers to the client
 )
 
+app.add_middleware(MetricsMiddleware, routes=lambda: [r.path for r in app.routes])
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # --- Data Models ---
 class SearchRequest(BaseModel):
     location: str
@@ -49,6 +121,48 @@ class PlaceResponse(BaseModel):
     alternative: Optional[str] = None
     music_recommendations: List[str] = []
     image_url: Optional[str] = None
+    # True when built from cached/fallback data because upstreams were
+    # throttled, slow or the service was shedding load.
+    degraded: bool = False
+
+class BatchRecommendRequest(BaseModel):
+    items: List[SearchRequest]
+    # Precompute jobs should not show up in users' search history.
+    record_history: bool = False
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: int
+    results: List[PlaceResponse] = []
+    error: Optional[str] = None
+
+class FeedbackRequest(BaseModel):
+    # The search's weather condition as shown on the card (e.g. "Rain").
+    weather: str
+    time_available: int
+    # Metres from the search location to the chosen place.
+    distance: float
+    # The kind of place the user picked: cafe, museum, park or restaurant.
+    place_type: str
+    rating: float = scoring.ML_RATING
+
+class QuestResponse(BaseModel):
+    quest: QuestNetwork
+    # Per-stage timing trace (see engine_runner.QuestTrace), or a single
+    # "cache" span when the quest was served from the quest cache.
+    timings: dict
+    cached: bool = False
+
+class QuestBatchRequest(BaseModel):
+    items: List[QuestContext]
+
+class QuestBatchItemResult(BaseModel):
+    index: int
+    status: int
+    quest: Optional[QuestNetwork] = None
+    timings: Optional[dict] = None
+    cached: bool = False
+    error: Optional[str] = None
 
 def get_placeholder_image(categories: List[str]) -> str:
     """Returns a high-quality Unsplash image based on place category."""
@@ -75,51 +189,104 @@ class Favorite(BaseModel):
     location: str
     score: int
 
-# --- Persistence (JSON File) ---
-DATA_FILE = "data.json"
+# --- Persistence (SQLite) ---
+store: Optional[Store] = None
 
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"favorites": [], "history": []}
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {"favorites": [], "history": []}
+# Page size when a cursor is passed without a limit. Requests with neither
+# still get every row, as they always have.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+def ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+def set_next_cursor(response: Response, next_cursor: Optional[int]):
+    """
+    The page body stays a plain JSON list for existing clients; the cursor
+    for the next page travels in a header.
+    """
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
 
 # --- Helper Functions ---
 
+geocode_cache = GeocodeCache()
+geocode_flight = SingleFlight("geocode")
+
+async def fetch_coordinates(location_name: str):
+    """Geocodes via Geoapify. Returns None when the location is unknown, raises on upstream errors."""
+    url = f"https://api.geoapify.com/v1/geocode/search?text={location_name}&apiKey={GEOAPIFY_KEY}"
+    data = await http_client.fetch_json("geocode", url)
+    if data.get("features"):
+        props = data["features"][0]["properties"]
+        return props["lat"], props["lon"]
+    return None
+
+# Returned instead of coordinates when Geoapify could not answer, or did not
+# answer within GEOCODE_DEADLINE, as opposed to (None, None) for a place it
+# does not know. Never cached.
+GEOCODE_UNAVAILABLE = object()
+GEOCODE_TIMED_OUT = object()
+
+async def lookup_coordinates(location_name: str):
+    try:
+        coords = await fetch_coordinates(location_name)
+    except admission.QuotaExceeded as e:
+        print(f"Geocoding skipped: {e}")
+        return GEOCODE_UNAVAILABLE
+    except Exception as e:
+        # Upstream failures are not cached, only genuine "not found" answers.
+        print(f"Geocoding Error: {e}")
+        return GEOCODE_UNAVAILABLE
+
+    await geocode_cache.set(location_name, coords)
+    return coords if coords is not None else (None, None)
+
 async def get_coordinates(location_name: str):
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.geoapify.com/v1/geocode/search?text={location_name}&apiKey={GEOAPIFY_KEY}"
-        try:
-            response = await client.get(url)
-            data = response.json()
-            if data.get("features"):
-                props = data["features"][0]["properties"]
-                return props["lat"], props["lon"]
-        except Exception as e:
-            print(f"Geocoding Error: {e}")
-    return None, None
+    cached = await geocode_cache.get(location_name)
+    if cached is not MISS:
+        return cached if cached is not None else (None, None)
+
+    # Concurrent misses for the same place share one Geoapify call.
+    return await geocode_flight.do(normalize_location(location_name), lambda: lookup_coordinates(location_name))
+
+def geocode_failure(coords) -> Optional[Tuple[int, str]]:
+    """(status, detail) for a geocoding result without coordinates, None when there are some."""
+    if coords is GEOCODE_UNAVAILABLE:
+        admission.mark_degraded("geocode")
+        return 503, "Geocoding is temporarily unavailable, try again shortly"
+    if coords is GEOCODE_TIMED_OUT:
+        return 504, "Geocoding timed out, try again shortly"
+    if coords[0] is None:
+        return 404, "Location not found"
+    return None
+
+DEFAULT_WEATHER = {"temp": 20, "condition": "Clear", "desc": "Unknown"}
+
+async def fetch_weather(lat: float, lon: float):
+    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={OPENWEATHER_KEY}"
+    data = await http_client.fetch_json("weather", url)
+    return {
+        "temp": data["main"]["temp"],
+        "condition": data["weather"][0]["main"],
+        "desc": data["weather"][0]["description"]
+    }
+
+def cached_weather(lat: float, lon: float):
+    """Last known weather for the tile, however old, or the default."""
+    cached = geo_cache.weather_cache.peek(geo_cache.weather_key(lat, lon), allow_expired=True)
+    return cached if cached is not None else dict(DEFAULT_WEATHER)
 
 async def get_weather(lat: float, lon: float):
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={OPENWEATHER_KEY}"
-        try:
-            response = await client.get(url)
-            data = response.json()
-            return {
-                "temp": data["main"]["temp"],
-                "condition": data["weather"][0]["main"],
-                "desc": data["weather"][0]["description"]
-            }
-        except Exception as e:
-            print(f"Weather Error: {e}")
-    return {"temp": 20, "condition": "Clear", "desc": "Unknown"}
+    # Keyed on the geo tile alone, so nearby users share one lookup.
+    key = geo_cache.weather_key(lat, lon)
+    try:
+        return await geo_cache.weather_cache.get_or_load(key, lambda: fetch_weather(lat, lon))
+    except Exception as e:
+        print(f"Weather Error: {e}")
+    admission.mark_degraded("weather")
+    return cached_weather(lat, lon)
 
 def get_categories_for_vibe(vibe: str, budget: str) -> str:
     v = vibe.lower()
@@ -151,194 +318,507 @@ def get_categories_for_vibe(vibe: str, budget: str) -> str:
 
     return ",".join(categories)
 
-async def get_places(lat: float, lon: float, categories: str):
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.geoapify.com/v2/places?categories={categories}&filter=circle:{lon},{lat},5000&bias=proximity:{lon},{lat}&limit=15&apiKey={GEOAPIFY_KEY}"
-        try:
-            response = await client.get(url)
-            data = response.json()
-            return [{
-                "name": f.get("properties", {}).get("name") or "Unknown Place",
-                "distance": f.get("properties", {}).get("distance", 0),
-                "categories": f.get("properties", {}).get("categories", [])
-            } for f in data.get("features", [])]
-        except Exception as e:
-            print(f"Places Error: {e}")
-            return []
-
-def generate_must_take(weather: dict, vibe: str, place_categories: List[str]) -> List[str]:
-    items = set(["Smartphone", "Wallet"])
-    cond = weather["condition"]
-    temp = weather["temp"]
-
-    if "Rain" in cond or "Drizzle" in cond:
-        items.update(["Umbrella", "Rain Jacket"])
-    if "Clear" in cond or "Sun" in cond:
-        items.update(["Sunglasses", "Sunscreen"])
-    if temp < 10:
-        items.update(["Warm Coat", "Gloves"])
-    if temp > 25:
-        items.update(["Water Bottle", "Deodorant"])
-
-    v = vibe.lower()
-    cats = " ".join(place_categories)
-    
-    if "active" in v or "sport" in cats or "park" in cats:
-        items.update(["Walking Shoes", "Towel"])
-    if "chill" in v or "cafe" in cats:
-        items.update(["Book/Kindle", "Headphones"])
-    if "work" in v or "coworking" in cats:
-        items.update(["Laptop", "Charger"])
-    if "romantic" in v:
-        items.update(["Mints"])
-    if "museum" in cats:
-        items.update(["Student ID"])
-
-    return list(items)
+async def fetch_places(lat: float, lon: float, categories: str, limit: int = PLACES_LIMIT):
+    url = f"https://api.geoapify.com/v2/places?categories={categories}&filter=circle:{lon},{lat},{PLACES_RADIUS}&bias=proximity:{lon},{lat}&limit={limit}&apiKey={GEOAPIFY_KEY}"
+    data = await http_client.fetch_json("places", url)
+    return [{
+        "name": f.get("properties", {}).get("name") or "Unknown Place",
+        "distance": f.get("properties", {}).get("distance", 0),
+        "categories": f.get("properties", {}).get("categories", []),
+        "lat": f.get("properties", {}).get("lat"),
+        "lon": f.get("properties", {}).get("lon")
+    } for f in data.get("features", [])]
+
+async def load_places(lat: float, lon: float, categories: str):
+    """
+    Serves the search from the local place index when it covers the area,
+    otherwise fetches a wider page from Geoapify, indexes it and returns
+    the PLACES_LIMIT nearest.
+    """
+    local = place_index.index.query(lat, lon, PLACES_RADIUS, categories, PLACES_LIMIT)
+    if local is not None:
+        return local
+    limit = max(PLACES_LIMIT, place_index.FETCH_LIMIT)
+    places = await fetch_places(lat, lon, categories, limit=limit)
+    place_index.index.add_result(lat, lon, PLACES_RADIUS, categories, places, limit)
+    return sorted(places, key=lambda p: p["distance"])[:PLACES_LIMIT]
+
+async def save_place_index():
+    try:
+        await asyncio.to_thread(place_index.index.write_snapshot, place_index.index.snapshot())
+    except Exception as e:
+        print(f"Place Index Snapshot Error: {e}")
+
+async def snapshot_place_index_periodically():
+    while True:
+        await asyncio.sleep(PLACE_INDEX_SNAPSHOT_INTERVAL)
+        place_index.index.prune()
+        await save_place_index()
+
+def localize_places(places: List[dict], lat: float, lon: float) -> List[dict]:
+    # Cached results may have been fetched from elsewhere in the tile, so
+    # distances are recomputed from this caller's position.
+    results = []
+    for p in places:
+        if p.get("lat") is not None and p.get("lon") is not None:
+            p = {**p, "distance": int(geo_cache.haversine_m(lat, lon, p["lat"], p["lon"]))}
+        results.append(p)
+    results.sort(key=lambda p: p["distance"])
+    return results
 
-# --- Routes ---
+def cached_places(lat: float, lon: float, categories: str) -> List[dict]:
+    """Last known places for the tile, however old, or []."""
+    cached = geo_cache.places_cache.peek(geo_cache.places_key(lat, lon, categories), allow_expired=True)
+    return localize_places(cached, lat, lon) if cached else []
 
-@app.post("/recommend", response_model=List[PlaceResponse])
-async def recommend(req: SearchRequest):
-    lat, lon = await get_coordinates(req.location)
-    if not lat:
-        raise HTTPException(status_code=404, detail="Location not found")
-    
-    # Save to history
-    data = load_data()
-    data["history"].append({
-        "location": req.location,
-        "vibe": req.preference,
-        "date": datetime.now().isoformat()
-    })
-    save_data(data)
+async def get_places(lat: float, lon: float, categories: str):
+    key = geo_cache.places_key(lat, lon, categories)
+    try:
+        places = await geo_cache.places_cache.get_or_load(key, lambda: load_places(lat, lon, categories))
+    except Exception as e:
+        print(f"Places Error: {e}")
+        admission.mark_degraded("places")
+        return cached_places(lat, lon, categories)
+    return localize_places(places, lat, lon)
+
+async def timed_stage(stage: str, coro):
+    with metrics.time_stage(stage):
+        return await coro
+
+async def with_deadline(coro, timeout: float, fallback, stage: str):
+    """
+    Awaits `coro` for at most `timeout` seconds, returning `fallback` on expiry.
+    The underlying task is shielded so a late upstream answer still lands in the cache.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        print(f"{stage} missed its {timeout}s deadline, using fallback")
+        admission.mark_degraded(stage.lower())
+        return fallback
 
-    weather = await get_weather(lat, lon)
-    cats = get_categories_for_vibe(req.preference, req.budget)
-    places = await get_places(lat, lon, cats)
+# --- Routes ---
 
+def city_walk(req: SearchRequest, weather: dict, degraded: bool) -> List[PlaceResponse]:
+    return [PlaceResponse(
+        name="City Walk",
+        distance="0 min walk",
+        duration=f"{req.time} Minutes",
+        reason=["Explore the area on foot!"],
+        score=80,
+        weather=f"{weather['condition']}, {int(weather['temp'])}°C",
+        must_take=["Comfortable Shoes"],
+        degraded=degraded
+    )]
+
+def build_recommendations(req: SearchRequest, weather: dict, places: List[dict],
+                          degraded: bool = False, k: int = 6,
+                          record_feedback: bool = True) -> List[PlaceResponse]:
+    """Scores the candidates and builds the top `k` response cards (no I/O)."""
     if not places:
-        return [PlaceResponse(
-            name="City Walk",
-            distance="0 min walk",
-            duration=f"{req.time} Minutes",
-            reason=["Explore the area on foot!"],
-            score=80,
-            weather=f"{weather['condition']}, {int(weather['temp'])}°C",
-            must_take=["Comfortable Shoes"]
-        )]
-
-    # Scoring Logic
-    scored_places = []
-    
-    # ML Prediction Context
-    model_weather = weather["condition"].lower()
-    if "rain" in model_weather: model_weather = "rainy"
-    elif "clear" in model_weather or "sun" in model_weather: model_weather = "sunny"
-    else: model_weather = "cloudy"
+        return city_walk(req, weather, degraded)
 
     time_avail = int(req.time) if req.time.isdigit() else 60
 
-    for p in places:
-        score = 70
-        explanation = []
-        p_cats = p["categories"]
+    # Scoring Logic (vectorized over all candidates, only the top 6 are materialized)
+    with metrics.time_stage("scoring"):
+        batch = scoring.score_places(
+            places, weather, req.preference, req.budget, time_avail,
+            predict=ml_utils.predict_preferred_types, k=k
+        )
+    if record_feedback:
+        # Queued for the feedback writer, never blocks.
+        model_weather = scoring.model_weather_class(weather["condition"])
+        for predicted_type, distance in zip(batch.ml_matches, batch.ml_match_distances):
+            feedback.sink.record("predicted", model_weather, time_avail, distance, scoring.ML_RATING, predicted_type)
+
+    top_picks = batch.picks
+
+    with metrics.time_stage("music"):
+        music = [
+            music_utils.get_music_recommendations(weather["condition"], req.preference, pick["categories"])
+            for pick in top_picks
+        ]
 
-        # --- ML Prediction Scoring ---
-        try:
-            dist_metric = p["distance"] / 100 
-            rating_metric = 4.5 
-
-            predicted_type = ml_utils.predict_preferred_type(
-                model_weather, 
-                time_avail, 
-                rating_metric,
-                dist_metric
-            )
-
-            if predicted_type:
-                is_match = False
-                if predicted_type == 'cafe' and 'catering.cafe' in p_cats: is_match = True
-                if predicted_type == 'park' and 'leisure.park' in p_cats: is_match = True
-                if predicted_type == 'museum' and 'entertainment.museum' in p_cats: is_match = True
-                if predicted_type == 'restaurant' and 'catering.restaurant' in p_cats: is_match = True
-
-                if is_match:
-                    score += 5
-                    explanation.append(f"AI suggests {predicted_type}s right now.")
-                    ml_utils.store_feedback(req.dict(), predicted_type)
-        except Exception as e:
-            print(f"ML Scoring Error: {e}")
-
-        # Weather Impact
-        if any(x in weather["condition"] for x in ['Rain', 'Snow']):
-            if any("park" in c for c in p_cats):
-                score -= 30
-                explanation.append("Rain makes outdoors less ideal.")
-            else:
-                score += 20
-                explanation.append("Great indoor shelter.")
-        elif weather["condition"] == "Clear" and any("park" in c for c in p_cats):
-            score += 25
-            explanation.append("Perfect weather for outdoors.")
-
-        # Budget Impact
-        if req.budget == "free":
-            if any("park" in c or "culture" in c for c in p_cats):
-                score += 20
-                explanation.append("Wallet-friendly.")
-        elif req.budget == "premium":
-             if any("restaurant" in c for c in p_cats):
-                 score += 15
-                 explanation.append("Premium vibe.")
-
-        # Time/Distance Impact
-        if time_avail < 45 and p["distance"] > 3000:
-            score -= 15
-            explanation.append("A bit far for your time.")
-
-        score = max(40, min(99, score))
-        
-        must_take = generate_must_take(weather, req.preference, p_cats)
-        if not explanation:
-            explanation.append(f"Matches your {req.preference} vibe.")
-
-        scored_places.append({
-            **p,
-            "score": score,
-            "reason": explanation,
-            "must_take": must_take,
-            "weather_summary": f"{weather['condition']}, {int(weather['temp'])}°C"
-        })
-
-    scored_places.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Return top 6 recommendations
-    top_picks = scored_places[:6]
     results = []
+    with metrics.time_stage("response_build"):
+        for pick, music_recs in zip(top_picks, music):
+            place_image = get_placeholder_image(pick["categories"])
+
+            results.append(PlaceResponse(
+                name=pick["name"],
+                distance=f"{int(pick['distance'] / 80)} min walk",
+                duration=f"{req.time} Minutes",
+                reason=pick["reason"][:2],
+                score=pick["score"],
+                weather=pick["weather_summary"],
+                must_take=pick["must_take"],
+                alternative=None, # No longer needed for individual cards but keeping model compatible
+                music_recommendations=music_recs,
+                image_url=place_image,
+                degraded=degraded
+            ))
+
+    return results
 
-    for pick in top_picks:
-        music_recs = music_utils.get_music_recommendations(
-            weather["condition"],
-            req.preference,
-            pick["categories"]
+def render_json(content) -> bytes:
+    # Same encoding FastAPI's JSONResponse uses, so cached bodies are
+    # byte-identical to freshly rendered ones.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def json_body_response(body: bytes, degraded: List[str], cache_status: str) -> Response:
+    headers = {"X-Cache": cache_status}
+    if degraded:
+        headers["X-Degraded"] = ",".join(degraded)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def recommend_from_cache(req: SearchRequest) -> List[PlaceResponse]:
+    """
+    Answer for shed requests: no upstream calls, only whatever geocode,
+    weather and places data is already cached, else the City Walk card.
+    """
+    admission.mark_degraded("overload")
+    coords = await geocode_cache.get(req.location)
+    if coords is MISS or coords is None:
+        return city_walk(req, dict(DEFAULT_WEATHER), degraded=True)
+    lat, lon = coords
+    cats = get_categories_for_vibe(req.preference, req.budget)
+    return build_recommendations(req, cached_weather(lat, lon), cached_places(lat, lon, cats), degraded=True)
+
+@app.post("/recommend", response_model=List[PlaceResponse])
+async def recommend(req: SearchRequest):
+    degraded = admission.track_degradation()
+    async with admission.recommend_admission.admit() as admitted:
+        if admitted:
+            return await recommend_live(req)
+        results = await recommend_from_cache(req)
+    return json_body_response(render_json([r.dict() for r in results]), degraded, "bypass")
+
+async def recommend_live(req: SearchRequest) -> Response:
+    coords = await with_deadline(
+        timed_stage("geocode", get_coordinates(req.location)), GEOCODE_DEADLINE, GEOCODE_TIMED_OUT, "Geocoding"
+    )
+    failure = geocode_failure(coords)
+    if failure is not None:
+        raise HTTPException(status_code=failure[0], detail=failure[1])
+    lat, lon = coords
+    
+    # Save to history (queued for the write-behind batcher, never blocks)
+    store.record_history(req.location, req.preference, datetime.now().isoformat())
+
+    # With the tile's weather already cached, an identical earlier answer
+    # can be served as stored bytes without touching places or scoring.
+    known_weather = geo_cache.weather_cache.peek(geo_cache.weather_key(lat, lon))
+    if known_weather is not None:
+        key = response_cache.response_key(lat, lon, req.preference, req.budget, req.time, known_weather)
+        body = response_cache.responses.get(key)
+        if body is not None:
+            return json_body_response(body, [], "hit")
+
+    # Weather and places only depend on the coordinates, so fetch them together
+    cats = get_categories_for_vibe(req.preference, req.budget)
+    weather, places = await asyncio.gather(
+        with_deadline(timed_stage("weather", get_weather(lat, lon)), WEATHER_DEADLINE, cached_weather(lat, lon), "Weather"),
+        with_deadline(timed_stage("places", get_places(lat, lon, cats)), PLACES_DEADLINE, cached_places(lat, lon, cats), "Places")
+    )
+
+    degraded = admission.degradation_reasons()
+    results = build_recommendations(req, weather, places, degraded=bool(degraded))
+    body = render_json([r.dict() for r in results])
+
+    # Only full answers are cached, and only while both inputs stay fresh.
+    if not degraded:
+        weather_fresh = geo_cache.weather_cache.fresh_until(geo_cache.weather_key(lat, lon))
+        places_fresh = geo_cache.places_cache.fresh_until(geo_cache.places_key(lat, lon, cats))
+        if weather_fresh is not None and places_fresh is not None:
+            key = response_cache.response_key(lat, lon, req.preference, req.budget, req.time, weather)
+            response_cache.responses.set(key, body, min(weather_fresh, places_fresh))
+    return json_body_response(body, degraded, "miss")
+
+def stream_frame(event: str, results: List[PlaceResponse], fmt: str, **extra) -> str:
+    data = json.dumps({"event": event, "results": [r.dict() for r in results], **extra})
+    if fmt == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def recommend_frames(req: SearchRequest, fmt: str):
+    """
+    Yields the /recommend/stream frames:
+      provisional - best card from whatever is cached for the tile, sent
+                    right after geocoding
+      update      - fresh places ranked with the best weather known so far,
+                    when places arrive before weather
+      final       - the authoritative top 6, same as POST /recommend
+    Interim frames built on DEFAULT_WEATHER (nothing cached for the tile
+    yet) are flagged degraded. Errors after the response has started are
+    sent as an `error` frame.
+    """
+    degraded = admission.track_degradation()
+    async with admission.recommend_admission.admit() as admitted:
+        if not admitted:
+            results = await recommend_from_cache(req)
+            yield stream_frame("final", results, fmt, degraded=True, reasons=degraded)
+            return
+
+        coords = await with_deadline(
+            timed_stage("geocode", get_coordinates(req.location)), GEOCODE_DEADLINE, GEOCODE_TIMED_OUT, "Geocoding"
         )
-        place_image = get_placeholder_image(pick["categories"])
-        
-        results.append(PlaceResponse(
-            name=pick["name"],
-            distance=f"{int(pick['distance'] / 80)} min walk",
-            duration=f"{req.time} Minutes",
-            reason=pick["reason"][:2],
-            score=pick["score"],
-            weather=pick["weather_summary"],
-            must_take=pick["must_take"],
-            alternative=None, # No longer needed for individual cards but keeping model compatible
-            music_recommendations=music_recs,
-            image_url=place_image
-        ))
+        failure = geocode_failure(coords)
+        if failure is not None:
+            yield stream_frame("error", [], fmt, status=failure[0], detail=failure[1])
+            return
+        lat, lon = coords
+        store.record_history(req.location, req.preference, datetime.now().isoformat())
+
+        cats = get_categories_for_vibe(req.preference, req.budget)
+        weather_task = asyncio.ensure_future(with_deadline(
+            timed_stage("weather", get_weather(lat, lon)), WEATHER_DEADLINE, cached_weather(lat, lon), "Weather"))
+        places_task = asyncio.ensure_future(with_deadline(
+            timed_stage("places", get_places(lat, lon, cats)), PLACES_DEADLINE, cached_places(lat, lon, cats), "Places"))
+        try:
+            # Interim frames use the tile's last known weather; on a cold
+            # tile that is DEFAULT_WEATHER, and the frames say so.
+            guessed = geo_cache.weather_cache.peek(geo_cache.weather_key(lat, lon), allow_expired=True) is None
+            cached = cached_places(lat, lon, cats)
+            if cached:
+                yield stream_frame("provisional", build_recommendations(
+                    req, cached_weather(lat, lon), cached, k=1, degraded=guessed, record_feedback=False),
+                    fmt, degraded=guessed)
+
+            done, _ = await asyncio.wait({weather_task, places_task}, return_when=asyncio.FIRST_COMPLETED)
+            if places_task in done and weather_task not in done:
+                yield stream_frame("update", build_recommendations(
+                    req, cached_weather(lat, lon), places_task.result(), degraded=guessed, record_feedback=False),
+                    fmt, degraded=guessed)
+
+            weather, places = await weather_task, await places_task
+            results = build_recommendations(req, weather, places, degraded=bool(degraded))
+            yield stream_frame("final", results, fmt, degraded=bool(degraded), reasons=degraded)
+        except Exception as e:
+            print(f"Stream Error: {e}")
+            yield stream_frame("error", [], fmt, status=500, detail=str(e))
+        finally:
+            # A disconnected client stops waiting; the shielded upstream
+            # calls inside with_deadline still finish and fill the caches.
+            weather_task.cancel()
+            places_task.cancel()
+
+@app.post("/recommend/stream")
+async def recommend_stream(req: SearchRequest, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(recommend_frames(req, format), media_type=media_type,
+                             headers={"Cache-Control": "no-cache"})
+
+async def tracked(coro):
+    """Runs `coro` with its own degradation list and returns (result, reasons)."""
+    reasons = admission.track_degradation()
+    return await coro, reasons
+
+async def gather_unique(keys_to_calls: dict, limit: int) -> dict:
+    """Runs one call per distinct key with at most `limit` in flight; returns {key: result}."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    keys = list(keys_to_calls)
+    results = await asyncio.gather(*(run(keys_to_calls[k]) for k in keys), return_exceptions=True)
+    return dict(zip(keys, results))
+
+async def admitted(call, shed):
+    """
+    Runs `call()` under the /recommend admission controller, so batch
+    upstream calls queue with single searches; returns `shed()` instead
+    when the controller sheds it.
+    """
+    async with admission.recommend_admission.admit() as ok:
+        if ok:
+            return await call()
+    return shed()
+
+async def batch_coordinates(name: str):
+    """Geocoding for a batch item: cached answers are free, misses count against admission."""
+    cached = await geocode_cache.get(name)
+    if cached is not MISS:
+        return cached if cached is not None else (None, None)
+    return await admitted(
+        lambda: with_deadline(get_coordinates(name), GEOCODE_DEADLINE, GEOCODE_TIMED_OUT, "Geocoding"),
+        lambda: GEOCODE_UNAVAILABLE)
+
+@app.post("/recommend/batch", response_model=List[BatchItemResult])
+async def recommend_batch(batch: BatchRecommendRequest):
+    """
+    Recommendations for many searches at once. Geocoding runs once per
+    distinct location, weather once per weather tile and places once per
+    (tile, category set); items with the same location and parameters are
+    scored once. Each item gets its own status, so one bad location does
+    not fail the batch. Every distinct upstream call takes a slot from the
+    /recommend admission controller; shed lookups fall back to cached data
+    (or 503 for geocoding).
+    """
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    items = batch.items
+    out: List[Optional[BatchItemResult]] = [None] * len(items)
+
+    # --- Geocoding, once per normalized location ---
+    locations = {normalize_location(req.location): req.location for req in items}
+    coords = await gather_unique({
+        key: (lambda name=name: batch_coordinates(name)) for key, name in locations.items()
+    }, BATCH_CONCURRENCY)
+
+    located = []
+    for i, req in enumerate(items):
+        found = coords[normalize_location(req.location)]
+        if isinstance(found, Exception):
+            out[i] = BatchItemResult(index=i, status=502, error=f"Geocoding failed: {found}")
+            continue
+        failure = geocode_failure(found)
+        if failure is not None:
+            out[i] = BatchItemResult(index=i, status=failure[0], error=failure[1])
+            continue
+        lat, lon = found
+        located.append((i, req, lat, lon, get_categories_for_vibe(req.preference, req.budget)))
+        if batch.record_history:
+            store.record_history(req.location, req.preference, datetime.now().isoformat())
+
+    # --- Weather per tile and places per (tile, categories), fetched together ---
+    weather_calls, places_calls = {}, {}
+    for _, _, lat, lon, cats in located:
+        weather_calls.setdefault(geo_cache.weather_key(lat, lon), lambda lat=lat, lon=lon: admitted(
+            lambda: tracked(with_deadline(get_weather(lat, lon), WEATHER_DEADLINE, cached_weather(lat, lon), "Weather")),
+            lambda: (cached_weather(lat, lon), ["overload"])))
+        places_calls.setdefault(geo_cache.places_key(lat, lon, cats), lambda lat=lat, lon=lon, cats=cats: admitted(
+            lambda: tracked(with_deadline(get_places(lat, lon, cats), PLACES_DEADLINE, cached_places(lat, lon, cats), "Places")),
+            lambda: (cached_places(lat, lon, cats), ["overload"])))
+    weather_by_tile, places_by_key = await asyncio.gather(
+        gather_unique(weather_calls, BATCH_CONCURRENCY),
+        gather_unique(places_calls, BATCH_CONCURRENCY)
+    )
+
+    # --- Scoring, once per distinct (location, vibe, budget, time) ---
+    scored = {}
+    for i, req, lat, lon, cats in located:
+        signature = (normalize_location(req.location), req.preference, req.budget, req.time)
+        try:
+            if signature not in scored:
+                weather_result = weather_by_tile[geo_cache.weather_key(lat, lon)]
+                places_result = places_by_key[geo_cache.places_key(lat, lon, cats)]
+                for result in (weather_result, places_result):
+                    if isinstance(result, Exception):
+                        raise result
+                (weather, weather_reasons), (places, places_reasons) = weather_result, places_result
+                # Places were localized to whichever item fetched them first.
+                scored[signature] = build_recommendations(
+                    req, weather, localize_places(places, lat, lon),
+                    degraded=bool(weather_reasons or places_reasons)
+                )
+            out[i] = BatchItemResult(index=i, status=200, results=scored[signature])
+        except Exception as e:
+            print(f"Batch Item Error: {e}")
+            out[i] = BatchItemResult(index=i, status=500, error=str(e))
 
-    return results
+    return out
+
+# --- Quests ---
+
+async def quest_candidates(context: QuestContext) -> List[dict]:
+    """Quest stops come from the same places search /recommend runs for this vibe and budget."""
+    lat, lon = context.location["lat"], context.location["lon"]
+    return await get_places(lat, lon, get_categories_for_vibe(context.vibe_preference, context.budget_tier))
+
+quest_orchestrator = QuestOrchestrator(candidate_provider=quest_candidates)
+quest_flight = SingleFlight("quest")
+
+def quest_cache_key(context: QuestContext) -> Tuple[QuestContext, str]:
+    """The context moved to its quest cell's centre with its time budget bucketed, and the quest cache key for it."""
+    if "lat" not in context.location or "lon" not in context.location:
+        raise HTTPException(status_code=422, detail="location needs lat and lon")
+    lat, lon = response_cache.quest_tile_centre(context.location["lat"], context.location["lon"])
+    context = context.model_copy(update={
+        "location": {**context.location, "lat": lat, "lon": lon},
+        "time_available": response_cache.quest_time_bucket(context.time_available),
+    })
+    key = response_cache.quest_key(context.location["lat"], context.location["lon"], context.vibe_preference,
+                                   context.weather_condition, context.budget_tier, context.time_available)
+    return context, key
+
+async def build_quest(context: QuestContext, key: str) -> Tuple[QuestNetwork, dict]:
+    (quest, trace), reasons = await tracked(quest_orchestrator.generate_quest_with_trace(context))
+    # Places served from stale data count as degraded too.
+    trace["degraded"] += [r for r in reasons if r not in trace["degraded"]]
+    # An empty quest may just be a provider having a bad minute; ask again next time.
+    if not trace["degraded"] and quest.steps:
+        response_cache.quests.set(key, quest.model_dump_json().encode(), time.time() + response_cache.QUEST_CACHE_TTL)
+    return quest, trace
+
+def with_fresh_id(quest: QuestNetwork) -> QuestNetwork:
+    """A copy of a shared (cached or coalesced) quest under its own quest_id, one per response."""
+    return quest.model_copy(update={"quest_id": str(uuid.uuid4())})
+
+async def get_quest(context: QuestContext) -> QuestResponse:
+    """A cached quest for the context's tile, vibe, weather, budget and time bucket, or a fresh one."""
+    start = time.perf_counter()
+    context, key = quest_cache_key(context)
+    body = response_cache.quests.get(key)
+    if body is not None:
+        elapsed = round((time.perf_counter() - start) * 1000, 3)
+        timings = {"total_ms": elapsed, "degraded": [],
+                   "spans": [{"name": "cache", "start_ms": 0.0, "duration_ms": elapsed, "outcome": "hit", "attempts": 1}]}
+        return QuestResponse(quest=with_fresh_id(QuestNetwork.model_validate_json(body)), timings=timings, cached=True)
+    # Identical concurrent requests share one generation.
+    quest, trace = await quest_flight.do(key, lambda: build_quest(context, key))
+    return QuestResponse(quest=with_fresh_id(quest), timings=trace)
+
+@app.post("/quest", response_model=QuestResponse)
+async def create_quest(context: QuestContext):
+    return await get_quest(context)
+
+@app.post("/quest/batch", response_model=List[QuestBatchItemResult])
+async def create_quest_batch(batch: QuestBatchRequest):
+    """
+    Quests for many contexts at once, e.g. a scheduled job pre-generating
+    daily quests. Contexts sharing a cache key are generated once, distinct
+    ones run concurrently, and each item gets its own status.
+    """
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    out: List[Optional[QuestBatchItemResult]] = [None] * len(batch.items)
+
+    keys, calls = {}, {}
+    for i, context in enumerate(batch.items):
+        try:
+            _, keys[i] = quest_cache_key(context)
+        except HTTPException as e:
+            out[i] = QuestBatchItemResult(index=i, status=e.status_code, error=e.detail)
+            continue
+        calls.setdefault(keys[i], lambda context=context: get_quest(context))
+    results = await gather_unique(calls, QUEST_BATCH_CONCURRENCY)
+
+    for i, key in keys.items():
+        result = results[key]
+        if isinstance(result, Exception):
+            print(f"Quest Batch Item Error: {result}")
+            out[i] = QuestBatchItemResult(index=i, status=500, error=str(result))
+        else:
+            out[i] = QuestBatchItemResult(index=i, status=200, quest=with_fresh_id(result.quest),
+                                          timings=result.timings, cached=result.cached)
+    return out
+
+# --- Feedback ---
+
+@app.post("/feedback", status_code=202)
+async def post_feedback(event: FeedbackRequest):
+    """Records which kind of place a user chose. Queued for the writer and the online learner."""
+    queued = feedback.sink.record("chosen", scoring.model_weather_class(event.weather), event.time_available,
+                                  event.distance / 100, event.rating, event.place_type.lower())
+    return {"queued": queued}
+
+@app.get("/feedback/stats")
+def get_feedback_stats():
+    return feedback.pipeline.stats()
 
 @app.get("/suggestions")
 def get_suggestions():
@@ -351,21 +831,151 @@ def get_suggestions():
         return ["Sunset Viewpoint", "Cozy Dinner", "Night Walk"]
 
 @app.get("/favorites")
-def get_favorites():
-    return load_data().get("favorites", [])
+def get_favorites(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    location: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    descending = order == "desc"
+    if format == "ndjson":
+        rows = store.iter_favorites(location=location, descending=descending)
+        return StreamingResponse(ndjson_stream(rows), media_type="application/x-ndjson")
+    if limit is None and cursor is None:
+        return list(store.iter_favorites(location=location, descending=descending))
+
+    items, next_cursor = store.page_favorites(limit or DEFAULT_PAGE_SIZE, cursor, location=location, descending=descending)
+    set_next_cursor(response, next_cursor)
+    return items
 
 @app.post("/favorites")
 def add_favorite(fav: Favorite):
-    data = load_data()
-    # Check if exists
-    if not any(f["name"] == fav.name for f in data["favorites"]):
-        data["favorites"].append(fav.dict())
-        save_data(data)
+    # Duplicate names are ignored by the UNIQUE constraint
+    store.add_favorite(fav.name, fav.location, fav.score)
     return {"message": "Saved"}
 
 @app.get("/history")
-def get_history():
-    return load_data().get("history", [])
+def get_history(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    location: Optional[str] = None,
+    vibe: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """
+    Cursor-paginated history. Pass the X-Next-Cursor header value back as
+    `cursor` for the next page. Without `limit` or `cursor` every matching
+    row is returned in one list. `format=ndjson` streams every matching row
+    (ignoring limit/cursor) for exports.
+    """
+    descending = order == "desc"
+    if format == "ndjson":
+        rows = store.iter_history(since=since, until=until, location=location, vibe=vibe, descending=descending)
+        return StreamingResponse(ndjson_stream(rows), media_type="application/x-ndjson")
+    if limit is None and cursor is None:
+        return list(store.iter_history(since=since, until=until, location=location, vibe=vibe, descending=descending))
+
+    items, next_cursor = store.page_history(
+        limit or DEFAULT_PAGE_SIZE, cursor, since=since, until=until, location=location, vibe=vibe, descending=descending
+    )
+    set_next_cursor(response, next_cursor)
+    return items
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def collect_cache_metrics():
+    geocode = geocode_cache.stats()
+    yield ("geocode", "hit"), geocode["memory_hits"] + geocode["disk_hits"]
+    yield ("geocode", "miss"), geocode["misses"]
+    for name, cache in (("weather", geo_cache.weather_cache), ("places", geo_cache.places_cache)):
+        stats = cache.stats()
+        yield (name, "hit"), stats["hits"]
+        yield (name, "stale"), stats["stale_hits"]
+        yield (name, "miss"), stats["misses"]
+    responses = response_cache.responses.stats()
+    yield ("responses", "hit"), responses["hits"]
+    yield ("responses", "miss"), responses["misses"]
+    quests = response_cache.quests.stats()
+    yield ("quests", "hit"), quests["hits"]
+    yield ("quests", "miss"), quests["misses"]
+
+metrics.callback(
+    "pocketplan_cache_lookups_total",
+    "Cache lookups by cache and result (hit, stale, miss).",
+    "counter", ["cache", "result"], collect_cache_metrics
+)
+
+# --- Profiling (admin only) ---
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    host = request.client.host if request.client else None
+    if not profiling.is_authorized(host, x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/debug/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return {
+        "sample_rate": profiling.profiler.sample_rate,
+        "keep": profiling.profiler.keep,
+        "profiles": profiling.profiler.profiles()
+    }
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: int, format: str = Query("collapsed", pattern="^(collapsed|pstats|json)$")):
+    profile = profiling.profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return profile.summary()
+    if format == "pstats":
+        if profile.pstats_data is None:
+            raise HTTPException(status_code=404, detail="No pstats capture for this profile")
+        return Response(
+            profile.pstats_data,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+        )
+    return Response(profile.collapsed(), media_type="text/plain")
+
+@app.post("/debug/profiling", dependencies=[Depends(require_admin)])
+def configure_profiling(rate: float = Query(..., ge=0, le=1), keep: Optional[int] = Query(None, ge=1, le=1000)):
+    profiling.profiler.sample_rate = rate
+    if keep is not None:
+        profiling.profiler.keep = keep
+    return {"sample_rate": profiling.profiler.sample_rate, "keep": profiling.profiler.keep}
+
+@app.delete("/debug/profiles", dependencies=[Depends(require_admin)])
+def clear_profiles():
+    profiling.profiler.clear()
+    return {"message": "Cleared"}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return {
+        "geocode": {**geocode_cache.stats(), "singleflight": geocode_flight.stats()},
+        "weather": geo_cache.weather_cache.stats(),
+        "places": geo_cache.places_cache.stats(),
+        "responses": response_cache.responses.stats(),
+        "quests": {**response_cache.quests.stats(), "singleflight": quest_flight.stats()},
+        "place_index": place_index.index.stats()
+    }
+
+@app.delete("/cache/responses", dependencies=[Depends(require_admin)])
+def invalidate_responses(geohash: Optional[str] = Query(None, min_length=1, max_length=12)):
+    """Drops cached /recommend bodies, all of them or those within one geohash cell."""
+    return {"invalidated": response_cache.responses.invalidate(geohash)}
+
+@app.get("/admission/stats")
+def get_admission_stats():
+    return admission.stats()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,7 +1,10 @@
-import joblib
-import pandas as pd
+import numpy as np
 import os
 import logging
+from typing import Optional
+
+from backend import model_artifact
+from backend.decision_table import DecisionTable
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
@@ -11,20 +14,144 @@ logger = logging.getLogger(__name__)
 _model = None
 _weather_encoder = None
 _target_encoder = None
+_predictor = None
+_model_version = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, 'model.pkl')
 WEATHER_ENCODER_PATH = os.path.join(BASE_DIR, 'weather_encoder.pkl')
 TARGET_ENCODER_PATH = os.path.join(BASE_DIR, 'target_encoder.pkl')
 
+class LinearPredictor:
+    """
+    Serving form of the fitted LogisticRegression: the weather vocabulary as
+    a dict and the coefficients as plain arrays, so inference is one matrix
+    product with no pandas or sklearn calls.
+    """
+
+    def __init__(self, weather_classes, coef, intercept, labels, table: Optional[DecisionTable] = None):
+        self.table = table
+        self.weather_index = {str(w): i for i, w in enumerate(weather_classes)}
+        # (n_features, n_classes) so X @ coef lines up with sklearn's decision_function.
+        self.coef = np.ascontiguousarray(np.asarray(coef, dtype=np.float64).T)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=object)
+
+    @classmethod
+    def from_artifact(cls, header: dict, arrays: dict):
+        meta = header["metadata"]
+        return cls(meta["weather_classes"], arrays["coef"], arrays["intercept"], meta["labels"],
+                   table=DecisionTable.from_arrays(arrays))
+
+    @classmethod
+    def from_sklearn(cls, model, weather_encoder, target_encoder):
+        labels = target_encoder.inverse_transform(model.classes_)
+        return cls(weather_encoder.classes_, model.coef_, model.intercept_, labels)
+
+    def encode_weather(self, weather) -> np.ndarray:
+        # Unknown labels (e.g. 'Mist') fall back to 0, as the single-row path always did.
+        if isinstance(weather, str):
+            return np.array([self.weather_index.get(weather, 0)], dtype=np.float64)
+        return np.array([self.weather_index.get(w, 0) for w in weather], dtype=np.float64)
+
+    def decision_function(self, weather, time_available, distance, rating) -> np.ndarray:
+        columns = np.broadcast_arrays(
+            self.encode_weather(weather),
+            np.asarray(time_available, dtype=np.float64),
+            np.asarray(distance, dtype=np.float64),
+            np.asarray(rating, dtype=np.float64),
+        )
+        X = np.stack([np.atleast_1d(c) for c in columns], axis=1)
+        return X @ self.coef + self.intercept
+
+    def _table_predict(self, weather, time_available, distance, rating):
+        """
+        Fast path for the common serving shape: one weather/time/rating and
+        an array of distances. Returns None when the inputs are off the
+        compiled grid.
+        """
+        if self.table is None or not isinstance(weather, str) or np.ndim(time_available) or np.ndim(rating):
+            return None
+        cell = self.table.cell(self.weather_index.get(weather, 0), time_available, rating)
+        if cell is None:
+            return None
+        return self.labels[self.table.lookup(cell, np.atleast_1d(distance))]
+
+    def predict(self, weather, time_available, distance, rating, return_proba: bool = False):
+        if not return_proba:
+            labels = self._table_predict(weather, time_available, distance, rating)
+            if labels is not None:
+                return labels
+        scores = self.decision_function(weather, time_available, distance, rating)
+        if scores.shape[1] == 1:
+            # Binary model: one column, positive means the second class.
+            idx = (scores[:, 0] > 0).astype(np.intp)
+            proba = None
+            if return_proba:
+                p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+                proba = np.stack([1 - p, p], axis=1)
+        else:
+            idx = scores.argmax(axis=1)
+            proba = None
+            if return_proba:
+                z = np.exp(scores - scores.max(axis=1, keepdims=True))
+                proba = z / z.sum(axis=1, keepdims=True)
+        labels = self.labels[idx]
+        return (labels, proba) if return_proba else labels
+
 def load_model():
-    """Lengths the trained model and encoders from disk."""
-    global _model, _weather_encoder, _target_encoder
+    """
+    Loads the model for serving. Prefers the compact artifact written by
+    train_model.py or the online learner (numpy only); falls back to the
+    joblib pickles, which pull in scikit-learn.
+    """
+    path = newest_artifact_path()
+    if path is not None and load_artifact(path):
+        return True
+    return _load_pickles()
+
+def newest_artifact_path() -> Optional[str]:
+    """The offline or online artifact, whichever was created last, or None if neither is readable."""
+    newest, newest_at = None, None
+    for path in (model_artifact.ARTIFACT_PATH, model_artifact.ONLINE_ARTIFACT_PATH):
+        if not os.path.exists(path):
+            continue
+        try:
+            header, _ = model_artifact.read_header(path)
+        except Exception as e:
+            logger.error(f"Unreadable model artifact {path}: {e}")
+            continue
+        if newest_at is None or header["created_at"] > newest_at:
+            newest, newest_at = path, header["created_at"]
+    return newest
+
+def load_artifact(path: str) -> bool:
+    """
+    Loads an artifact and swaps it in. The predictor and its version are
+    replaced by plain assignments, so in-flight predictions finish on the
+    old model and the next ones use the new one, with no lock or pause.
+    """
+    global _predictor, _model_version
+    try:
+        header, arrays = model_artifact.load_artifact(path)
+        predictor = LinearPredictor.from_artifact(header, arrays)
+    except Exception as e:
+        logger.error(f"Failed to load model artifact {path}: {e}")
+        return False
+    _predictor, _model_version = predictor, header["model_version"]
+    logger.info(f"ML Model loaded from artifact (version {_model_version}).")
+    return True
+
+def _load_pickles():
+    global _model, _weather_encoder, _target_encoder, _predictor, _model_version
     try:
         if os.path.exists(MODEL_PATH) and os.path.exists(WEATHER_ENCODER_PATH) and os.path.exists(TARGET_ENCODER_PATH):
+            import joblib  # Deferred: importing it drags in scikit-learn at startup.
             _model = joblib.load(MODEL_PATH)
             _weather_encoder = joblib.load(WEATHER_ENCODER_PATH)
             _target_encoder = joblib.load(TARGET_ENCODER_PATH)
+            _predictor = LinearPredictor.from_sklearn(_model, _weather_encoder, _target_encoder)
+            _model_version = "pickle"
             logger.info("ML Model loaded successfully.")
             return True
         else:
@@ -34,47 +161,35 @@ def load_model():
         logger.error(f"Failed to load ML model: {e}")
         return False
 
-def predict_preferred_type(weather: str, time_available: int, rating: float, distance: float) -> str:
+def model_version() -> Optional[str]:
+    return _model_version
+
+def current_predictor() -> Optional[LinearPredictor]:
+    return _predictor
+
+def predict_preferred_types(weather, time_available, distance, rating, return_proba: bool = False):
     """
-    Predicts the preferred place type based on input features.
-    Returns: 'cafe', 'park', 'museum', 'restaurant', or None if model not loaded.
+    Batch prediction. Each argument is an array (or a scalar broadcast
+    against the others). Returns an array of labels, or (labels, proba)
+    with proba columns ordered like `class_labels()`. Returns None if the
+    model is not loaded.
     """
-    if _model is None or _weather_encoder is None or _target_encoder is None:
+    predictor = _predictor
+    if predictor is None:
         return None
+    return predictor.predict(weather, time_available, distance, rating, return_proba=return_proba)
 
+def class_labels():
+    return list(_predictor.labels) if _predictor is not None else []
+
+def predict_preferred_type(weather: str, time_available: int, rating: float, distance: float) -> Optional[str]:
+    """
+    Predicts the preferred place type based on input features.
+    Returns: 'cafe', 'park', 'museum', 'restaurant', or None if model not loaded.
+    """
     try:
-        # Preprocess Weather
-        # Handle unseen labels gracefully if possible, or force fallback
-        try:
-            weather_encoded = _weather_encoder.transform([weather])[0]
-        except ValueError:
-             # Fallback for unknown weather labels (e.g. 'Mist') -> map to 'cloudy' or similar if possible
-             # For now, let's just default to a known one like 'cloudy' (encoded value) or catch exception
-             # A safer approach is to check classes_ or try/except
-             # Let's use 0 as a safe fallback if unknown
-             weather_encoded = 0 
-        
-        # Create DataFrame for prediction (must match training interaction)
-        features = pd.DataFrame([{
-            'weather_encoded': weather_encoded,
-            'time_available': time_available,
-            'distance': distance,
-            'rating': rating
-        }])
-        
-        # Predict
-        predicted_idx = _model.predict(features)[0]
-        predicted_label = _target_encoder.inverse_transform([predicted_idx])[0]
-        
-        return predicted_label
+        labels = predict_preferred_types(weather, time_available, distance, rating)
+        return None if labels is None else labels[0]
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         return None
-
-def store_feedback(user_input: dict, chosen_place_type: str):
-    """
-    Placeholder for storing user feedback to retrain the model later.
-    """
-    # In a real app, this would save to a database or a feedback.csv file.
-    logger.info(f"Feedback received: Input={user_input}, Chosen={chosen_place_type}")
-    pass
@@ -0,0 +1,122 @@
+"""
+Single-file, versioned model artifact.
+
+Layout:
+    8 bytes   magic  b"PPMODEL\\0"
+    4 bytes   format version (little-endian uint32)
+    4 bytes   header length (little-endian uint32)
+    N bytes   UTF-8 JSON header
+    padding   to ARRAY_ALIGN
+    payload   raw little-endian arrays, each aligned to ARRAY_ALIGN
+
+The header lists every array's dtype, shape and offset into the payload,
+plus the label vocabularies and a SHA-256 of the payload. Arrays are opened
+with numpy.memmap, so loading costs a header parse and a few mmap calls and
+workers on one host share the pages through the OS page cache.
+
+Only numpy is imported here; serving never needs pandas or scikit-learn.
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+from typing import Dict, Optional
+
+import numpy as np
+
+MAGIC = b"PPMODEL\0"
+FORMAT_VERSION = 1
+ARRAY_ALIGN = 64
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", os.path.join(BASE_DIR, "model_artifact.bin"))
+# Versions published by the online learner (see feedback.py). Serving loads
+# whichever of the two files was created last.
+ONLINE_ARTIFACT_PATH = os.getenv("MODEL_ONLINE_ARTIFACT_PATH", os.path.join(BASE_DIR, "model_online.bin"))
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _align(n: int) -> int:
+    return (n + ARRAY_ALIGN - 1) // ARRAY_ALIGN * ARRAY_ALIGN
+
+
+def write_artifact(path: str, arrays: Dict[str, np.ndarray], metadata: dict,
+                   model_version: Optional[str] = None) -> dict:
+    """
+    Writes `arrays` plus JSON-serializable `metadata` to `path` atomically
+    (temp file + rename) and returns the header that was written.
+    """
+    payload = bytearray()
+    index = {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        payload.extend(b"\0" * (_align(len(payload)) - len(payload)))
+        index[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": len(payload)}
+        payload.extend(arr.tobytes())
+
+    digest = hashlib.sha256(payload).hexdigest()
+    header = {
+        "format_version": FORMAT_VERSION,
+        "model_version": model_version or f"{time.strftime('%Y%m%d%H%M%S')}-{digest[:8]}",
+        "created_at": time.time(),
+        "sha256": digest,
+        "arrays": index,
+        "metadata": metadata,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+    prefix = MAGIC + struct.pack("<II", FORMAT_VERSION, len(header_bytes)) + header_bytes
+    padding = b"\0" * (_align(len(prefix)) - len(prefix))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix + padding)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path: str):
+    """Returns (header, payload_offset)."""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ArtifactError(f"{path} is not a model artifact")
+        version, header_len = struct.unpack("<II", f.read(8))
+        if version != FORMAT_VERSION:
+            raise ArtifactError(f"Unsupported artifact format version {version}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    return header, _align(len(MAGIC) + 8 + header_len)
+
+
+def load_artifact(path: str = ARTIFACT_PATH, verify: bool = True):
+    """
+    Opens an artifact and returns (header, arrays) where every array is a
+    read-only numpy.memmap. With `verify`, the payload checksum is checked
+    before anything is returned.
+    """
+    header, payload_offset = read_header(path)
+    if verify:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            f.seek(payload_offset)
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        if h.hexdigest() != header["sha256"]:
+            raise ArtifactError(f"Checksum mismatch in {path}")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=spec["dtype"])
+            continue
+        arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r",
+                                 offset=payload_offset + spec["offset"], shape=shape)
+    return header, arrays
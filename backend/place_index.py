@@ -0,0 +1,276 @@
+import os
+import json
+import gzip
+import math
+import time
+import logging
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from backend import metrics
+from backend.geo_cache import haversine_m
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATH = os.getenv("PLACE_INDEX_PATH", os.path.join(BASE_DIR, "place_index.json.gz"))
+# How long fetched coverage may answer queries locally.
+MAX_AGE = float(os.getenv("PLACE_INDEX_MAX_AGE", str(24 * 3600)))
+MAX_PLACES = int(os.getenv("PLACE_INDEX_MAX_PLACES", "200000"))
+# Places requested per upstream call while filling the index. Fetching more
+# than one answer needs widens the area later queries can be served from.
+FETCH_LIMIT = int(os.getenv("PLACE_INDEX_FETCH_LIMIT", "60"))
+# Grid cell size in degrees (~5.5km of latitude).
+CELL_DEG = float(os.getenv("PLACE_INDEX_CELL_DEG", "0.05"))
+
+INDEX_LOOKUPS = metrics.counter(
+    "pocketplan_place_index_lookups_total",
+    "Place index queries by result (hit = answered locally, miss = not covered).",
+    ["result"],
+)
+
+Cell = Tuple[int, int]
+METRES_PER_DEG = 111320.0
+
+
+def _cell(lat: float, lon: float) -> Cell:
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+
+def _cells_around(lat: float, lon: float, radius_m: float) -> Iterator[Cell]:
+    """Every grid cell touching the bounding box of a circle."""
+    dlat = radius_m / METRES_PER_DEG
+    dlon = radius_m / (METRES_PER_DEG * max(math.cos(math.radians(lat)), 1e-6))
+    lat_lo, lon_lo = _cell(lat - dlat, lon - dlon)
+    lat_hi, lon_hi = _cell(lat + dlat, lon + dlon)
+    for i in range(lat_lo, lat_hi + 1):
+        for j in range(lon_lo, lon_hi + 1):
+            yield i, j
+
+
+def split_categories(categories: str) -> Tuple[str, ...]:
+    return tuple(sorted({c.strip() for c in categories.split(",") if c.strip()}))
+
+
+def _covers_category(covered: Tuple[str, ...], wanted: str) -> bool:
+    # Geoapify categories are hierarchical: a query for "catering" also
+    # returned every "catering.*" place.
+    return any(wanted == c or wanted.startswith(c + ".") for c in covered)
+
+
+class Coverage:
+    """One completed upstream query: everything matching `categories` within `radius` of the centre."""
+    __slots__ = ("lat", "lon", "radius", "categories", "fetched_at")
+
+    def __init__(self, lat: float, lon: float, radius: float, categories: Tuple[str, ...], fetched_at: float):
+        self.lat = lat
+        self.lon = lon
+        self.radius = radius
+        self.categories = categories
+        self.fetched_at = fetched_at
+
+    def contains(self, lat: float, lon: float, radius: float, categories: Tuple[str, ...]) -> bool:
+        return (haversine_m(self.lat, self.lon, lat, lon) + radius <= self.radius
+                and all(_covers_category(self.categories, c) for c in categories))
+
+
+class PlaceIndex:
+    """
+    Grid index over places fetched from Geoapify.
+
+    Places are bucketed by CELL_DEG grid cell. Alongside them the index keeps
+    a coverage record per upstream query, saying which circle and category
+    set that query fully enumerated. A query is answered locally only when a
+    fresh coverage record contains the whole requested circle for every
+    requested category; otherwise the caller goes upstream and adds the
+    result. When Geoapify returns a full page (its limit), the coverage
+    radius shrinks to the furthest returned place, since anything beyond
+    it may have been cut off.
+    """
+
+    def __init__(self, max_age: float = MAX_AGE, max_places: int = MAX_PLACES):
+        self.max_age = max_age
+        self.max_places = max_places
+        self._places: Dict[str, dict] = {}
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._coverage: Dict[Cell, List[Coverage]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    # --- Writes ---
+
+    @staticmethod
+    def _place_id(place: dict) -> str:
+        return place.get("place_id") or f"{place['name']}|{place['lat']:.6f}|{place['lon']:.6f}"
+
+    def _add_place(self, place: dict, fetched_at: float):
+        pid = self._place_id(place)
+        old = self._places.get(pid)
+        if old is not None:
+            self._cells.get(_cell(old["lat"], old["lon"]), set()).discard(pid)
+        self._places[pid] = {
+            "name": place["name"],
+            "categories": list(place["categories"]),
+            "lat": place["lat"],
+            "lon": place["lon"],
+            "fetched_at": fetched_at,
+        }
+        self._cells.setdefault(_cell(place["lat"], place["lon"]), set()).add(pid)
+
+    def add_result(self, lat: float, lon: float, radius: float, categories: str,
+                   places: List[dict], limit: int, fetched_at: Optional[float] = None):
+        """Records the places from one upstream query and the area it covered."""
+        fetched_at = fetched_at or time.time()
+        located = [p for p in places if p.get("lat") is not None and p.get("lon") is not None]
+        for p in located:
+            self._add_place(p, fetched_at)
+
+        if len(located) < len(places):
+            return  # Places without coordinates cannot be served locally.
+        covered = radius
+        if len(places) >= limit:
+            covered = max((haversine_m(lat, lon, p["lat"], p["lon"]) for p in located), default=0.0)
+        if covered > 0:
+            self._coverage.setdefault(_cell(lat, lon), []).append(
+                Coverage(lat, lon, covered, split_categories(categories), fetched_at))
+
+        if len(self._places) > self.max_places:
+            self.prune(now=time.time(), max_places=self.max_places)
+
+    def prune(self, now: Optional[float] = None, max_places: Optional[int] = None) -> int:
+        """Drops expired coverage and places, then the oldest places beyond `max_places`."""
+        now = now or time.time()
+        cutoff = now - self.max_age
+        for cell in list(self._coverage):
+            fresh = [c for c in self._coverage[cell] if c.fetched_at >= cutoff]
+            if fresh:
+                self._coverage[cell] = fresh
+            else:
+                del self._coverage[cell]
+
+        doomed = [pid for pid, p in self._places.items() if p["fetched_at"] < cutoff]
+        if max_places is not None and len(self._places) - len(doomed) > max_places:
+            live = sorted((p["fetched_at"], pid) for pid, p in self._places.items() if p["fetched_at"] >= cutoff)
+            dropped = live[:len(live) - max_places]
+            doomed += [pid for _, pid in dropped]
+            # Coverage no newer than the newest dropped place is no longer complete.
+            newest_dropped = dropped[-1][0]
+            for cell in list(self._coverage):
+                kept = [c for c in self._coverage[cell] if c.fetched_at > newest_dropped]
+                if kept:
+                    self._coverage[cell] = kept
+                else:
+                    del self._coverage[cell]
+        for pid in doomed:
+            p = self._places.pop(pid, None)
+            if p is not None:
+                self._cells.get(_cell(p["lat"], p["lon"]), set()).discard(pid)
+        return len(doomed)
+
+    # --- Reads ---
+
+    def _covered(self, lat: float, lon: float, needed: float, search_radius: float,
+                 categories: Tuple[str, ...], now: float) -> bool:
+        cutoff = now - self.max_age
+        # Coverage circles are never wider than the upstream search radius,
+        # so any circle containing the query point is centred within it.
+        for cell in _cells_around(lat, lon, search_radius):
+            for cov in self._coverage.get(cell, ()):
+                if cov.fetched_at >= cutoff and cov.contains(lat, lon, needed, categories):
+                    return True
+        return False
+
+    def query(self, lat: float, lon: float, radius: float, categories: str,
+              limit: int) -> Optional[List[dict]]:
+        """
+        The `limit` nearest indexed places within `radius` metres matching
+        any of `categories`, in the same shape fetch_places returns, or None
+        when the area is not freshly covered and the caller must go upstream.
+
+        Only the circle out to the `limit`-th nearest match has to be
+        covered, since nothing further out can make the answer.
+        """
+        now = time.time()
+        wanted = split_categories(categories)
+        wanted_set = set(wanted)
+        results = []
+        for cell in _cells_around(lat, lon, radius):
+            for pid in self._cells.get(cell, ()):
+                p = self._places[pid]
+                if wanted_set.isdisjoint(p["categories"]):
+                    continue
+                d = haversine_m(lat, lon, p["lat"], p["lon"])
+                if d <= radius:
+                    results.append((d, p))
+        results.sort(key=lambda r: r[0])
+        results = results[:limit]
+        needed = results[-1][0] if len(results) == limit else radius
+
+        if not self._covered(lat, lon, needed, radius, wanted, now):
+            self.misses += 1
+            INDEX_LOOKUPS.labels("miss").inc()
+            return None
+        self.hits += 1
+        INDEX_LOOKUPS.labels("hit").inc()
+        return [{
+            "name": p["name"],
+            "distance": int(d),
+            "categories": p["categories"],
+            "lat": p["lat"],
+            "lon": p["lon"],
+        } for d, p in results]
+
+    # --- Snapshots ---
+
+    def snapshot(self) -> dict:
+        """A JSON-serializable copy of the index, taken on the event loop."""
+        return {
+            "version": 1,
+            "saved_at": time.time(),
+            "places": list(self._places.items()),
+            "coverage": [[c.lat, c.lon, c.radius, list(c.categories), c.fetched_at]
+                         for covs in self._coverage.values() for c in covs],
+        }
+
+    @staticmethod
+    def write_snapshot(snapshot: dict, path: str = SNAPSHOT_PATH):
+        """Writes a snapshot atomically (temp file + rename). Safe to call from a thread."""
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path: str = SNAPSHOT_PATH) -> int:
+        """Restores a snapshot, skipping anything already expired. Returns the number of places loaded."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable place index snapshot {path}: {e}")
+            return 0
+        cutoff = time.time() - self.max_age
+        for pid, p in data.get("places", []):
+            if p["fetched_at"] >= cutoff:
+                self._places[pid] = p
+                self._cells.setdefault(_cell(p["lat"], p["lon"]), set()).add(pid)
+        for lat, lon, radius, categories, fetched_at in data.get("coverage", []):
+            if fetched_at >= cutoff:
+                self._coverage.setdefault(_cell(lat, lon), []).append(
+                    Coverage(lat, lon, radius, tuple(categories), fetched_at))
+        return len(self._places)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "places": len(self._places),
+            "coverage": sum(len(c) for c in self._coverage.values()),
+        }
+
+
+index = PlaceIndex()
@@ -0,0 +1,279 @@
+import os
+import sys
+import time
+import hmac
+import heapq
+import random
+import marshal
+import asyncio
+import cProfile
+import pstats
+import logging
+import threading
+import itertools
+import contextvars
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Profiling is off unless PROFILE_SAMPLE_RATE > 0. The rate can also be
+# changed at runtime through POST /debug/profiling.
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+KEEP_SLOWEST = int(os.getenv("PROFILE_KEEP", "20"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILED_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/recommend,/quest").split(",") if p)
+ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+_current_profile: contextvars.ContextVar = contextvars.ContextVar("pocketplan_profile", default=None)
+
+
+def is_authorized(client_host: Optional[str], token: Optional[str]) -> bool:
+    """
+    With PROFILE_ADMIN_TOKEN set, the X-Admin-Token header must match it.
+    Without a token, only loopback clients may use the profiling endpoints.
+    """
+    if ADMIN_TOKEN:
+        return token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+    return client_host in LOCAL_HOSTS
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Outermost-first `a;b;c` stack for one frame."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class RequestProfile:
+    """Samples and (optionally) a cProfile capture for one request."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, path: str, task: asyncio.Task):
+        self.id = next(self._ids)
+        self.path = path
+        self.root_task = task
+        self.tasks = {task}
+        self.started_at = time.time()
+        self.wall_s = 0.0
+        self.cpu_samples: Counter = Counter()
+        self.await_samples: Counter = Counter()
+        self.profiler: Optional[cProfile.Profile] = None
+        self.pstats_data: Optional[bytes] = None
+        self.context_token = None
+
+    @property
+    def cpu_s(self) -> float:
+        return sum(self.cpu_samples.values()) * SAMPLE_INTERVAL
+
+    @property
+    def await_s(self) -> float:
+        return max(0.0, self.wall_s - self.cpu_s)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall_s * 1000, 3),
+            "cpu_ms": round(self.cpu_s * 1000, 3),
+            "await_ms": round(self.await_s * 1000, 3),
+            "samples": sum(self.cpu_samples.values()) + sum(self.await_samples.values()),
+            "has_pstats": self.pstats_data is not None,
+        }
+
+    def collapsed(self) -> str:
+        """
+        Flamegraph-ready collapsed stacks. CPU samples (the loop was running
+        one of this request's tasks) sit under a `[cpu]` root and await
+        samples (the request was suspended) under `[await]`, so the two can
+        be read separately.
+        """
+        lines = [f"[cpu];{stack} {n}" for stack, n in self.cpu_samples.most_common()]
+        lines += [f"[await];{stack} {n}" for stack, n in self.await_samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    Opt-in sampling profiler for live requests.
+
+    A background thread samples the event loop thread's Python stack every
+    SAMPLE_INTERVAL while any profiled request is in flight. A sample counts
+    as CPU for a request when the loop is running one of that request's
+    tasks (tasks created while handling it are tracked through a task
+    factory), and as await time otherwise.
+
+    One request at a time also gets a cProfile capture for pstats. cProfile
+    is per-thread, so that capture includes whatever else the loop ran
+    meanwhile; the sampled data does not have that problem.
+    """
+
+    def __init__(self, sample_rate: float = SAMPLE_RATE, keep: int = KEEP_SLOWEST):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._active: Dict[int, RequestProfile] = {}
+        self._slowest: List[tuple] = []  # min-heap of (wall_s, id, profile)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._cprofile_busy = False
+        self._task_lookup_failed = False
+
+    def should_profile(self, path: str) -> bool:
+        return self.sample_rate > 0 and path.startswith(PROFILED_PATHS) and random.random() < self.sample_rate
+
+    # --- Task tracking ---
+
+    def _install(self, loop: asyncio.AbstractEventLoop):
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            profile = _current_profile.get()
+            if profile is not None:
+                profile.tasks.add(task)
+            return task
+
+        loop.set_task_factory(factory)
+
+    # --- Sampling ---
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+            self._sampler.start()
+        self._wake.set()
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                self._wake.clear()
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            running = self._running_task()
+            stack = _collapse(frame) if frame is not None else "[idle]"
+            for profile in active:
+                if running is not None and running in profile.tasks:
+                    profile.cpu_samples[stack] += 1
+                else:
+                    profile.await_samples[self._await_stack(profile)] += 1
+            time.sleep(SAMPLE_INTERVAL)
+
+    def _running_task(self) -> Optional[asyncio.Task]:
+        # asyncio.current_task() takes the loop explicitly, so the sampler
+        # thread can ask which task the loop thread is running.
+        try:
+            return asyncio.current_task(self._loop)
+        except RuntimeError as e:
+            if not self._task_lookup_failed:
+                self._task_lookup_failed = True
+                logger.warning(f"Cannot tell which task the loop is running, all samples count as await time: {e}")
+            return None
+
+    @staticmethod
+    def _await_stack(profile: RequestProfile) -> str:
+        # Where the request's root coroutine is currently suspended.
+        try:
+            frames = profile.root_task.get_stack()
+            if frames:
+                return _collapse(frames[-1])
+        except Exception:
+            pass
+        return "[suspended]"
+
+    # --- Request lifecycle ---
+
+    def start(self, path: str) -> RequestProfile:
+        loop = asyncio.get_running_loop()
+        self._install(loop)
+        profile = RequestProfile(path, asyncio.current_task())
+        with self._lock:
+            self._active[profile.id] = profile
+            if not self._cprofile_busy:
+                self._cprofile_busy = True
+                profile.profiler = cProfile.Profile()
+        profile.context_token = _current_profile.set(profile)
+        if profile.profiler is not None:
+            profile.profiler.enable()
+        self._ensure_sampler()
+        return profile
+
+    def finish(self, profile: RequestProfile, wall_s: float):
+        profile.wall_s = wall_s
+        if profile.profiler is not None:
+            profile.profiler.disable()
+            profile.pstats_data = marshal.dumps(pstats.Stats(profile.profiler).stats)
+            profile.profiler = None
+            with self._lock:
+                self._cprofile_busy = False
+        if profile.context_token is not None:
+            _current_profile.reset(profile.context_token)
+            profile.context_token = None
+        profile.tasks.clear()
+        profile.root_task = None
+        with self._lock:
+            self._active.pop(profile.id, None)
+            entry = (wall_s, profile.id, profile)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif wall_s > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    # --- Access ---
+
+    def profiles(self) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [p.summary() for _, _, p in entries]
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        with self._lock:
+            for _, pid, profile in self._slowest:
+                if pid == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._slowest = []
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles a sampled fraction of matching requests."""
+
+    def __init__(self, app, profiler: Profiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_profile(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        profile = self.profiler.start(scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.finish(profile, time.perf_counter() - start)
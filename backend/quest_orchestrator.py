@@ -1,33 +1,176 @@
+import os
+import time
 import asyncio
 import uuid
-from typing import List, Dict
+from concurrent.futures import Executor
+from functools import partial
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 from .quest_types import QuestContext, QuestNetwork, QuestStep
+from . import scoring
+from .engine_runner import EngineRunner, EngineSpec, QuestTrace
+from .route_optimizer import Route, plan_route
+
+# Compute budget for route planning and the most stops a quest may have.
+ROUTE_DEADLINE = float(os.getenv("QUEST_ROUTE_DEADLINE_MS", "50")) / 1000
+MAX_STOPS = int(os.getenv("QUEST_MAX_STOPS", "6"))
+# How long a quest waits for the planning pool (queueing included) before
+# it plans a greedy route itself and is marked degraded.
+ROUTE_POOL_TIMEOUT = float(os.getenv("QUEST_ROUTE_POOL_TIMEOUT_MS", "250")) / 1000
+
+# Time the engines (safety, social, candidates) get as a whole. A quest
+# takes at most this plus ROUTE_DEADLINE (ROUTE_POOL_TIMEOUT when planning
+# in a pool), however slow an engine or busy the pool is.
+QUEST_DEADLINE = float(os.getenv("QUEST_DEADLINE_MS", "1500")) / 1000
+# Per-call timeouts, capped by what is left of QUEST_DEADLINE.
+SCORE_ENGINE_TIMEOUT = float(os.getenv("QUEST_SCORE_ENGINE_TIMEOUT_MS", "500")) / 1000
+CANDIDATES_TIMEOUT = float(os.getenv("QUEST_CANDIDATES_TIMEOUT_MS", "1200")) / 1000
+# A second safety/social attempt starts if the first has not answered by
+# then. Candidates are not hedged: they spend Geoapify quota.
+SCORE_ENGINE_HEDGE_AFTER = float(os.getenv("QUEST_SCORE_ENGINE_HEDGE_MS", "250")) / 1000
+ENGINE_CONCURRENCY = int(os.getenv("QUEST_ENGINE_CONCURRENCY", "32"))
+
+# Scores used when an engine misses its deadline, fails or has its breaker
+# open. Both sit mid-scale: the quest neither vouches for an area it could
+# not check nor marks it down.
+DEFAULT_SAFETY_SCORE = 50
+DEFAULT_SOCIAL_SCORE = 50
+
+# Minutes spent at a stop, by the first matching category prefix.
+VISIT_MINUTES = [
+    ("catering.restaurant", 60),
+    ("entertainment.museum", 60),
+    ("entertainment", 45),
+    ("catering.bar", 45),
+    ("catering", 30),
+    ("leisure.park", 30),
+    ("sport", 45),
+    ("tourism", 20),
+]
+DEFAULT_VISIT_MINUTES = 30
+
+# (description, action item) per kind of stop.
+STEP_TEXT = [
+    ("catering.cafe", "Recharge with a good brew.", "Order something you have never tried."),
+    ("catering.restaurant", "Sit down for a proper meal.", "Ask the staff for the house special."),
+    ("catering.bar", "Wind down with a drink.", "Find the drink with the best name on the menu."),
+    ("entertainment.museum", "Take in some culture.", "Find the piece you would take home."),
+    ("entertainment", "Level up your day.", "Beat a personal best."),
+    ("leisure.park", "Get some fresh air.", "Spot three different birds."),
+    ("sport", "Get moving.", "Try one thing you have never done before."),
+    ("tourism", "See what the area is known for.", "Take a photo from an unusual angle."),
+    ("commercial.books", "Browse the shelves.", "Read the first page of a random book."),
+]
+DEFAULT_STEP_TEXT = ("Explore this spot.", "Check in and look around.")
+
+CandidateProvider = Callable[[QuestContext], Awaitable[List[dict]]]
+
+
+def _first_match(categories: List[str], table, default):
+    for row in table:
+        if any(c == row[0] or c.startswith(row[0] + ".") for c in categories):
+            return row[1:] if len(row) > 2 else row[1]
+    return default
+
+
+def visit_minutes(categories: List[str]) -> int:
+    return _first_match(categories, VISIT_MINUTES, DEFAULT_VISIT_MINUTES)
+
+
+def stub_candidates(context: QuestContext) -> List[dict]:
+    """Offline stand-ins, only used when no candidate provider is configured."""
+    lat, lon = context.location["lat"], context.location["lon"]
+    return [
+        {
+            "name": "The Catalyst Cafe",
+            "lat": lat,
+            "lon": lon,
+            "categories": ["catering.cafe", "catering"],
+            "description": "Start your engine with a strong brew.",
+            "action_item": "Order the 'Mystery Roosevelt' blend.",
+        },
+        {
+            "name": "Neon Arcade",
+            "lat": lat + 0.001,
+            "lon": lon + 0.001,
+            "categories": ["entertainment", "entertainment.activity_park"],
+            "description": "Level up your day.",
+            "action_item": "Beat the high score on Pac-Man.",
+        },
+    ]
+
+
+def default_engines() -> List[EngineSpec]:
+    return [
+        EngineSpec("safety", SCORE_ENGINE_TIMEOUT, DEFAULT_SAFETY_SCORE,
+                   hedge_after=SCORE_ENGINE_HEDGE_AFTER, max_concurrency=ENGINE_CONCURRENCY),
+        EngineSpec("social", SCORE_ENGINE_TIMEOUT, DEFAULT_SOCIAL_SCORE,
+                   hedge_after=SCORE_ENGINE_HEDGE_AFTER, max_concurrency=ENGINE_CONCURRENCY),
+        # A quest whose candidates engine misses gets no stops (and is
+        # marked degraded by the trace), never made-up places.
+        EngineSpec("candidates", CANDIDATES_TIMEOUT, list, max_concurrency=ENGINE_CONCURRENCY),
+    ]
+
 
 class QuestOrchestrator:
-    def __init__(self):
-        pass
+    def __init__(self, candidate_provider: Optional[CandidateProvider] = None,
+                 engines: Optional[List[EngineSpec]] = None, deadline: float = QUEST_DEADLINE,
+                 executor: Optional[Executor] = None):
+        # Async callable returning candidate places ({name, lat, lon,
+        # categories}) around the context's location.
+        self.candidate_provider = candidate_provider
+        # Where route planning runs; None plans on the calling thread. A
+        # process pool keeps the event loop free while many quests plan.
+        self.executor = executor
+        # Breakers and concurrency limits live here, so they are shared by
+        # every quest this orchestrator builds.
+        self.runner = EngineRunner(engines or default_engines())
+        self.deadline = deadline
 
     async def generate_quest(self, context: QuestContext) -> QuestNetwork:
         """
         Orchestrates the creation of a quest by efficiently calling sub-engines.
         """
-        # 1. Parallel Context Analysis (Simulated Async)
-        safety_task = self._get_safety_score(context.location, context.time_available)
-        social_task = self._get_social_vibe(context.location, context.weather_condition)
-        
-        safety_score, social_score = await asyncio.gather(safety_task, social_task)
+        quest, _ = await self.generate_quest_with_trace(context)
+        return quest
+
+    async def generate_quest_with_trace(self, context: QuestContext) -> Tuple[QuestNetwork, dict]:
+        """Like generate_quest, also returning the quest's timing trace (see QuestTrace.to_dict)."""
+        trace = QuestTrace(self.deadline)
 
-        # 2. Logic / Route Generation (Stubbed for now)
-        steps = self._generate_steps(context)
+        # 1. Parallel Context Analysis, each engine bounded by the quest deadline
+        safety_score, social_score, candidates = await asyncio.gather(
+            self.runner.run("safety", lambda: self._get_safety_score(context.location, context.time_available), trace),
+            self.runner.run("social", lambda: self._get_social_vibe(context.location, context.weather_condition), trace),
+            self.runner.run("candidates", lambda: self._get_candidates(context), trace),
+        )
+
+        # 2. Route Generation
+        with trace.stage("steps"):
+            planner = self._route_planner(context, candidates)
+            if self.executor is None:
+                route = planner()
+            else:
+                pool_start = time.perf_counter()
+                try:
+                    route = await asyncio.wait_for(
+                        asyncio.get_running_loop().run_in_executor(self.executor, planner), ROUTE_POOL_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # The pool is backed up. With no deadline, plan_route
+                    # stops after its greedy construction pass.
+                    trace.add("route_pool", pool_start, "timeout")
+                    route = self._route_planner(context, candidates, deadline=0)()
+            steps = self._steps_from_route(candidates, route)
         
         # 3. Gamification Overlay
-        challenges = self._generate_gamification_challenges(context, steps)
+        with trace.stage("gamification"):
+            challenges = self._generate_gamification_challenges(context, steps)
 
         # 4. Assemble Quest
         quest = QuestNetwork(
             quest_id=str(uuid.uuid4()),
             title=f"{context.vibe_preference} Adventure in {context.weather_condition}",
-            narrative=f"A curated journey for a {context.vibe_preference.lower()} mood. Weather is {context.weather_condition}, so we picked spots accordingly.",
+            narrative=(f"A curated journey for a {context.vibe_preference.lower()} mood. Weather is {context.weather_condition}, so we picked spots accordingly."
+                       if steps else "No places to visit were found nearby for this mood and budget."),
             safety_score=safety_score,
             social_vibe_score=social_score,
             steps=steps,
@@ -35,7 +178,7 @@ class QuestOrchestrator:
             total_duration=sum(s.estimated_duration for s in steps)
         )
         
-        return quest
+        return quest, trace.to_dict()
 
     # --- Modular Engine Stubs ---
 
@@ -53,28 +196,58 @@ class QuestOrchestrator:
             return 60 # Less social outdoors
         return 92
 
-    def _generate_steps(self, context: QuestContext) -> List[QuestStep]:
-        """Generates the actual itinerary steps."""
-        # In a real implementation, this would query the Places API
-        # For now, we return strict schema-compliant stubs
-        return [
-            QuestStep(
-                step_id="step_1",
-                place_name="The Catalyst Cafe",
-                description="Start your engine with a strong brew.",
-                action_item="Order the 'Mystery Roosevelt' blend.",
-                coordinates={"lat": context.location["lat"], "lon": context.location["lon"]},
-                estimated_duration=30
-            ),
-            QuestStep(
-                step_id="step_2",
-                place_name="Neon Arcade",
-                description="Level up your day.",
-                action_item="Beat the high score on Pac-Man.",
-                coordinates={"lat": context.location["lat"] + 0.001, "lon": context.location["lon"] + 0.001},
-                estimated_duration=45
-            )
-        ]
+    async def _get_candidates(self, context: QuestContext) -> List[dict]:
+        # Provider errors propagate so the runner counts them against the
+        # candidates breaker. An empty answer stays empty: the area has
+        # nothing to visit, and the quest says so.
+        if self.candidate_provider is None:
+            return stub_candidates(context)
+        candidates = await self.candidate_provider(context)
+        return [c for c in candidates if c.get("lat") is not None and c.get("lon") is not None]
+
+    def _generate_steps(self, context: QuestContext, candidates: Optional[List[dict]] = None) -> List[QuestStep]:
+        """
+        Picks and orders stops with the route optimizer: the best summed
+        weather/budget/vibe fit whose walking plus visiting time fits in
+        context.time_available. Each step's duration is the walk to it plus
+        the time spent there.
+        """
+        if candidates is None:
+            candidates = stub_candidates(context)
+        return self._steps_from_route(candidates, self._route_planner(context, candidates)())
+
+    def _route_planner(self, context: QuestContext, candidates: List[dict],
+                       deadline: float = ROUTE_DEADLINE) -> Callable[[], Route]:
+        """The plan_route call for these candidates, as a picklable callable for a process pool."""
+        values = scoring.fit_scores(candidates, context.weather_condition, context.budget_tier.lower(),
+                                    context.vibe_preference)
+        return partial(
+            plan_route,
+            context.location["lat"], context.location["lon"],
+            [c["lat"] for c in candidates], [c["lon"] for c in candidates],
+            values, [visit_minutes(c["categories"]) for c in candidates],
+            context.time_available, max_stops=MAX_STOPS, deadline=deadline
+        )
+
+    def _steps_from_route(self, candidates: List[dict], route: Route) -> List[QuestStep]:
+        steps = []
+        # Durations are differences of the rounded running total, so they
+        # add up to the route's rounded length and never past the budget.
+        elapsed, rounded = 0.0, 0
+        for n, (i, walk, visit) in enumerate(zip(route.stops, route.walk_minutes, route.visit_minutes), start=1):
+            elapsed += walk + visit
+            duration, rounded = int(round(elapsed)) - rounded, int(round(elapsed))
+            place = candidates[i]
+            description, action_item = _first_match(place["categories"], STEP_TEXT, DEFAULT_STEP_TEXT)
+            steps.append(QuestStep(
+                step_id=f"step_{n}",
+                place_name=place["name"],
+                description=place.get("description", description),
+                action_item=place.get("action_item", action_item),
+                coordinates={"lat": place["lat"], "lon": place["lon"]},
+                estimated_duration=duration
+            ))
+        return steps
 
     def _generate_gamification_challenges(self, context: QuestContext, steps: List[QuestStep]) -> List[str]:
         """Adds specific challenges based on the context."""
@@ -0,0 +1,130 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from backend.geo_cache import geohash, geohash_bounds
+
+# --- Configuration ---
+# Precision 7 is a ~150m x 150m cell. Searches that geocode into the same
+# cell share an answer, so walking times may be off by up to a cell; the
+# same location text always geocodes to the same point and matches exactly.
+RESPONSE_TILE_PRECISION = int(os.getenv("RESPONSE_TILE_PRECISION", "7"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_MAX_TTL = float(os.getenv("RESPONSE_CACHE_MAX_TTL", str(10 * 60)))
+
+# Quests are shared more coarsely: precision 6 is a ~1.2km x 0.6km cell,
+# and time budgets are rounded down to QUEST_TIME_BUCKET minutes. Quests
+# are planned from the cell's centre, so a cached one is equally right for
+# everyone in the cell rather than exact for whoever asked first.
+QUEST_TILE_PRECISION = int(os.getenv("QUEST_TILE_PRECISION", "6"))
+QUEST_TIME_BUCKET = int(os.getenv("QUEST_TIME_BUCKET", "30"))
+QUEST_CACHE_SIZE = int(os.getenv("QUEST_CACHE_SIZE", "4096"))
+QUEST_CACHE_TTL = float(os.getenv("QUEST_CACHE_TTL", str(15 * 60)))
+
+
+def response_key(lat: float, lon: float, preference: str, budget: Optional[str],
+                 time_text: str, weather: dict) -> str:
+    """
+    Everything the /recommend output depends on besides cached upstream
+    data. The vibe and time text are echoed into the cards, and the
+    weather condition and whole-degree temperature drive the rules,
+    must-take list and weather summary, so they are kept as-is.
+    """
+    return "|".join([
+        geohash(lat, lon, RESPONSE_TILE_PRECISION),
+        preference,
+        budget or "",
+        time_text,
+        weather["condition"],
+        str(int(weather["temp"])),
+    ])
+
+
+def quest_time_bucket(minutes: int) -> int:
+    """
+    Rounds a time budget down to its bucket. Quests are planned for the
+    bucketed budget, so a cached quest fits every caller in the bucket.
+    Budgets shorter than one bucket are kept as they are.
+    """
+    return minutes - minutes % QUEST_TIME_BUCKET if minutes >= QUEST_TIME_BUCKET else minutes
+
+
+def quest_tile_centre(lat: float, lon: float) -> Tuple[float, float]:
+    """Centre of the quest cell holding (lat, lon), the point quests for that cell start from."""
+    lat_min, lat_max, lon_min, lon_max = geohash_bounds(geohash(lat, lon, QUEST_TILE_PRECISION))
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def quest_key(lat: float, lon: float, vibe: str, weather: str, budget: str, minutes: int) -> str:
+    return "|".join([
+        geohash(lat, lon, QUEST_TILE_PRECISION),
+        vibe.lower(),
+        weather.lower(),
+        budget.lower(),
+        str(quest_time_bucket(minutes)),
+    ])
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized response bodies. Each entry carries its own
+    expiry, set by the caller to when the weather or places data it was
+    built from stops being fresh, and capped at `max_ttl`.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_ttl: float = RESPONSE_CACHE_MAX_TTL):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, body: bytes, expires_at: float):
+        expires_at = min(expires_at, time.time() + self.max_ttl)
+        if expires_at <= time.time():
+            return
+        self._entries[key] = (body, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, prefix: Optional[str] = None) -> int:
+        """Drops every entry, or those whose key starts with `prefix` (e.g. a geohash). Returns the count."""
+        if prefix is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                del self._entries[k]
+            removed = len(keys)
+        self.invalidations += removed
+        return removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+responses = ResponseCache()
+quests = ResponseCache(QUEST_CACHE_SIZE, QUEST_CACHE_TTL)
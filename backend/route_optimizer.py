@@ -0,0 +1,233 @@
+"""
+Time-budgeted route planning for quests.
+
+Picking which candidate places to visit and in what order, so the summed
+fit is as high as possible while walking plus visiting fits the time
+budget, is an orienteering problem (a travelling-salesman path with a
+budget). It is solved heuristically:
+
+1. pruning: candidates that cannot be reached and visited within the
+   budget are dropped, and only the MAX_CANDIDATES best by fit per minute
+   go on
+2. greedy construction: repeatedly insert the candidate with the best
+   fit per extra minute at its cheapest position, while it still fits
+3. improvement: 2-opt and Or-opt moves shorten the path, and each time the
+   path gets shorter the greedy insertion runs again on the freed time
+
+Steps 2-3 are repeated with a few greedy variants and the best route is
+kept. All insertion costs come from one vectorized haversine matrix, and
+everything after the first construction stops at a hard compute
+deadline, so planning time stays bounded as the candidate pool grows.
+"""
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+# Same pace /recommend uses for its "min walk" figures.
+WALK_M_PER_MIN = 80.0
+DEFAULT_DEADLINE = 0.05  # seconds
+# Candidates kept for the full distance matrix, best fit per minute first.
+MAX_CANDIDATES = 300
+# Construction is repeated with these exponents on the added-minutes term
+# of the greedy ratio (value / minutes ** alpha) while time allows.
+GREEDY_ALPHAS = (1.0, 0.5, 2.0)
+
+
+def haversine_matrix(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances in metres, shape (n, n)."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class Route:
+    """
+    A planned open path from the origin. `stops` are candidate indices in
+    visiting order and `walk_minutes[i]` is the walk into stops[i].
+    """
+
+    def __init__(self, stops: List[int], walk_minutes: List[float], visit_minutes: List[float],
+                 value: float, iterations: int, timed_out: bool):
+        self.stops = stops
+        self.walk_minutes = walk_minutes
+        self.visit_minutes = visit_minutes
+        self.value = value
+        self.iterations = iterations
+        self.timed_out = timed_out
+
+    @property
+    def total_minutes(self) -> float:
+        return sum(self.walk_minutes) + sum(self.visit_minutes)
+
+
+class _Planner:
+    # Node 0 is the origin; candidate i is node i + 1.
+
+    def __init__(self, travel: np.ndarray, value: np.ndarray, visit: np.ndarray, budget: float,
+                 max_stops: Optional[int], deadline: float, alpha: float = 1.0):
+        self.alpha = alpha
+        self.travel = travel
+        self.value = value
+        self.visit = visit
+        self.budget = budget
+        self.max_stops = max_stops
+        self.deadline = deadline
+        self.path = [0]
+        self.unvisited = np.ones(len(value), dtype=bool)
+        self.unvisited[0] = False
+        self.iterations = 0
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.deadline
+
+    def path_minutes(self, path: Sequence[int]) -> float:
+        p = np.asarray(path)
+        return float(self.travel[p[:-1], p[1:]].sum() + self.visit[p[1:]].sum())
+
+    def insert_greedy(self):
+        """Cheapest-insertion by fit per added minute, until nothing fits."""
+        t = self.travel
+        while self.max_stops is None or len(self.path) - 1 < self.max_stops:
+            cand = np.flatnonzero(self.unvisited)
+            if len(cand) == 0:
+                return
+            used = self.path_minutes(self.path)
+            p = np.asarray(self.path)
+            # Extra minutes for inserting each candidate after path[i]:
+            # between path[i] and path[i+1], or appended at the end.
+            extra = np.empty((len(p), len(cand)))
+            if len(p) > 1:
+                a, b = p[:-1], p[1:]
+                extra[:-1] = t[a][:, cand] + t[cand][:, b].T - t[a, b][:, None]
+            extra[-1] = t[p[-1], cand]
+            extra += self.visit[cand][None, :]
+            pos = extra.argmin(axis=0)
+            cost = extra[pos, np.arange(len(cand))]
+            feasible = used + cost <= self.budget + 1e-9
+            if not feasible.any():
+                return
+            ratio = np.where(feasible, self.value[cand] / np.maximum(cost, 1e-6) ** self.alpha, -np.inf)
+            j = int(ratio.argmax())
+            self.path.insert(int(pos[j]) + 1, int(cand[j]))
+            self.unvisited[cand[j]] = False
+            self.iterations += 1
+
+    def two_opt(self) -> bool:
+        """Reverses path segments while that shortens the walk. Returns True if anything improved."""
+        t = self.travel
+        improved = False
+        n = len(self.path)
+        i = 1
+        while i < n - 1 and not self.expired():
+            p = np.asarray(self.path)
+            # Reversing path[i..k]: edges (i-1, i) and (k, k+1) become
+            # (i-1, k) and (i, k+1); the open end has no k+1 edge.
+            ks = np.arange(i + 1, n)
+            nxt = np.append(p[ks[:-1] + 1], -1)
+            before = t[p[i - 1], p[i]] + np.where(nxt >= 0, t[p[ks], np.maximum(nxt, 0)], 0.0)
+            after = t[p[i - 1], p[ks]] + np.where(nxt >= 0, t[p[i], np.maximum(nxt, 0)], 0.0)
+            gain = before - after
+            best = int(gain.argmax())
+            self.iterations += 1
+            if gain[best] > 1e-9:
+                k = int(ks[best])
+                self.path[i:k + 1] = self.path[i:k + 1][::-1]
+                improved = True
+            else:
+                i += 1
+        return improved
+
+    def or_opt(self) -> bool:
+        """Moves single stops to their best position elsewhere in the path."""
+        improved = False
+        for i in range(1, len(self.path)):
+            if self.expired():
+                break
+            node = self.path[i]
+            rest = self.path[:i] + self.path[i + 1:]
+            current = self.path_minutes(self.path)
+            best, best_pos = current, None
+            for j in range(1, len(rest) + 1):
+                trial = rest[:j] + [node] + rest[j:]
+                m = self.path_minutes(trial)
+                if m < best - 1e-9:
+                    best, best_pos = m, j
+            self.iterations += 1
+            if best_pos is not None:
+                self.path = rest[:best_pos] + [node] + rest[best_pos:]
+                improved = True
+        return improved
+
+    def run(self):
+        self.insert_greedy()
+        while not self.expired():
+            shorter = self.two_opt()
+            shorter = self.or_opt() or shorter
+            if not shorter:
+                break
+            before = len(self.path)
+            self.insert_greedy()
+            if len(self.path) == before:
+                break
+
+
+def plan_route(origin_lat: float, origin_lon: float, lats: Sequence[float], lons: Sequence[float],
+               values: Sequence[float], visit_minutes: Sequence[float], budget_minutes: float,
+               max_stops: Optional[int] = None, deadline: float = DEFAULT_DEADLINE,
+               walk_m_per_min: float = WALK_M_PER_MIN, max_candidates: int = MAX_CANDIDATES) -> Route:
+    """
+    Plans an open walking route from the origin through a subset of the
+    candidates, maximizing summed `values` with walking plus visiting time
+    within `budget_minutes`. Candidates with a non-positive value are never
+    picked. `deadline` bounds the compute time in seconds; the first
+    construction pass always completes, everything after it is cut short.
+    """
+    start = time.perf_counter()
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    visit_minutes = np.asarray(visit_minutes, dtype=np.float64)
+    if len(values) == 0 or budget_minutes <= 0:
+        return Route([], [], [], 0.0, 0, False)
+
+    # --- Pruning (O(n), before the O(n^2) matrix) ---
+    reach = _distances_from(origin_lat, origin_lon, lats, lons) / walk_m_per_min + visit_minutes
+    keep = np.flatnonzero((values > 0) & (reach <= budget_minutes))
+    if len(keep) > max_candidates:
+        keep = keep[np.argsort(-values[keep] / reach[keep], kind="stable")[:max_candidates]]
+    if len(keep) == 0:
+        return Route([], [], [], 0.0, 0, False)
+
+    travel = haversine_matrix(np.append(origin_lat, lats[keep]), np.append(origin_lon, lons[keep])) / walk_m_per_min
+    value = np.append(0.0, values[keep])
+    visit = np.append(0.0, visit_minutes[keep])
+
+    best, iterations = None, 0
+    for alpha in GREEDY_ALPHAS:
+        planner = _Planner(travel, value, visit, budget_minutes, max_stops, start + deadline, alpha)
+        planner.run()
+        iterations += planner.iterations
+        score = (float(value[planner.path].sum()), -planner.path_minutes(planner.path))
+        if best is None or score > best[0]:
+            best = (score, planner.path)
+        if planner.expired():
+            break
+
+    path = best[1]
+    stops = [int(keep[node - 1]) for node in path[1:]]
+    walks = [float(travel[a, b]) for a, b in zip(path[:-1], path[1:])]
+    visits = [float(visit[node]) for node in path[1:]]
+    return Route(stops, walks, visits, float(value[path].sum()), iterations, time.perf_counter() >= start + deadline)
+
+
+def _distances_from(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres from one point to many."""
+    p1, p2 = np.radians(lat), np.radians(lats)
+    dl = np.radians(lons - lon)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,272 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend import metrics
+
+# --- Category Flags ---
+# Every rule only looks at a handful of substring / exact-membership tests on
+# a place's categories, so they are extracted once per candidate into a
+# boolean matrix and the rules run column-wise over the whole batch.
+SUBSTRING_FLAGS = ("park", "culture", "restaurant", "sport", "cafe", "coworking", "museum")
+# Exact category each ML label must appear as for the "AI suggests" bonus.
+ML_TYPE_CATEGORIES = {
+    "cafe": "catering.cafe",
+    "park": "leisure.park",
+    "museum": "entertainment.museum",
+    "restaurant": "catering.restaurant",
+}
+ML_TYPES = tuple(ML_TYPE_CATEGORIES)
+
+FLAG_COLUMNS = {name: i for i, name in enumerate(SUBSTRING_FLAGS + tuple(f"type_{t}" for t in ML_TYPES))}
+PARK, CULTURE, RESTAURANT = FLAG_COLUMNS["park"], FLAG_COLUMNS["culture"], FLAG_COLUMNS["restaurant"]
+MUST_TAKE_COLUMNS = [FLAG_COLUMNS[f] for f in ("sport", "park", "cafe", "coworking", "museum")]
+TYPE_COLUMNS = np.array([FLAG_COLUMNS[f"type_{t}"] for t in ML_TYPES])
+
+# --- Reasons ---
+# Ids are ordered the way the rules append them, so iterating set bits in
+# id order reproduces the original explanation order.
+R_ML, R_RAIN_OUTDOORS, R_INDOOR_SHELTER, R_CLEAR_OUTDOORS, R_WALLET, R_PREMIUM, R_FAR = range(7)
+NUM_REASONS = 7
+REASON_TEXT = {
+    R_RAIN_OUTDOORS: "Rain makes outdoors less ideal.",
+    R_INDOOR_SHELTER: "Great indoor shelter.",
+    R_CLEAR_OUTDOORS: "Perfect weather for outdoors.",
+    R_WALLET: "Wallet-friendly.",
+    R_PREMIUM: "Premium vibe.",
+    R_FAR: "A bit far for your time.",
+}
+
+BASE_SCORE = 70
+ML_BONUS = 5
+
+# Quest route planning: the places search already filters by the vibe's
+# categories, but a vibe asks for some of those more than others (a
+# "chill" search returns parks too, yet is mostly about cafes). Places
+# with any of the vibe's flags get VIBE_BONUS; the first matching keyword
+# wins, in the order get_categories_for_vibe checks them.
+VIBE_BONUS = 10
+VIBE_AFFINITY = (
+    (("active", "sport"), ("sport", "park")),
+    (("chill", "relax"), ("cafe",)),
+    (("culture", "art"), ("museum", "culture")),
+    (("night", "fun"), ("restaurant",)),
+    (("romantic",), ("restaurant",)),
+    (("work",), ("coworking", "cafe")),
+)
+# Rating fed to the model; places from Geoapify carry none.
+ML_RATING = 4.5
+MIN_SCORE, MAX_SCORE = 40, 99
+NO_REASON = -1
+
+
+def generate_must_take(weather: dict, vibe: str, place_categories: List[str]) -> List[str]:
+    items = set(["Smartphone", "Wallet"])
+    cond = weather["condition"]
+    temp = weather["temp"]
+
+    if "Rain" in cond or "Drizzle" in cond:
+        items.update(["Umbrella", "Rain Jacket"])
+    if "Clear" in cond or "Sun" in cond:
+        items.update(["Sunglasses", "Sunscreen"])
+    if temp < 10:
+        items.update(["Warm Coat", "Gloves"])
+    if temp > 25:
+        items.update(["Water Bottle", "Deodorant"])
+
+    v = vibe.lower()
+    cats = " ".join(place_categories)
+
+    if "active" in v or "sport" in cats or "park" in cats:
+        items.update(["Walking Shoes", "Towel"])
+    if "chill" in v or "cafe" in cats:
+        items.update(["Book/Kindle", "Headphones"])
+    if "work" in v or "coworking" in cats:
+        items.update(["Laptop", "Charger"])
+    if "romantic" in v:
+        items.update(["Mints"])
+    if "museum" in cats:
+        items.update(["Student ID"])
+
+    return list(items)
+
+
+def model_weather_class(condition: str) -> str:
+    """Maps an OpenWeather condition onto the classes the model was trained on."""
+    w = condition.lower()
+    if "rain" in w:
+        return "rainy"
+    if "clear" in w or "sun" in w:
+        return "sunny"
+    return "cloudy"
+
+
+def extract_flags(places: List[dict]) -> np.ndarray:
+    """Builds the (n_places, n_flags) boolean category matrix in one pass."""
+    flags = np.zeros((len(places), len(FLAG_COLUMNS)), dtype=bool)
+    for i, p in enumerate(places):
+        cats = p["categories"]
+        # Categories never contain spaces, so a substring test on the joined
+        # string is equivalent to any(sub in c for c in cats).
+        joined = " ".join(cats)
+        row = flags[i]
+        for j, sub in enumerate(SUBSTRING_FLAGS):
+            row[j] = sub in joined
+        for t, cat in ML_TYPE_CATEGORIES.items():
+            row[FLAG_COLUMNS[f"type_{t}"]] = cat in cats
+    return flags
+
+
+# --- Rule Tables ---
+
+def compile_rules(condition: str, budget: Optional[str]) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Compiles the weather and budget rules for one request into
+    (flag column, delta[flag], reason[flag]) tables.
+    """
+    rules = []
+    if any(x in condition for x in ["Rain", "Snow"]):
+        rules.append((PARK, np.array([20, -30]), np.array([R_INDOOR_SHELTER, R_RAIN_OUTDOORS])))
+    elif condition == "Clear":
+        rules.append((PARK, np.array([0, 25]), np.array([NO_REASON, R_CLEAR_OUTDOORS])))
+
+    if budget == "free":
+        rules.append((-1, np.array([0, 20]), np.array([NO_REASON, R_WALLET])))
+    elif budget == "premium":
+        rules.append((RESTAURANT, np.array([0, 15]), np.array([NO_REASON, R_PREMIUM])))
+    return rules
+
+
+def vibe_columns(vibe: str) -> List[int]:
+    """Flag columns the vibe favours (see VIBE_AFFINITY); empty for an unknown vibe."""
+    v = vibe.lower()
+    for keywords, flags in VIBE_AFFINITY:
+        if any(k in v for k in keywords):
+            return [FLAG_COLUMNS[f] for f in flags]
+    return []
+
+
+def fit_scores(places: List[dict], condition: str, budget: Optional[str],
+               vibe: Optional[str] = None) -> np.ndarray:
+    """
+    Weather, budget and (optionally) vibe fit of each place on the
+    /recommend scale, without the ML bonus or the distance penalty (route
+    planning accounts for distance itself).
+    """
+    flags = extract_flags(places)
+    score = np.full(len(places), BASE_SCORE, dtype=np.int64)
+    for column, delta, _ in compile_rules(condition, budget):
+        flag = (flags[:, PARK] | flags[:, CULTURE]) if column == -1 else flags[:, column]
+        score += delta[flag.astype(np.intp)]
+    columns = vibe_columns(vibe) if vibe else []
+    if columns:
+        score += VIBE_BONUS * flags[:, columns].any(axis=1)
+    return np.clip(score, MIN_SCORE, MAX_SCORE)
+
+
+class ScoredBatch:
+    """Result of scoring one candidate batch. Only the top-k picks are materialized."""
+
+    def __init__(self, picks: List[dict], ml_matches: List[str], ml_match_distances: Optional[List[float]] = None):
+        self.picks = picks
+        self.ml_matches = ml_matches
+        # Distance feature (hundreds of metres) the prediction for each match was made with.
+        self.ml_match_distances = ml_match_distances or []
+
+
+def predict_types(model_weather: str, time_avail: int, distances: np.ndarray,
+                  predict: Callable[..., Optional[np.ndarray]]) -> np.ndarray:
+    """Returns an index into ML_TYPES per candidate, or -1 when there is no prediction."""
+    labels = predict(model_weather, time_avail, distances / 100, ML_RATING)
+    if labels is None:
+        return np.full(len(distances), -1, dtype=np.int64)
+    lookup = {t: i for i, t in enumerate(ML_TYPES)}
+    return np.array([lookup.get(label, -1) for label in labels], dtype=np.int64)
+
+
+def score_places(places: List[dict], weather: dict, preference: str, budget: Optional[str],
+                 time_avail: int, predict: Callable[..., Optional[np.ndarray]],
+                 k: int = 6) -> ScoredBatch:
+    """
+    Scores every candidate with NumPy and returns the k best, in the same
+    order a stable descending sort of the per-place rules would give.
+    `predict` is a batch predictor with the signature of
+    ml_utils.predict_preferred_types.
+    """
+    n = len(places)
+    if n == 0:
+        return ScoredBatch([], [])
+
+    flags = extract_flags(places)
+    distances = np.array([p["distance"] for p in places], dtype=np.float64)
+    rows = np.arange(n)
+    score = np.full(n, BASE_SCORE, dtype=np.int64)
+    reasons = np.zeros((n, NUM_REASONS), dtype=bool)
+
+    # --- ML Prediction Scoring ---
+    try:
+        with metrics.time_stage("ml_predict"):
+            predicted = predict_types(model_weather_class(weather["condition"]), time_avail, distances, predict)
+    except Exception as e:
+        print(f"ML Scoring Error: {e}")
+        predicted = np.full(n, -1, dtype=np.int64)
+    has_prediction = predicted >= 0
+    ml_match = has_prediction & flags[rows, TYPE_COLUMNS[np.where(has_prediction, predicted, 0)]]
+    score += ML_BONUS * ml_match
+    reasons[:, R_ML] = ml_match
+
+    # --- Weather / Budget ---
+    for column, delta, reason in compile_rules(weather["condition"], budget):
+        flag = (flags[:, PARK] | flags[:, CULTURE]) if column == -1 else flags[:, column]
+        idx = flag.astype(np.intp)
+        score += delta[idx]
+        rid = reason[idx]
+        hit = rid != NO_REASON
+        reasons[rows[hit], rid[hit]] = True
+
+    # --- Time/Distance ---
+    if time_avail < 45:
+        far = distances > 3000
+        score -= 15 * far
+        reasons[:, R_FAR] = far
+
+    np.clip(score, MIN_SCORE, MAX_SCORE, out=score)
+
+    # --- Top-k ---
+    # Ties keep input order (like a stable sort), so rank on score first and
+    # original position second.
+    key = score * n + (n - 1 - rows)
+    k = min(k, n)
+    top = np.argpartition(-key, k - 1)[:k] if k < n else rows
+    top = top[np.argsort(-key[top])]
+
+    weather_summary = f"{weather['condition']}, {int(weather['temp'])}°C"
+    must_take_memo: Dict[tuple, List[str]] = {}
+    picks = []
+    for i in top:
+        p = places[i]
+        explanation = []
+        for r in np.flatnonzero(reasons[i]):
+            if r == R_ML:
+                explanation.append(f"AI suggests {ML_TYPES[predicted[i]]}s right now.")
+            else:
+                explanation.append(REASON_TEXT[r])
+        if not explanation:
+            explanation.append(f"Matches your {preference} vibe.")
+
+        signature = tuple(flags[i, MUST_TAKE_COLUMNS])
+        if signature not in must_take_memo:
+            must_take_memo[signature] = generate_must_take(weather, preference, p["categories"])
+
+        picks.append({
+            "name": p["name"],
+            "distance": p["distance"],
+            "categories": p["categories"],
+            "score": int(score[i]),
+            "reason": explanation,
+            "must_take": must_take_memo[signature],
+            "weather_summary": weather_summary
+        })
+
+    ml_matches = [ML_TYPES[t] for t in predicted[ml_match]]
+    return ScoredBatch(picks, ml_matches, (distances[ml_match] / 100).tolist())
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_CALLS = metrics.counter(
+    "pocketplan_singleflight_calls_total",
+    "Keyed upstream lookups by role: 'leader' ran the call, 'coalesced' joined one already in flight.",
+    ["name", "role"],
+)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one.
+
+    The first caller for a key starts `fn()` as its own task; callers that
+    arrive while it is running await that same task. Every caller awaits it
+    through asyncio.shield, so a caller being cancelled (client disconnect,
+    deadline) only abandons its own wait and the shared call keeps running
+    for everyone else. The key is forgotten as soon as the call finishes, so
+    results are not cached here; callers store them wherever they normally
+    would, inside `fn`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._leader = SINGLEFLIGHT_CALLS.labels(name, "leader")
+        self._coalesced = SINGLEFLIGHT_CALLS.labels(name, "coalesced")
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when every waiter has gone away,
+        # so asyncio does not log it as unhandled.
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"{self.name} call for {key} failed: {task.exception()}")
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.leaders += 1
+            self._leader.inc()
+        else:
+            self.coalesced += 1
+            self._coalesced.inc()
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("POCKETPLAN_DB_PATH", os.path.join(BASE_DIR, "pocketplan.db"))
+LEGACY_DATA_FILE = os.getenv("POCKETPLAN_LEGACY_DATA", "data.json")
+
+# Write-behind batching for history inserts.
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+
+# Several worker processes write to the same file. A write that still finds
+# the database locked after the busy timeout is retried this many times.
+STORE_BUSY_RETRIES = int(os.getenv("STORE_BUSY_RETRIES", "3"))
+
+# Rows fetched per round trip when streaming exports.
+EXPORT_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    location TEXT NOT NULL,
+    vibe TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_location ON history (location COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_history_vibe ON history (vibe COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_history_date ON history (date);
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    location TEXT NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_favorites_location ON favorites (location COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+T = TypeVar("T")
+
+
+class Store:
+    """
+    SQLite (WAL mode) storage for favorites and search history.
+
+    Favorites are written synchronously since the caller waits for "Saved".
+    History rows go through a bounded queue and are inserted in batches by
+    a writer thread, so recording a search never blocks a request.
+
+    Every worker process opens the same file. Each write is one short
+    transaction, SQLite serializes them across processes, and the favorites
+    UNIQUE constraint makes concurrent saves of one name idempotent.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self.dropped_history = 0
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread, SQLite connections are not thread safe."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Runs `fn(conn)` in a transaction, retrying with backoff while another
+        process holds the write lock past the busy timeout.
+        """
+        for attempt in range(STORE_BUSY_RETRIES + 1):
+            conn = self._conn()
+            try:
+                with conn:
+                    return fn(conn)
+            except sqlite3.OperationalError as e:
+                busy = "locked" in str(e) or "busy" in str(e)
+                if not busy or attempt == STORE_BUSY_RETRIES:
+                    raise
+                logger.warning(f"Database busy, retrying write ({attempt + 1}/{STORE_BUSY_RETRIES}).")
+                time.sleep(0.05 * 2 ** attempt)
+
+    # --- Migration ---
+
+    def migrate_from_json(self, data_file: str = LEGACY_DATA_FILE) -> bool:
+        """
+        One-shot import of the legacy data.json file. Records completion in
+        the meta table so later startups (and other workers) skip it.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done is not None or not os.path.exists(data_file):
+                return False
+            try:
+                with open(data_file, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                # Leave the flag unset so a fixed file is picked up next start.
+                logger.error(f"Could not migrate {data_file}: {e}")
+                return False
+
+            conn.executemany(
+                "INSERT INTO history (location, vibe, date) VALUES (?, ?, ?)",
+                [(h.get("location", ""), h.get("vibe", ""), h.get("date", ""))
+                 for h in data.get("history", []) if isinstance(h, dict)],
+            )
+            favorites = [_legacy_favorite(f) for f in data.get("favorites", [])]
+            conn.executemany(
+                "INSERT OR IGNORE INTO favorites (name, location, score) VALUES (?, ?, ?)",
+                [f for f in favorites if f is not None],
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (data_file,))
+        logger.info(f"Migrated {data_file} into {self.path}")
+        return True
+
+    # --- Favorites ---
+
+    def add_favorite(self, name: str, location: str, score: int) -> bool:
+        """Inserts a favorite unless one with the same name exists. Returns True if added."""
+        cur = self._write(lambda conn: conn.execute(
+            "INSERT OR IGNORE INTO favorites (name, location, score) VALUES (?, ?, ?)",
+            (name, location, score),
+        ))
+        return cur.rowcount > 0
+
+    def page_favorites(self, limit: int, cursor: Optional[int] = None, location: Optional[str] = None,
+                       descending: bool = False) -> Tuple[List[dict], Optional[int]]:
+        sql, params = _build_query("favorites", "name, location, score", cursor, descending,
+                                   location=location)
+        return _fetch_page(self._conn(), sql, params, limit)
+
+    def iter_favorites(self, location: Optional[str] = None, descending: bool = False) -> Iterator[dict]:
+        sql, params = _build_query("favorites", "name, location, score", None, descending,
+                                   location=location)
+        return self._stream(sql, params)
+
+    # --- History ---
+
+    def record_history(self, location: str, vibe: str, date: str):
+        """Queues a history row for the write-behind batcher. Never blocks."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((location.strip(), vibe.strip(), date))
+        except queue.Full:
+            self.dropped_history += 1
+            logger.warning("History queue full, dropping entry.")
+
+    def page_history(self, limit: int, cursor: Optional[int] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, location: Optional[str] = None,
+                     vibe: Optional[str] = None, descending: bool = False) -> Tuple[List[dict], Optional[int]]:
+        """
+        Keyset-paginated history. Returns (rows, next_cursor), where
+        next_cursor is None on the last page.
+        """
+        sql, params = _build_query("history", "location, vibe, date", cursor, descending,
+                                   since=since, until=until, location=location, vibe=vibe)
+        return _fetch_page(self._conn(), sql, params, limit)
+
+    def iter_history(self, since: Optional[str] = None, until: Optional[str] = None,
+                     location: Optional[str] = None, vibe: Optional[str] = None,
+                     descending: bool = False) -> Iterator[dict]:
+        """Streams every matching history row without materializing the result set."""
+        sql, params = _build_query("history", "location, vibe, date", None, descending,
+                                   since=since, until=until, location=location, vibe=vibe)
+        return self._stream(sql, params)
+
+    def _stream(self, sql: str, params: list) -> Iterator[dict]:
+        # Streaming generators may be resumed from different threads, so they
+        # get a private connection instead of the thread-local one.
+        conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                for r in rows:
+                    row = dict(r)
+                    row.pop("id", None)
+                    yield row
+        finally:
+            conn.close()
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=HISTORY_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= HISTORY_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get(timeout=HISTORY_FLUSH_INTERVAL)
+                except queue.Empty:
+                    break
+            else:
+                stop = True
+            if batch:
+                self._insert_history(batch)
+
+    def _insert_history(self, batch: List[tuple]):
+        try:
+            with metrics.HISTORY_FLUSH_SECONDS.labels().time():
+                self._write(lambda conn: conn.executemany(
+                    "INSERT INTO history (location, vibe, date) VALUES (?, ?, ?)", batch))
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(batch)} history rows: {e}")
+
+    def flush(self):
+        """Stops the writer after it has drained everything queued so far."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _legacy_favorite(entry) -> Optional[Tuple[str, str, int]]:
+    """A data.json favorite as a row, or None (with a warning) if it is unusable."""
+    try:
+        score = entry.get("score")
+        score = int(float(score)) if score not in (None, "") else 0
+        return str(entry["name"]), str(entry.get("location") or ""), score
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+        logger.warning(f"Skipping malformed legacy favorite: {entry!r}")
+        return None
+
+
+def _build_query(table: str, columns: str, cursor: Optional[int], descending: bool,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 location: Optional[str] = None, vibe: Optional[str] = None) -> Tuple[str, list]:
+    clauses, params = [], []
+    if cursor is not None:
+        clauses.append("id < ?" if descending else "id > ?")
+        params.append(cursor)
+    if since:
+        clauses.append("date >= ?")
+        params.append(since)
+    if until:
+        clauses.append("date < ?")
+        params.append(until)
+    if location:
+        clauses.append("location = ? COLLATE NOCASE")
+        params.append(location.strip())
+    if vibe:
+        clauses.append("vibe = ? COLLATE NOCASE")
+        params.append(vibe.strip())
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "DESC" if descending else "ASC"
+    return f"SELECT id, {columns} FROM {table}{where} ORDER BY id {order}", params
+
+
+def _fetch_page(conn: sqlite3.Connection, sql: str, params: list, limit: int) -> Tuple[List[dict], Optional[int]]:
+    # Fetch one extra row to know whether another page exists.
+    rows = conn.execute(f"{sql} LIMIT ?", params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1]["id"] if has_more and rows else None
+    items = []
+    for r in rows:
+        item = dict(r)
+        item.pop("id")
+        items.append(item)
+    return items, next_cursor
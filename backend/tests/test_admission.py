@@ -0,0 +1,16 @@
+from backend.admission import SharedTokenBucket
+
+
+def test_shared_bucket_is_one_budget_across_instances(tmp_path):
+    # Two instances on one file stand in for two worker processes.
+    path = str(tmp_path / "budget.db")
+    first = SharedTokenBucket("geoapify", rate=0.001, burst=3, path=path)
+    second = SharedTokenBucket("geoapify", rate=0.001, burst=3, path=path)
+    try:
+        granted = [bucket.try_acquire() for bucket in (first, second, first, second, first)]
+    finally:
+        first.close()
+        second.close()
+    assert granted == [True, True, True, False, False]
+    assert first.rejected + second.rejected == 2
+    assert first.errors == second.errors == 0
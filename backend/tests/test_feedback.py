@@ -0,0 +1,127 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from backend import feedback, ml_utils, model_artifact, response_cache
+
+
+@pytest.fixture
+def served_model(monkeypatch, tmp_path):
+    """The shipped offline model as the served one, with online versions published under tmp_path."""
+    monkeypatch.setattr(ml_utils, "_predictor", None)
+    monkeypatch.setattr(ml_utils, "_model_version", None)
+    monkeypatch.setattr(model_artifact, "ONLINE_ARTIFACT_PATH", str(tmp_path / "model_online.bin"))
+    assert ml_utils.load_artifact(model_artifact.ARTIFACT_PATH)
+    return ml_utils.current_predictor()
+
+
+def chosen_rows(n):
+    return [(time.time(), "chosen", "sunny", 60, 5.0, 4.5, "park") for _ in range(n)]
+
+
+def test_sink_drops_events_beyond_its_size():
+    sink = feedback.FeedbackSink(maxsize=2)
+    assert sink.record("chosen", "sunny", 30, 2.0, 4.5, "park")
+    assert sink.record("predicted", "rainy", 60, 8.0, 4.5, "cafe")
+    assert not sink.record("chosen", "cloudy", 90, 1.0, 4.5, "museum")
+
+    assert (sink.queued, sink.dropped) == (2, 1)
+    rows = sink.drain()
+    assert [(r[1], r[2], r[6]) for r in rows] == [("chosen", "sunny", "park"), ("predicted", "rainy", "cafe")]
+    assert len(sink) == 0
+
+
+def test_writer_rotation_keeps_the_newest_files(tmp_path):
+    # Every file is past rotate_bytes after its header, so each write starts a new one.
+    writer = feedback.FeedbackWriter(str(tmp_path), rotate_bytes=1, keep_files=3)
+    for i in range(5):
+        writer.write(chosen_rows(2))
+        # Distinct mtimes, so "oldest" is well defined.
+        os.utime(writer.path, (time.time() - 100 + i, time.time() - 100 + i))
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 3
+    assert os.path.basename(writer.path) in files
+    assert [f.rsplit("-", 1)[1] for f in files] == ["3.csv", "4.csv", "5.csv"]
+    assert writer.written == 10
+
+
+def test_publish_rejects_a_model_no_better_than_the_served_one(served_model, tmp_path):
+    pipeline = feedback.FeedbackPipeline(feedback.FeedbackSink(), feedback.FeedbackWriter(str(tmp_path)))
+    pipeline.learner = feedback.OnlineLearner(served_model)
+    pipeline.learner.observe(chosen_rows(20), served_model)
+    pipeline.learner.correct, pipeline.learner.served_correct = 3, 4
+    version = ml_utils.model_version()
+
+    asyncio.run(pipeline.publish())
+
+    assert pipeline.published == 0
+    assert ml_utils.model_version() == version
+    assert not os.path.exists(model_artifact.ONLINE_ARTIFACT_PATH)
+    assert pipeline.learner.pending == 0
+
+
+def test_publish_hot_swaps_the_served_model(served_model, tmp_path):
+    pipeline = feedback.FeedbackPipeline(feedback.FeedbackSink(), feedback.FeedbackWriter(str(tmp_path)))
+    pipeline.learner = feedback.OnlineLearner(served_model)
+    pipeline.learner.observe(chosen_rows(20), served_model)
+    pipeline.learner.correct, pipeline.learner.served_correct = 4, 4
+    offline_version = ml_utils.model_version()
+    response_cache.responses.set("stale", b"[]", time.time() + 60)
+
+    asyncio.run(pipeline.publish())
+
+    assert pipeline.published == 1
+    header, _ = model_artifact.read_header(model_artifact.ONLINE_ARTIFACT_PATH)
+    assert ml_utils.model_version() == header["model_version"] != offline_version
+    assert ml_utils.current_predictor() is not served_model
+    assert pipeline.learner.base_version == header["model_version"]
+    # Cached /recommend bodies carry the old model's reasons.
+    assert response_cache.responses.get("stale") is None
+
+
+@pytest.mark.skipif(feedback.fcntl is None, reason="no flock on this platform")
+def test_only_the_learner_lock_holder_trains(served_model, tmp_path):
+    lock_path = str(tmp_path / "learner.lock")
+    leader = feedback.FeedbackPipeline(feedback.FeedbackSink(), feedback.FeedbackWriter(str(tmp_path)),
+                                       online=True, lock=feedback.LearnerLock(lock_path))
+    follower = feedback.FeedbackPipeline(feedback.FeedbackSink(), feedback.FeedbackWriter(str(tmp_path)),
+                                         online=True, lock=feedback.LearnerLock(lock_path))
+    assert leader.lock.try_acquire()
+    for pipeline in (leader, follower):
+        for _ in range(5):
+            pipeline.sink.record("chosen", "sunny", 60, 5.0, 4.5, "park")
+        asyncio.run(pipeline.flush())
+
+    assert leader.learner is not None and leader.learner.samples == 5
+    assert follower.learner is None
+    assert not follower.lock.held
+    # The follower still writes its events for the leader to pick up.
+    assert follower.writer.written == 5
+    assert (leader.stats()["learner_worker"], follower.stats()["learner_worker"]) == (True, False)
+
+
+def test_tail_reads_whole_rows_other_workers_appended(tmp_path):
+    header = ",".join(feedback.COLUMNS) + "\n"
+    other = tmp_path / "feedback-20260101-000000-99999-1.csv"
+    own = tmp_path / f"feedback-20260101-000000-{os.getpid()}-1.csv"
+    other.write_text(header + "1.0,chosen,sunny,60,5.0,4.5,park\n")
+    own.write_text(header)
+    tail = feedback.FeedbackTail(str(tmp_path))
+
+    # The first read only notes where the files end: earlier rows belong to an earlier learner.
+    assert tail.read() == []
+
+    with open(other, "a") as f:
+        f.write("2.0,chosen,rainy,30,8.0,4.5,cafe\n3.0,chosen,clou")
+    with open(own, "a") as f:
+        f.write("2.5,chosen,sunny,60,5.0,4.5,park\n")
+    assert tail.read() == [(2.0, "chosen", "rainy", 30, 8.0, 4.5, "cafe")]
+
+    # The half-written row is read once it is complete.
+    with open(other, "a") as f:
+        f.write("dy,90,1.0,4.5,museum\n")
+    assert tail.read() == [(3.0, "chosen", "cloudy", 90, 1.0, 4.5, "museum")]
+    assert tail.read() == []
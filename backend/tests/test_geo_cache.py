@@ -0,0 +1,37 @@
+import asyncio
+
+from backend.geo_cache import SharedTileStore, TileCache
+
+
+def test_shared_tier_hit_keeps_the_original_fetch_time(tmp_path):
+    store = SharedTileStore(str(tmp_path / "tiles.db"))
+    first = TileCache("weather", ttl=60, max_stale=60, max_entries=10, shared=store)
+    second = TileCache("weather", ttl=60, max_stale=60, max_entries=10, shared=store)
+
+    async def fetch():
+        return {"condition": "Rain", "temp": 12}
+
+    async def unreachable():
+        raise AssertionError("the second worker must not fetch")
+
+    async def run():
+        await first.get_or_load("u33dc", fetch)
+        return await second.get_or_load("u33dc", unreachable)
+
+    try:
+        assert asyncio.run(run()) == {"condition": "Rain", "temp": 12}
+    finally:
+        store.close()
+    assert (second.shared_hits, second.misses) == (1, 0)
+    # Freshness is judged from when the first worker fetched, not when the second read it.
+    assert second.fresh_until("u33dc") == first.fresh_until("u33dc")
+
+
+def test_older_fetch_does_not_replace_a_newer_shared_entry(tmp_path):
+    store = SharedTileStore(str(tmp_path / "tiles.db"))
+    try:
+        store.set("places", "k", ["new"], stored_at=200.0, expires_at=10 ** 10)
+        store.set("places", "k", ["old"], stored_at=100.0, expires_at=10 ** 10)
+        assert store.get("places", "k") == (["new"], 200.0)
+    finally:
+        store.close()
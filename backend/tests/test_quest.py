@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, response_cache
+from backend.quest_orchestrator import QuestOrchestrator
+
+PLACES = [
+    {"name": "Corner Cafe", "lat": 52.5205, "lon": 13.4050, "categories": ["catering.cafe"]},
+    {"name": "Little Park", "lat": 52.5215, "lon": 13.4060, "categories": ["leisure.park"]},
+    {"name": "Old Books", "lat": 52.5195, "lon": 13.4040, "categories": ["commercial.books"]},
+]
+
+
+def context(lat=52.5160, lon=13.4050, **overrides):
+    body = {"user_id": "u1", "location": {"lat": lat, "lon": lon}, "time_available": 90,
+            "weather_condition": "Clear", "vibe_preference": "Chill", "budget_tier": "Free"}
+    body.update(overrides)
+    return body
+
+
+@pytest.fixture
+def quests(monkeypatch):
+    """(client, provider calls, provider places): quests from a fake places provider, with an empty quest cache."""
+    calls = []
+    places = list(PLACES)
+
+    async def provider(ctx):
+        calls.append(ctx.location)
+        return list(places)
+
+    monkeypatch.setattr(main, "quest_orchestrator", QuestOrchestrator(candidate_provider=provider))
+    monkeypatch.setattr(response_cache, "quests", response_cache.ResponseCache(100, 60))
+    # No lifespan: the quest routes need neither the store nor the HTTP client.
+    return TestClient(main.app), calls, places
+
+
+def test_quest_is_cached_per_cell_with_a_fresh_id_per_response(quests):
+    client, calls, _ = quests
+    first = client.post("/quest", json=context()).json()
+    # ~300 m away, same precision-6 cell.
+    second = client.post("/quest", json=context(lat=52.5190)).json()
+
+    assert first["quest"]["steps"]
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["quest"]["steps"] == first["quest"]["steps"]
+    assert second["quest"]["quest_id"] != first["quest"]["quest_id"]
+    # Both were planned from the cell's centre, not the first caller's position.
+    assert len(calls) == 1
+    assert (calls[0]["lat"], calls[0]["lon"]) == response_cache.quest_tile_centre(52.5160, 13.4050)
+
+
+def test_quest_without_places_is_empty_and_not_cached(quests):
+    client, calls, places = quests
+    places.clear()
+    first = client.post("/quest", json=context()).json()
+    second = client.post("/quest", json=context()).json()
+
+    assert first["quest"]["steps"] == []
+    assert not second["cached"]
+    assert len(calls) == 2
+
+
+def test_quest_batch_generates_each_cell_once(quests):
+    client, calls, _ = quests
+    bad = context()
+    bad["location"] = {"lat": 52.52}
+    response = client.post("/quest/batch", json={"items": [context(), context(lat=52.5190), bad]})
+
+    assert response.status_code == 200
+    items = response.json()
+    assert [i["status"] for i in items] == [200, 200, 422]
+    assert items[0]["quest"]["steps"] == items[1]["quest"]["steps"]
+    assert items[0]["quest"]["quest_id"] != items[1]["quest"]["quest_id"]
+    assert len(calls) == 1
+
+
+def test_quest_batch_rejects_too_many_items(quests, monkeypatch):
+    client, _, _ = quests
+    monkeypatch.setattr(main, "BATCH_MAX_ITEMS", 1)
+    assert client.post("/quest/batch", json={"items": [context(), context()]}).status_code == 413
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from backend import storage
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.time, "sleep", lambda s: None)
+    s = storage.Store(str(tmp_path / "pocketplan.db"))
+    yield s
+    s.close()
+
+
+def test_write_retries_while_the_database_is_busy(store):
+    attempts = []
+
+    def insert(conn):
+        attempts.append(1)
+        conn.execute("INSERT INTO favorites (name, location, score) VALUES (?, ?, ?)", (f"try {len(attempts)}", "", 1))
+        if len(attempts) < storage.STORE_BUSY_RETRIES:
+            raise sqlite3.OperationalError("database is locked")
+
+    store._write(insert)
+
+    assert len(attempts) == storage.STORE_BUSY_RETRIES
+    # Failed attempts were rolled back: only the last insert landed.
+    names = [f["name"] for f in store.page_favorites(10)[0]]
+    assert names == [f"try {storage.STORE_BUSY_RETRIES}"]
+
+
+def test_write_gives_up_after_the_retries(store):
+    def always_busy(conn):
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        store._write(always_busy)
+
+
+def test_write_does_not_retry_other_errors(store):
+    attempts = []
+
+    def broken(conn):
+        attempts.append(1)
+        raise sqlite3.OperationalError("no such table: nope")
+
+    with pytest.raises(sqlite3.OperationalError):
+        store._write(broken)
+    assert len(attempts) == 1
@@ -0,0 +1,35 @@
+import os
+import csv
+
+import pandas as pd
+
+from backend import train_model
+from backend.feedback import COLUMNS
+
+
+def test_scan_skips_feedback_chunk_without_chosen_rows(tmp_path):
+    # A feedback file of only "predicted" rows yields an empty first chunk.
+    feedback = tmp_path / "feedback.csv"
+    with open(feedback, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(5):
+            writer.writerow([1700000000 + i, "predicted", "sunny", 60, 500.0, 4.5, "park"])
+
+    training = tmp_path / "training.csv"
+    pd.DataFrame({
+        "weather": ["sunny", "rainy", "cloudy", "sunny"],
+        "time_available": [30, 60, 120, 60],
+        "distance": [200.0, 1500.0, 800.0, 3000.0],
+        "rating": [4.5, 4.0, 3.5, 5.0],
+        "preferred_type": ["park", "cafe", "museum", "park"],
+    }).to_csv(training, index=False)
+
+    cache_dir = tmp_path / "cache"
+    os.makedirs(cache_dir)
+    stats = train_model.scan([str(feedback), str(training)], chunk_rows=5, seed=0, cache_dir=str(cache_dir))
+
+    assert stats["rows"] == 4
+    assert stats["weather_classes"] == ["cloudy", "rainy", "sunny"]
+    assert stats["labels"] == ["cafe", "museum", "park"]
+    assert len(stats["sample"]) == 4
@@ -4,6 +4,22 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder
 import joblib
 import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import SGDClassifier
+
+try:
+    from backend import model_artifact, decision_table
+except ImportError:  # Run as `python train_model.py` from inside backend/
+    import model_artifact
+    import decision_table
 
 # Define paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +27,21 @@ DATA_PATH = os.path.join(BASE_DIR, 'training_data.csv')
 MODEL_PATH = os.path.join(BASE_DIR, 'model.pkl')
 WEATHER_ENCODER_PATH = os.path.join(BASE_DIR, 'weather_encoder.pkl')
 TARGET_ENCODER_PATH = os.path.join(BASE_DIR, 'target_encoder.pkl')
+FEATURES = ['weather_encoded', 'time_available', 'distance', 'rating']
+
+# Random points checked against the compiled decision table, on top of the training set.
+TABLE_CHECK_SAMPLES = 100000
+TABLE_CHECK_MAX_DISTANCE = 100.0
+
+# --- Streaming mode ---
+RAW_COLUMNS = ['weather', 'time_available', 'distance', 'rating', 'preferred_type']
+CHUNK_ROWS = 100000
+# Rows kept (reservoir-sampled) to compile and check the decision table.
+TABLE_SAMPLE_ROWS = 100000
+# Search space: SGD losses (model families that stay linear, so they export
+# to the same artifact) crossed with regularization strengths.
+SEARCH_LOSSES = ['log_loss', 'modified_huber', 'hinge']
+SEARCH_ALPHAS = [1e-5, 1e-4, 1e-3]
 
 def train_model():
     print("Loading data...")
@@ -30,7 +61,7 @@ def train_model():
     df['target_encoded'] = target_encoder.fit_transform(df['preferred_type'])
 
     # Features and Target
-    X = df[['weather_encoded', 'time_available', 'distance', 'rating']]
+    X = df[FEATURES]
     y = df['target_encoded']
 
     # Split Data
@@ -51,7 +82,322 @@ def train_model():
     joblib.dump(model, MODEL_PATH)
     joblib.dump(weather_encoder, WEATHER_ENCODER_PATH)
     joblib.dump(target_encoder, TARGET_ENCODER_PATH)
+    export_artifact(model, weather_encoder, target_encoder, df)
     print(f"Saved to {BASE_DIR}")
 
+def build_decision_table(model, weather_encoder, df):
+    """
+    Compiles the model into a (weather, time, rating) -> distance-breakpoint
+    table and checks it against model.predict on the training set and on a
+    random sample. Raises if they disagree anywhere.
+    """
+    times = set(decision_table.SERVING_TIMES) | set(df['time_available'].astype(float))
+    ratings = set(decision_table.SERVING_RATINGS) | set(df['rating'].astype(float))
+    arrays = decision_table.compile_table(model.coef_, model.intercept_, len(weather_encoder.classes_), times, ratings)
+    table = decision_table.DecisionTable.from_arrays(arrays)
+
+    def predict_idx(X):
+        return np.searchsorted(model.classes_, model.predict(pd.DataFrame(X, columns=FEATURES)))
+
+    train_X = df[FEATURES].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(42)
+    sample_X = np.column_stack([
+        rng.integers(0, len(weather_encoder.classes_), TABLE_CHECK_SAMPLES),
+        rng.choice(arrays['table_times'], TABLE_CHECK_SAMPLES),
+        rng.uniform(0, TABLE_CHECK_MAX_DISTANCE, TABLE_CHECK_SAMPLES),
+        rng.choice(arrays['table_ratings'], TABLE_CHECK_SAMPLES),
+    ]).astype(np.float64)
+
+    for name, X in (("training set", train_X), ("random sample", sample_X)):
+        mismatches = decision_table.verify_table(table, predict_idx, X)
+        print(f"Decision table vs model on {name}: {len(X) - mismatches}/{len(X)} agree")
+        if mismatches:
+            raise RuntimeError(f"Decision table disagrees with the model on {mismatches} {name} rows")
+
+    print(f"Compiled decision table with {len(arrays['table_breakpoints'])} cells")
+    return arrays
+
+def export_artifact(model, weather_encoder, target_encoder, df=None, path=model_artifact.ARTIFACT_PATH):
+    """
+    Writes the compact serving artifact: coefficients, intercepts, label
+    vocabularies and (when training data is given) the compiled decision
+    table, loadable with numpy alone.
+    """
+    metadata = {
+        "model_type": type(model).__name__,
+        "features": FEATURES,
+        "weather_classes": [str(w) for w in weather_encoder.classes_],
+        # Column order of coef/intercept follows model.classes_.
+        "labels": [str(l) for l in target_encoder.inverse_transform(model.classes_)],
+    }
+    arrays = {
+        "coef": np.asarray(model.coef_, dtype=np.float64),
+        "intercept": np.asarray(model.intercept_, dtype=np.float64),
+    }
+    if df is not None:
+        arrays.update(build_decision_table(model, weather_encoder, df))
+    header = model_artifact.write_artifact(path, arrays, metadata)
+    print(f"Exported artifact {header['model_version']} to {path}")
+    return header
+
+def export_existing():
+    """Converts the current pickles into the serving artifact without retraining."""
+    model = joblib.load(MODEL_PATH)
+    weather_encoder = joblib.load(WEATHER_ENCODER_PATH)
+    target_encoder = joblib.load(TARGET_ENCODER_PATH)
+    df = None
+    if os.path.exists(DATA_PATH):
+        df = pd.read_csv(DATA_PATH)
+        df['weather_encoded'] = weather_encoder.transform(df['weather'])
+    return export_artifact(model, weather_encoder, target_encoder, df)
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def iter_chunks(paths, chunk_rows):
+    """
+    Yields DataFrames of at most `chunk_rows` rows with RAW_COLUMNS, across
+    every file in `paths`. Feedback files (feedback.py) share the columns;
+    only their "chosen" rows are used.
+    """
+    for path in paths:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = RAW_COLUMNS + (['source'] if 'source' in header else [])
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+            if 'source' in chunk:
+                chunk = chunk[chunk['source'] == 'chosen']
+            yield chunk[RAW_COLUMNS].dropna()
+
+def is_holdout(row_ids, test_size):
+    """Deterministic per-row split, so every worker holds out the same rows without sharing them."""
+    h = (np.asarray(row_ids, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return h < np.uint64(int(test_size * 2 ** 32))
+
+def encode(values, codes):
+    """Integer codes for a column, adding unseen values to `codes` in order of first appearance."""
+    local, uniques = pd.factorize(values)
+    lookup = np.array([codes.setdefault(v, len(codes)) for v in uniques], dtype=np.int64)
+    return lookup[local]
+
+def scan(paths, chunk_rows, seed, cache_dir):
+    """
+    The one pass over the CSV files. Collects the weather and label
+    vocabularies, feature means and standard deviations, the row count and
+    a reservoir sample of rows for the decision table, and writes every row,
+    encoded, to flat binary files in `cache_dir` (features.f64, labels.i16)
+    that the workers memory-map instead of parsing CSV again. Memory is
+    bounded by the chunk and sample sizes.
+    """
+    rng = np.random.default_rng(seed)
+    rows = 0
+    # Codes in order of first appearance; remapped to sorted order at the end.
+    weather_codes, label_codes = {}, {}
+    weather_counts = []
+    sums = np.zeros(3)
+    sq_sums = np.zeros(3)
+    sample = {column: [] for column in RAW_COLUMNS}
+    with open(os.path.join(cache_dir, 'features.f64'), 'wb') as xf, open(os.path.join(cache_dir, 'labels.i16'), 'wb') as yf:
+        for chunk in iter_chunks(paths, chunk_rows):
+            # Feedback chunks can hold no "chosen" rows at all.
+            if chunk.empty:
+                continue
+            w = encode(chunk['weather'], weather_codes).astype(np.float64)
+            y = encode(chunk['preferred_type'], label_codes).astype(np.int16)
+            numeric = chunk[['time_available', 'distance', 'rating']].to_numpy(dtype=np.float64)
+            np.column_stack([w, numeric]).tofile(xf)
+            y.tofile(yf)
+            weather_counts.append(np.bincount(w.astype(np.intp), minlength=len(weather_codes)))
+            sums += numeric.sum(axis=0)
+            sq_sums += (numeric ** 2).sum(axis=0)
+
+            # Reservoir sampling (Algorithm R): fill up, then row i replaces a
+            # random slot with probability TABLE_SAMPLE_ROWS / (i + 1).
+            fill = max(0, min(TABLE_SAMPLE_ROWS - rows, len(chunk)))
+            slots = rng.integers(0, np.arange(rows + fill, rows + len(chunk)) + 1)
+            keep = np.flatnonzero(slots < TABLE_SAMPLE_ROWS) + fill
+            for column in RAW_COLUMNS:
+                values = chunk[column].to_numpy()
+                if fill:
+                    sample[column] = np.concatenate([sample[column], values[:fill]]) if len(sample[column]) else values[:fill].copy()
+                sample[column][slots[keep - fill]] = values[keep]
+            rows += len(chunk)
+    if not rows:
+        raise ValueError("No training rows found")
+
+    weather_classes = sorted(weather_codes)
+    labels = sorted(label_codes)
+    weather_remap = np.empty(len(weather_codes), dtype=np.float64)
+    for name, code in weather_codes.items():
+        weather_remap[code] = weather_classes.index(name)
+    label_remap = np.empty(len(label_codes), dtype=np.int64)
+    for name, code in label_codes.items():
+        label_remap[code] = labels.index(name)
+
+    counts = np.zeros(len(weather_codes))
+    for c in weather_counts:
+        counts[:len(c)] += c
+    w_idx = weather_remap  # sorted index of each appearance code
+    w_mean = (w_idx * counts).sum() / rows
+    mean = np.concatenate([[w_mean], sums / rows])
+    var = np.concatenate([[((w_idx - w_mean) ** 2 * counts).sum() / rows], sq_sums / rows - (sums / rows) ** 2])
+    return {
+        "rows": rows,
+        "cache_dir": cache_dir,
+        "weather_classes": weather_classes,
+        "labels": labels,
+        "weather_remap": weather_remap,
+        "label_remap": label_remap,
+        "mean": mean,
+        "scale": np.sqrt(np.maximum(var, 1e-12)),
+        "sample": pd.DataFrame(sample),
+    }
+
+def fit_candidate(config, stats, chunk_rows, epochs, test_size, seed):
+    """
+    Trains one SGDClassifier with partial_fit over `chunk_rows`-row slices
+    of the memory-mapped scan output, `epochs` times, then scores it on the
+    held-out rows. Runs in a pool worker; returns plain data (coefficients
+    already mapped back to unscaled features).
+    """
+    rows = stats["rows"]
+    features = np.memmap(os.path.join(stats["cache_dir"], 'features.f64'), dtype=np.float64, mode='r', shape=(rows, 4))
+    targets = np.memmap(os.path.join(stats["cache_dir"], 'labels.i16'), dtype=np.int16, mode='r', shape=(rows,))
+    classes = np.arange(len(stats["labels"]))
+    model = SGDClassifier(loss=config["loss"], alpha=config["alpha"], random_state=seed)
+    rng = np.random.default_rng(seed)
+
+    def batches(holdout):
+        for start in range(0, rows, chunk_rows):
+            stop = min(start + chunk_rows, rows)
+            mask = is_holdout(np.arange(start, stop), test_size) == holdout
+            if not mask.any():
+                continue
+            X = np.array(features[start:stop][mask])
+            X[:, 0] = stats["weather_remap"][X[:, 0].astype(np.intp)]
+            y = stats["label_remap"][targets[start:stop][mask]]
+            yield (X - stats["mean"]) / stats["scale"], y
+
+    start = time.perf_counter()
+    trained = 0
+    for _ in range(epochs):
+        for X, y in batches(holdout=False):
+            order = rng.permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=classes)
+            trained += len(y)
+    fit_seconds = time.perf_counter() - start
+
+    correct = total = 0
+    for X, y in batches(holdout=True):
+        correct += int((model.predict(X) == y).sum())
+        total += len(y)
+
+    # Fold the standardization into the weights: w.(x - m)/s + b == (w/s).x + (b - w.m/s).
+    coef = model.coef_ / stats["scale"]
+    intercept = model.intercept_ - (model.coef_ * stats["mean"] / stats["scale"]).sum(axis=1)
+    return {
+        **config,
+        "accuracy": correct / total if total else None,
+        "train_rows": trained,
+        "holdout_rows": total,
+        "fit_seconds": fit_seconds,
+        "rows_per_sec": trained / fit_seconds if fit_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "coef": coef.tolist(),
+        "intercept": intercept.tolist(),
+    }
+
+def search(stats, chunk_rows, jobs, epochs, test_size, seed):
+    """Fits every search candidate in parallel and returns their results."""
+    configs = [{"loss": loss, "alpha": alpha} for loss, alpha in itertools.product(SEARCH_LOSSES, SEARCH_ALPHAS)]
+    worker_stats = {k: v for k, v in stats.items() if k != "sample"}
+    print(f"Fitting {len(configs)} candidates on {jobs or os.cpu_count()} processes...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(fit_candidate, configs, itertools.repeat(worker_stats), itertools.repeat(chunk_rows),
+                             itertools.repeat(epochs), itertools.repeat(test_size), itertools.repeat(seed)))
+
+def train_streaming(paths, chunk_rows=CHUNK_ROWS, jobs=None, epochs=5, test_size=0.2, seed=42, report_path=None):
+    """
+    Out-of-core training: one scan pass parses the CSVs into a binary
+    cache, then every (loss, alpha) candidate is fit incrementally in its
+    own pool worker from the memory-mapped cache, so memory per process
+    stays at about one chunk however large the data is. The candidate with
+    the best held-out accuracy is exported like train_model() does.
+    """
+    started = time.perf_counter()
+    print(f"Scanning {', '.join(paths)}...")
+    with tempfile.TemporaryDirectory(prefix="pocketplan-train-") as cache_dir:
+        stats = scan(paths, chunk_rows, seed, cache_dir)
+        scan_seconds = time.perf_counter() - started
+        print(f"{stats['rows']} rows, weather {stats['weather_classes']}, labels {stats['labels']} "
+              f"({stats['rows'] / scan_seconds:,.0f} rows/s)")
+        results = search(stats, chunk_rows, jobs, epochs, test_size, seed)
+
+    for r in results:
+        print(f"  {r['loss']:15s} alpha={r['alpha']:<7g} accuracy {r['accuracy']:.4f}  "
+              f"{r['rows_per_sec']:>12,.0f} rows/s  peak {r['peak_rss_mb']:.0f} MB")
+    best = max(results, key=lambda r: r["accuracy"] or 0.0)
+    print(f"Best: {best['loss']} alpha={best['alpha']:g}, held-out accuracy {best['accuracy']:.4f}")
+
+    # The exported model works on unscaled features, like the LogisticRegression path.
+    model = SGDClassifier(loss=best["loss"], alpha=best["alpha"])
+    model.coef_ = np.asarray(best["coef"])
+    model.intercept_ = np.asarray(best["intercept"])
+    model.classes_ = np.arange(len(stats["labels"]))
+    model.feature_names_in_ = np.asarray(FEATURES, dtype=object)
+    model.n_features_in_ = len(FEATURES)
+    weather_encoder = LabelEncoder().fit(stats["weather_classes"])
+    target_encoder = LabelEncoder().fit(stats["labels"])
+    sample = stats["sample"]
+    sample['weather_encoded'] = weather_encoder.transform(sample['weather'])
+
+    print("Saving model and encoders...")
+    joblib.dump(model, MODEL_PATH)
+    joblib.dump(weather_encoder, WEATHER_ENCODER_PATH)
+    joblib.dump(target_encoder, TARGET_ENCODER_PATH)
+    header = export_artifact(model, weather_encoder, target_encoder, sample)
+
+    total_seconds = time.perf_counter() - started
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": paths,
+        "rows": stats["rows"],
+        "chunk_rows": chunk_rows,
+        "epochs": epochs,
+        "jobs": jobs or os.cpu_count(),
+        "scan_rows_per_sec": stats["rows"] / scan_seconds,
+        "total_seconds": total_seconds,
+        "parent_peak_rss_mb": peak_rss_mb(),
+        "model_version": header["model_version"],
+        "best": {k: v for k, v in best.items() if k not in ("coef", "intercept")},
+        "candidates": [{k: v for k, v in r.items() if k not in ("coef", "intercept")} for r in results],
+    }
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {report_path}")
+    print(f"Done in {total_seconds:.1f}s")
+    return report
+
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the place-type model.")
+    parser.add_argument("--export-only", action="store_true",
+                        help="Skip training and export the serving artifact from the existing pickles.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Out-of-core training with a parallel model search (for data that does not fit in memory).")
+    parser.add_argument("--data", nargs="+", default=[DATA_PATH],
+                        help="CSV files to train on in streaming mode (training_data.csv or feedback files).")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--report", default=os.path.join(BASE_DIR, "bench", "results", "train_report.json"),
+                        help="Where streaming mode writes its performance report.")
+    args = parser.parse_args()
+    if args.export_only:
+        export_existing()
+    elif args.streaming:
+        train_streaming(args.data, args.chunk_rows, args.jobs, args.epochs, report_path=args.report)
+    else:
+        train_model()
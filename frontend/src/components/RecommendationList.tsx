@@ -5,9 +5,10 @@ import FlashCard from './FlashCard';
 interface RecommendationListProps {
     recommendations: any[];
     onSelect: (item: any) => void;
+    isRefining?: boolean;
 }
 
-const RecommendationList: React.FC<RecommendationListProps> = ({ recommendations, onSelect }) => {
+const RecommendationList: React.FC<RecommendationListProps> = ({ recommendations, onSelect, isRefining = false }) => {
     const scrollContainerRef = useRef<HTMLDivElement>(null);
 
     const scroll = (direction: 'left' | 'right') => {
@@ -32,6 +33,11 @@ const RecommendationList: React.FC<RecommendationListProps> = ({ recommendations
                 <h2 className="text-2xl font-bold text-gray-800">
                     Top Picks for You
                 </h2>
+                {isRefining && (
+                    <span className="text-sm text-gray-500 font-medium animate-pulse">
+                        Refining…
+                    </span>
+                )}
             </div>
 
             <section className="mt-6 relative group/list">
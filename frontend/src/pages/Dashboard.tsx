@@ -17,13 +17,41 @@ interface ResultData {
     music_recommendations?: string[];
     image_url?: string;
     categories?: string[];
+    degraded?: boolean;
 }
 
+interface StreamFrame {
+    event: 'provisional' | 'update' | 'final' | 'error';
+    results: ResultData[];
+    status?: number;
+    detail?: string;
+}
+
+// Reads the NDJSON frames of /recommend/stream, calling onFrame for each one.
+const readRecommendationStream = async (response: Response, onFrame: (frame: StreamFrame) => void) => {
+    if (!response.body) throw new Error('Streaming not supported');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        for (const line of lines) {
+            if (line.trim()) onFrame(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onFrame(JSON.parse(buffer));
+};
+
 const Dashboard: React.FC = () => {
     const [showResult, setShowResult] = useState(false);
     const [resultData, setResultData] = useState<ResultData[]>([]);
     const [selectedResult, setSelectedResult] = useState<ResultData | null>(null);
     const [isThinking, setIsThinking] = useState(false);
+    const [isRefining, setIsRefining] = useState(false);
     const [suggestions, setSuggestions] = useState<string[]>([]);
     const [searchContext, setSearchContext] = useState<any>(null);
 
@@ -112,25 +140,30 @@ const Dashboard: React.FC = () => {
         }
 
         // --- GENERIC API CALL ---
+        // Cards are shown as soon as the first frame arrives and replaced as
+        // the backend refines them; the final frame is the real top 6.
         try {
-            const response = await fetch(`${import.meta.env.VITE_BACKEND_URL}recommend`, {
+            const response = await fetch(`${import.meta.env.VITE_BACKEND_URL}recommend/stream`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(data),
             });
 
             if (!response.ok) throw new Error('Backend not available');
-            const result = await response.json();
-            const resultsArray = Array.isArray(result) ? result : [result];
-
-            setTimeout(() => {
-                setResultData(resultsArray);
+            let gotFinal = false;
+            await readRecommendationStream(response, (frame) => {
+                if (frame.event === 'error') throw new Error(frame.detail || 'Recommendation failed');
+                setResultData(frame.results);
                 setShowResult(true);
                 setIsThinking(false);
-            }, 800);
+                setIsRefining(frame.event !== 'final');
+                gotFinal = gotFinal || frame.event === 'final';
+            });
+            if (!gotFinal) throw new Error('Stream ended early');
 
         } catch (error) {
             console.log("Using Fallback Data:", error);
+            setIsRefining(false);
             setTimeout(() => {
                 const mockResult: ResultData = {
                     name: "Urban Coffee Break",
@@ -241,6 +274,7 @@ const Dashboard: React.FC = () => {
                     <RecommendationList
                         recommendations={resultData}
                         onSelect={handleSelectResult}
+                        isRefining={isRefining}
                     />
                 </div>
             )}
@@ -24,12 +24,19 @@ const SavedPlans: React.FC = () => {
         const fetchData = async () => {
             setIsLoading(true);
             try {
-                // Fetch Favorites
-                const favRes = await fetch(`${import.meta.env.VITE_BACKEND_URL}/favorites`);
-                const favData = await favRes.json();
+                // Fetch every favorite, newest first, following the pagination cursor
+                const favData: FavoriteItem[] = [];
+                let cursor: string | null = null;
+                do {
+                    const params = new URLSearchParams({ order: 'desc', limit: '1000' });
+                    if (cursor) params.set('cursor', cursor);
+                    const favRes = await fetch(`${import.meta.env.VITE_BACKEND_URL}/favorites?${params}`);
+                    favData.push(...await favRes.json());
+                    cursor = favRes.headers.get('X-Next-Cursor');
+                } while (cursor);
 
-                // Fetch History
-                const histRes = await fetch(`${import.meta.env.VITE_BACKEND_URL}/history`);
+                // Fetch the most recent history entries only
+                const histRes = await fetch(`${import.meta.env.VITE_BACKEND_URL}/history?order=desc&limit=8`);
                 const histData = await histRes.json();
 
                 setFavorites(favData);
@@ -199,7 +206,7 @@ const SavedPlans: React.FC = () => {
                         <EmptyState label="No history available." />
                     ) : (
                         <div className="flex flex-col gap-4">
-                            {history.slice().reverse().slice(0, 8).map((item, index) => (
+                            {history.map((item, index) => (
                                 <div key={index} style={{
                                     backgroundColor: '#FFFFFF',
                                     borderRadius: '16px',